@@ -0,0 +1,239 @@
+"""Micro-benchmarks of the agent's per-turn hot functions, with a regression gate.
+
+Times modification normalization, LLM reply decoding (structured and repair
+paths), prompt and summary formatting, history fitting, language detection and
+the DB row serializers on realistic inputs: 50-item orders and 200-message
+conversations.
+
+Results are compared with the saved baseline (scripts/bench_baseline.json).
+Each benchmark is timed in rounds interleaved with a fixed reference
+workload, and the gate compares the cost relative to that workload. That
+keeps the baseline usable on other machines and when the CPU speed changes
+during a run. The script exits with status 1 when a benchmark's relative cost
+grew by more than --threshold.
+
+Usage: python scripts/bench_hot_paths.py                   # compare with the baseline
+       python scripts/bench_hot_paths.py --save-baseline   # record a new baseline
+       python scripts/bench_hot_paths.py --only decode_repaired --threshold 0.5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")  # The agent builds a WooCommerce client, never called here
+
+from src.agent.agent import OrderConfirmationAgent  # noqa: E402
+from src.agent.models import Order, OrderItem, ConversationState  # noqa: E402
+from src.agent.decision import decode_decision  # noqa: E402
+from src.agent.order_lines import OrderLines  # noqa: E402
+from src.agent.database.models import OrderModel, ConversationModel  # noqa: E402
+from src.agent.database.sqlite import SQLiteDatabase  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+ORDER_ITEMS = 50
+CONVERSATION_MESSAGES = 200
+
+MODIFICATIONS = [
+    ({"action": "add", "item": "Produit 3", "quantity": 2}, "add"),
+    ({"action": "remove", "item": "Produit 7", "quantity": 1}, "remove"),
+    ({"old_item": "Produit 1", "quantity": 1}, "remove"),
+    ({"item": "Produit 4", "quantity": 3}, "modify"),
+    ({"quantity": {"Produit 2": -1, "Produit 9": 2}}, "modify"),
+    ({"oldItem": {"articleName": "Produit 5", "quantity": 1}, "newItem": {"articleName": "Produit 11", "quantity": 2}}, "replace"),
+    ({"old": {"article_name": "Produit 6"}, "new": {"article_name": "Produit 12"}, "quantity": 1}, "replace"),
+]
+
+VALID_REPLY = ('{"message": "Votre commande contient maintenant 1 Produit 7, est-ce correct ?", '
+               '"action": "remove", "modification": {"item": "Produit 7", "quantity": 1}}')
+BROKEN_REPLIES = [
+    "```json\n{'message': 'Très bien, je retire la chaise.', 'action': 'remove', 'modification': {'item': 'Produit 7', 'quantity': 1},}\n```",
+    'Voici la réponse : {message: "Je remplace la table", action: "replace", modification: {"old_item": "Produit 1", "new_item": "Produit 2"}}',
+    '{"message": "Parfait, c\'est confirmé", "action": "confirm", "modification": null',
+]
+
+LANGUAGE_MESSAGES = [
+    "oui", "Oui merci", "ok", "yes", "thanks", "annuler", "2",
+    "Je voudrais remplacer la lasagne par une pizza margherita",
+    "Can you remove the chairs from my order please?",
+    "Est-ce que je peux ajouter deux cafés et un croissant ?",
+    "I would like to change the number of tables to 3",
+    "Pouvez-vous livrer au 12 rue de la Paix à Paris ?",
+]
+
+
+def make_items(n):
+    return [{"name": f"Produit {i}", "quantity": 1 + i % 4, "price": round(4.5 + 1.25 * i, 2), "product_id": 1000 + i,
+             "notes": None, "woocommerce_order_id": "4321", "woo_line_item_id": 5000 + i} for i in range(n)]
+
+
+def make_messages(n):
+    messages = []
+    for i in range(n // 2):
+        messages.append({"role": "user", "content": f"Pouvez-vous ajouter {1 + i % 3} Produit {i % ORDER_ITEMS} à ma commande ?"})
+        messages.append({"role": "assistant", "content": f"J'ai ajouté Produit {i % ORDER_ITEMS}. Votre total est maintenant de {40 + i}.5€. Est-ce correct ?"})
+    return messages
+
+
+def make_order(items):
+    return Order(id="woo_order_4321", customer_name="Jeanne Dupont", customer_phone="+33612345678",
+                 items=[OrderItem(**item) for item in items], total_amount=sum(i["price"] * i["quantity"] for i in items),
+                 created_at="2025-01-01T00:00:00", woocommerce_order_id="4321")
+
+
+def build_benchmarks():
+    """name -> zero-argument callable doing one operation."""
+    agent = OrderConfirmationAgent(None)
+    items = make_items(ORDER_ITEMS)
+    messages = make_messages(CONVERSATION_MESSAGES)
+    order = make_order(items)
+    summary = "Le client a retiré deux chaises et ajouté un canapé. Livraison demandée pour jeudi."
+    conversation = ConversationState(order_id=order.id, messages=messages, current_step="confirming",
+                                     last_active=datetime(2025, 1, 1), summary=summary, summarized_count=40)
+    order_row = OrderModel(id=order.id, customer_name=order.customer_name, customer_phone=order.customer_phone,
+                           items=json.dumps(items), total_amount=order.total_amount, status="pending",
+                           created_at=datetime(2025, 1, 1), woocommerce_order_id="4321")
+    conversation_dict = conversation.dict()
+    conversation_row = ConversationModel(order_id=order.id, messages=json.dumps(messages), current_step="confirming",
+                                         confirmed_items="[]", issues_found="[]",
+                                         notes=json.dumps({"summary": summary, "summarized_count": 40, "language": "fr"}))
+    modifications = itertools.cycle(MODIFICATIONS)
+    broken = itertools.cycle(BROKEN_REPLIES)
+    language_messages = itertools.cycle(LANGUAGE_MESSAGES)
+
+    return {
+        "normalize_modification": lambda: agent._normalize_modification(*next(modifications)),
+        "decode_structured": lambda: decode_decision(VALID_REPLY),
+        "decode_repaired": lambda: decode_decision(next(broken)),
+        "format_order_context_50": lambda: agent._format_order_context(order, "fr"),
+        "format_order_summary_50": lambda: agent._format_order_summary_natural(order, "fr"),
+        "format_history_200": lambda: agent._format_conversation_history(messages, summary=summary),
+        "detect_language": lambda: agent._detect_language(next(language_messages), conversation),
+        "order_to_dict_50": lambda: SQLiteDatabase._order_to_dict(order_row),
+        "conversation_to_dict_200": lambda: SQLiteDatabase._conversation_to_dict(conversation_row),
+        "write_conversation_200": lambda: SQLiteDatabase._write_conversation(None, conversation_row, order.id, conversation_dict),
+        "order_lines_roundtrip_50": lambda: OrderLines.from_items(order_row.items).to_json(),
+    }
+
+
+def reference_workload():
+    """Fixed pure-Python work used to compare machine speed with the baseline's."""
+    data = [{"name": f"item {i}", "quantity": i % 5, "price": i * 1.5} for i in range(200)]
+    text = json.dumps(data)
+    total = sum(d["price"] * d["quantity"] for d in json.loads(text))
+    return ", ".join(f"{d['name']} x{d['quantity']}" for d in data), total
+
+
+def _calibrate(fn, min_round_seconds):
+    """Calls per round so that one round takes at least `min_round_seconds`."""
+    fn()  # Warm caches and lazy imports
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_round_seconds:
+            return number
+        number *= 2
+
+
+def _round(fn, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+def measure(fn, repeat, min_round_seconds=0.02):
+    """(best µs per call, median cost relative to the reference workload).
+
+    Each round of `fn` is paired with a round of the reference workload, so
+    the relative cost stays stable when the machine speeds up or slows down
+    during the run; the regression gate compares relative costs.
+    """
+    number = _calibrate(fn, min_round_seconds)
+    reference_number = _calibrate(reference_workload, min_round_seconds)
+    best, ratios = float("inf"), []
+    for _ in range(repeat):
+        reference = _round(reference_workload, reference_number)
+        elapsed = _round(fn, number)
+        best = min(best, elapsed)
+        ratios.append(elapsed / reference)
+    ratios.sort()
+    return round(1e6 * best, 3), round(ratios[len(ratios) // 2], 6)
+
+
+def compare(results, baseline, threshold):
+    """Rows of (name, current_us, baseline_us, change) and the names that regressed."""
+    rows, regressions = [], []
+    for name, current in results.items():
+        saved = baseline.get(name)
+        if saved is None:
+            rows.append((name, current["us"], None, None))
+            continue
+        change = current["relative"] / saved["relative"] - 1
+        rows.append((name, current["us"], saved["us"], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=9)
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    args = parser.parse_args()
+
+    benchmarks = build_benchmarks()
+    if args.only:
+        unknown = set(args.only) - set(benchmarks)
+        if unknown:
+            parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+        benchmarks = {name: fn for name, fn in benchmarks.items() if name in args.only}
+
+    results = {}
+    for name, fn in benchmarks.items():
+        us, relative = measure(fn, args.repeat)
+        results[name] = {"us": us, "relative": relative}
+
+    if args.save_baseline:
+        saved = {}
+        if args.only and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)
+        saved.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+            f.write("\n")
+        for name, result in results.items():
+            print(f"{name:<28} {result['us']:>10.2f}us  ({result['relative']:.4f} x reference)")
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}; run with --save-baseline first")
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows, regressions = compare(results, baseline, args.threshold)
+    print(f"{'benchmark':<28} {'current':>12} {'baseline':>12} {'change':>8}")
+    for name, current, saved, change in rows:
+        if saved is None:
+            print(f"{name:<28} {current:>10.2f}us {'(new)':>12}")
+        else:
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:<28} {current:>10.2f}us {saved:>10.2f}us {100 * change:>+7.1f}%{flag}")
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than baseline by more than {100 * args.threshold:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark language detection cost per message.
+
+Compares calling langdetect.detect on every message (the previous behaviour)
+with LanguageDetector (keyword fast path, detector loaded once, memoized).
+
+Usage: python scripts/bench_language.py [--rounds 20]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.services.language_service import LanguageDetector  # noqa: E402
+
+MESSAGES = [
+    "oui", "Oui merci", "ok", "yes", "thanks", "annuler", "2",
+    "Je voudrais remplacer la lasagne par une pizza margherita",
+    "Can you remove the chairs from my order please?",
+    "Est-ce que je peux ajouter deux cafés et un croissant ?",
+    "I would like to change the number of tables to 3",
+    "Pouvez-vous livrer au 12 rue de la Paix à Paris ?",
+    "Actually I only want one pizza",
+    "Non, il manque les frites dans ma commande",
+    "Livraison demain matin vers midi",
+    "Tomorrow morning around noon would be great",
+]
+
+
+def timed(fn, messages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            fn(message)
+    return 1000 * (time.perf_counter() - start) / (rounds * len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        from langdetect import detect
+        start = time.perf_counter()
+        detect("profile loading happens on the first call")
+        print(f"langdetect first call (profile load): {1000 * (time.perf_counter() - start):.1f}ms")
+
+        def detect_or_default(message):
+            # What the web handlers did: any detection error meant French
+            try:
+                return detect(message)
+            except Exception:
+                return "fr"
+
+        print(f"langdetect.detect per message:        {timed(detect_or_default, MESSAGES, args.rounds):.3f}ms")
+    except ImportError:
+        print("langdetect not installed: only the keyword fast path is measured")
+
+    detector = LanguageDetector()
+    print(f"LanguageDetector first pass:          {timed(detector.detect, MESSAGES, 1):.3f}ms/message")
+    print(f"LanguageDetector repeated messages:   {timed(detector.detect, MESSAGES, args.rounds):.4f}ms/message")
+    fresh = LanguageDetector(cache_size=0)
+    print(f"LanguageDetector without memoization: {timed(fresh.detect, MESSAGES, args.rounds):.3f}ms/message")
+    print(f"stats: {detector.stats()}")
+    for message in MESSAGES:
+        print(f"  {detector.detect(message):>2}  {message}")
+
+
+if __name__ == "__main__":
+    main()
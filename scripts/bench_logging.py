@@ -0,0 +1,98 @@
+"""Benchmark the logging cost paid by the event loop during one agent turn.
+
+Replays the log calls of an LLM modification turn: the previous print() calls
+(full order objects, raw LLM reply, normalized modification) against the
+structured logging of src/services/logging_config.py at INFO, at DEBUG, and at
+DEBUG with sampling. Output goes to a temporary file in every case.
+
+Usage: python scripts/bench_logging.py [--turns 2000] [--items 20]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.agent.models import Order, OrderItem  # noqa: E402
+from src.services import logging_config  # noqa: E402
+
+logger = logging.getLogger("src.agent.agent")
+
+
+def make_turn(items):
+    order = Order(id="woo_order_1234", customer_name="Jeanne Dupont", customer_phone="+33612345678",
+                  items=[OrderItem(name=f"Produit {i}", quantity=2, price=9.5, product_id=i) for i in range(items)],
+                  total_amount=19.0 * items, created_at="2025-01-01T00:00:00", woocommerce_order_id="1234")
+    raw = ('{"message": "Votre commande contient maintenant 2 pizzas, livrée au 12 rue de la Paix", '
+           '"action": "remove", "modification": {"item": "Produit 3", "quantity": 1}}')
+    norm = {"action": "remove", "old_item": "Produit 3", "new_item": None, "old_qty": 1, "new_qty": 1}
+    return order, raw, norm
+
+
+def print_turn(order, raw, norm):
+    """The print() calls of one turn before structured logging."""
+    print(f"DEBUG: order_data before Order Pydantic model: {order.dict()}")
+    print("[LLM USAGE] model=gemini-2.5-flash prompt_tokens=850 completion_tokens=60")
+    print("[LLM RAW]", raw)
+    print(f"[NORM] Normalized modification: {norm}")
+    print(f"DEBUG: Order object in _apply_llm_modification: {order}")
+    print(f"DEBUG: order.woocommerce_order_id: {getattr(order, 'woocommerce_order_id', 'Attribute not found')}")
+    print(f"DEBUG: new_total_amount: {order.total_amount}")
+    print(f"WooCommerce order {order.woocommerce_order_id} details updated.")
+
+
+def log_turn(order, raw, norm):
+    """The same events with structured logging, as the agent now emits them."""
+    logger.debug("LLM turn", extra={"order_id": order.id, "status": order.status, "items": len(order.items)})
+    logger.debug("LLM usage", extra={"model": "gemini-2.5-flash", "prompt_tokens": 850, "completion_tokens": 60})
+    logger.debug("LLM reply", extra={"order_id": order.id, "chars": len(raw)})
+    logger.debug("Normalized modification", extra={"order_id": order.id, "action": norm["action"],
+                                                   "old_qty": norm["old_qty"], "new_qty": norm["new_qty"]})
+    logger.debug("Modification applied", extra={"order_id": order.id, "items": len(order.items), "total_amount": order.total_amount})
+    logger.info("WooCommerce order details updated", extra={"woocommerce_order_id": order.woocommerce_order_id})
+
+
+def timed(fn, turn, turns):
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn(*turn)
+    return 1e6 * (time.perf_counter() - start) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=20)
+    args = parser.parse_args()
+    turn = make_turn(args.items)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "print.log"), "w") as sink, contextlib.redirect_stdout(sink):
+            print_us = timed(print_turn, turn, args.turns)
+        print(f"print() per turn:                  {print_us:8.1f}us")
+
+        sink = open(os.path.join(tmp, "json.log"), "w")
+        logging_config.setup_logging(level="INFO", fmt="json", stream=sink)
+        root = logging.getLogger()
+        for label, level, every in (("INFO (debug disabled)", logging.INFO, 1),
+                                    ("DEBUG, every record", logging.DEBUG, 1),
+                                    ("DEBUG, 1 in 10 sampled", logging.DEBUG, 10)):
+            root.setLevel(level)
+            logging_config._sampler.every = every
+            caller_us = timed(log_turn, turn, args.turns)
+            start = time.perf_counter()
+            while logging_config._queue_handler.queue.qsize():
+                time.sleep(0.001)
+            drain_ms = 1000 * (time.perf_counter() - start)
+            print(f"logging, {label:<24} {caller_us:8.1f}us on the caller (listener drained backlog in {drain_ms:.0f}ms)")
+        logging_config.shutdown_logging()
+        sink.close()
+        print(f"stats: {logging_config.logging_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark NameIndex lookups on a synthetic catalog.
+
+Usage: python scripts/bench_name_index.py [--products 50000] [--queries 2000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.agent.name_index import AmbiguousNameError, NameIndex  # noqa: E402
+
+KINDS = ["Pizza", "Crêpe", "Salade", "Lasagne", "Burger", "Wrap", "Tarte", "Gâteau", "Chaise", "Table",
+         "Lampe", "Canapé", "Bureau", "Étagère", "Coussin", "Tapis", "Vase", "Miroir", "Panier", "Bougie"]
+QUALIFIERS = ["margherita", "quatre fromages", "végétarienne", "royale", "au chocolat", "aux pommes",
+              "en chêne", "en métal", "scandinave", "vintage", "XL", "mini", "bio", "épicée", "rouge",
+              "bleu", "blanc", "noir", "double", "familiale", "deluxe", "classique", "maison", "du chef"]
+
+
+def make_catalog(n, rng):
+    names = set()
+    while len(names) < n:
+        words = [rng.choice(KINDS)] + rng.sample(QUALIFIERS, rng.randint(1, 3))
+        names.add(f"{' '.join(words)} {rng.randint(1, 999)}" if rng.random() < 0.6 else " ".join(words))
+    return sorted(names)
+
+
+def make_query(name, rng):
+    """Simulate what the LLM/user sends: plural, article, lowercase, missing accents, a typo."""
+    query = name.lower()
+    roll = rng.random()
+    if roll < 0.25:
+        query = "la " + query
+    elif roll < 0.5:
+        query = query.replace("é", "e").replace("â", "a").replace("ê", "e")
+    elif roll < 0.75:
+        query = query + "s"
+    else:
+        i = rng.randrange(len(query))
+        query = query[:i] + query[i + 1:]
+    return query
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    catalog = make_catalog(args.products, rng)
+    start = time.perf_counter()
+    index = NameIndex(catalog)
+    build_ms = 1000 * (time.perf_counter() - start)
+
+    targets = [rng.choice(catalog) for _ in range(args.queries)]
+    queries = [make_query(t, rng) for t in targets]
+    timings = []
+    hits = ambiguous = 0
+    for target, query in zip(targets, queries):
+        start = time.perf_counter()
+        try:
+            match = index.best(query)
+        except AmbiguousNameError:
+            match = None
+            ambiguous += 1
+        timings.append(1000 * (time.perf_counter() - start))
+        hits += bool(match and match.name == target)
+
+    print(f"products={len(catalog)} build={build_ms:.0f}ms")
+    print(f"queries={len(queries)} accuracy={hits / len(queries):.1%} ambiguous={ambiguous / len(queries):.1%}")
+    print(f"lookup p50={percentile(timings, 0.5):.3f}ms p95={percentile(timings, 0.95):.3f}ms "
+          f"p99={percentile(timings, 0.99):.3f}ms max={max(timings):.3f}ms")
+
+    order_items = rng.sample(catalog, 5)
+    start = time.perf_counter()
+    for _ in range(1000):
+        NameIndex(order_items).search(make_query(order_items[0], rng), limit=1)
+    print(f"per-order index (5 items) build+lookup: {(time.perf_counter() - start):.3f}ms avg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Benchmark order modifications on orders with many line items.
+
+Compares the previous list-of-OrderItem handling (rebuild the list on removal,
+re-sum the total, dump every item through .dict()) with OrderLines.
+
+Usage: python scripts/bench_order_lines.py [--items 10 100 1000] [--ops 2000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.agent.models import OrderItem  # noqa: E402
+from src.agent.order_lines import OrderLines  # noqa: E402
+
+
+def make_items(n, rng):
+    return [{"name": f"Produit {i}", "quantity": rng.randint(1, 5), "price": round(rng.uniform(1, 50), 2), "product_id": i}
+            for i in range(n)]
+
+
+def make_ops(items, count, rng):
+    names = [item["name"] for item in items]
+    ops = []
+    for i in range(count):
+        kind = rng.choice(("add", "remove", "set"))
+        name = rng.choice(names) if kind != "add" or rng.random() < 0.5 else f"Nouveau {i}"
+        ops.append((kind, name, rng.randint(1, 3)))
+    return ops
+
+
+def legacy_turn(stored, op):
+    """One modification turn the way the agent did it before OrderLines."""
+    items = [OrderItem(**item) for item in json.loads(stored)]
+    kind, name, qty = op
+    item = next((i for i in items if i.name == name), None)
+    if kind == "add":
+        if item:
+            item.quantity += qty
+        else:
+            items.append(OrderItem(name=name, quantity=qty, price=items[-1].price if items else 0))
+    elif kind == "remove" and item:
+        item.quantity -= min(qty, item.quantity)
+        if item.quantity <= 0:
+            items = [i for i in items if i is not item]
+    elif kind == "set" and item:
+        item.quantity = qty
+    total = sum(i.price * i.quantity for i in items)
+    items_str = ", ".join(f"{i.name} x{i.quantity}" for i in items)
+    total = sum(i.price * i.quantity for i in items)  # Recomputed for the confirmation message
+    return json.dumps([i.dict() for i in items]), total, items_str
+
+
+def lines_turn(stored, op):
+    lines = OrderLines.from_items(stored)
+    kind, name, qty = op
+    if kind == "add":
+        last = lines.last()
+        lines.add(name, qty, last.price if last else 0)
+    elif kind == "remove":
+        lines.remove(name, qty)
+    else:
+        lines.set_quantity(name, qty)
+    items_str = ", ".join(f"{line.name} x{line.quantity}" for line in lines)
+    return lines.to_json(), lines.total, items_str
+
+
+def bench_turns(fn, stored, ops):
+    start = time.perf_counter()
+    for op in ops:
+        fn(stored, op)
+    return 1e6 * (time.perf_counter() - start) / len(ops)
+
+
+def bench_ops_only(items, ops):
+    """Modifications alone on one loaded order, without load and serialization."""
+    legacy = [OrderItem(**item) for item in items]
+    start = time.perf_counter()
+    for kind, name, qty in ops:
+        item = next((i for i in legacy if i.name == name), None)
+        if kind == "remove" and item:
+            item.quantity -= min(qty, item.quantity)
+            if item.quantity <= 0:
+                legacy = [i for i in legacy if i is not item]
+        elif kind == "add":
+            if item:
+                item.quantity += qty
+            else:
+                legacy.append(OrderItem(name=name, quantity=qty, price=1.0))
+        elif item:
+            item.quantity = qty
+        sum(i.price * i.quantity for i in legacy)
+    legacy_us = 1e6 * (time.perf_counter() - start) / len(ops)
+
+    lines = OrderLines.from_items(items)
+    start = time.perf_counter()
+    for kind, name, qty in ops:
+        if kind == "remove":
+            lines.remove(name, qty)
+        elif kind == "add":
+            lines.add(name, qty, 1.0)
+        else:
+            lines.set_quantity(name, qty)
+        lines.total
+    lines_us = 1e6 * (time.perf_counter() - start) / len(ops)
+    return legacy_us, lines_us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    print(f"{'items':>6} | {'legacy turn':>12} | {'OrderLines turn':>15} | {'legacy op':>10} | {'OrderLines op':>13}")
+    for n in args.items:
+        items = make_items(n, rng)
+        stored = json.dumps(items)
+        ops = make_ops(items, args.ops, rng)
+        turn_ops = ops[:max(50, args.ops // max(1, n // 10))]
+        legacy_turn_us = bench_turns(legacy_turn, stored, turn_ops)
+        lines_turn_us = bench_turns(lines_turn, stored, turn_ops)
+        legacy_op_us, lines_op_us = bench_ops_only(items, ops)
+        print(f"{n:>6} | {legacy_turn_us:>10.1f}us | {lines_turn_us:>13.1f}us | {legacy_op_us:>8.2f}us | {lines_op_us:>11.2f}us")
+
+        # Both implementations must agree on the result
+        for op in turn_ops[:20]:
+            assert abs(legacy_turn(stored, op)[1] - lines_turn(stored, op)[1]) < 1e-6
+
+
+if __name__ == "__main__":
+    main()
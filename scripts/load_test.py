@@ -0,0 +1,232 @@
+"""Load-test the HTTP API with concurrent simulated customers.
+
+Each customer creates an order over POST /orders and then sends a scripted
+conversation to POST /orders/{id}/message, waiting a random think time between
+turns. By default the app runs in-process (httpx ASGI transport) with the fake
+LLM backend and a fresh SQLite database in a temporary directory, so the run is
+offline and repeatable; --url targets a running server instead.
+
+Reports turn latency percentiles, turns per second, error rates and, in-process,
+SQLite write statements that waited on the database lock.
+
+Usage: python scripts/load_test.py [--customers 50] [--think-ms 200 1000] [--llm-latency lognormal:400:0.5]
+       python scripts/load_test.py --url http://127.0.0.1:8000 --customers 20
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+PRODUCTS = [("Table", 120.0), ("Chaise", 45.0), ("Canapé", 650.0), ("Lampe", 35.0), ("Coussin", 12.5),
+            ("Tapis", 89.0), ("Étagère", 70.0), ("Miroir", 55.0), ("Pizza", 11.0), ("Tarte", 18.0)]
+
+# Default conversation: a removal, an addition, a question, then the confirmation.
+# {item} is an item of the customer's order, {new} a product that is not in it.
+DEFAULT_SCRIPT = [
+    "Bonjour, je voudrais retirer 1 {item}",
+    "Pouvez-vous ajouter 2 {new} ?",
+    "La livraison est prévue quand ?",
+    "Oui, c'est correct",
+]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class DBLockMonitor:
+    """Times SQL statements on every SQLAlchemy engine of the process.
+
+    The app creates an engine per request, so the listeners are attached to the
+    Engine class. A write statement that takes longer than `threshold_ms` is
+    counted as a lock wait: with SQLite, that time is spent in the busy handler
+    waiting for another connection's write lock.
+    """
+
+    def __init__(self, threshold_ms: float):
+        self.threshold = threshold_ms / 1000
+        self.statements = 0
+        self.writes = []
+        self.locked_errors = 0
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, "before_cursor_execute", self._before)
+        event.listen(Engine, "after_cursor_execute", self._after)
+        event.listen(Engine, "handle_error", self._error)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("load_test_starts", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["load_test_starts"].pop()
+        self.statements += 1
+        if statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            self.writes.append(elapsed)
+
+    def _error(self, context):
+        starts = context.connection.info.get("load_test_starts") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        if "database is locked" in str(context.original_exception):
+            self.locked_errors += 1
+
+    def report(self):
+        waits = [w for w in self.writes if w > self.threshold]
+        return {
+            "statements": self.statements,
+            "write_statements": len(self.writes),
+            "lock_waits": len(waits),
+            "lock_wait_total_s": round(sum(waits), 3),
+            "write_p99_ms": round(1000 * percentile(self.writes, 99), 2),
+            "locked_errors": self.locked_errors,
+        }
+
+
+class Results:
+    def __init__(self):
+        self.turns = []  # Latency in seconds of successful turns
+        self.order_creations = []
+        self.http_errors = 0
+        self.transport_errors = 0
+        self.fallback_replies = 0
+
+
+async def run_customer(client, index, args, script, results, rng, fallback_replies):
+    items = rng.sample(PRODUCTS, rng.randint(2, min(args.max_items, len(PRODUCTS) - 1)))
+    order_items = [{"name": name, "quantity": rng.randint(1, 4), "price": price} for name, price in items]
+    new = next(name for name, _ in PRODUCTS if name not in {i["name"] for i in order_items})
+    order = {"customer_name": f"Client {index}", "customer_phone": f"+3360000{index:04d}", "items": order_items,
+             "total_amount": sum(i["price"] * i["quantity"] for i in order_items)}
+
+    await asyncio.sleep(rng.uniform(0, args.ramp_s))
+    start = time.perf_counter()
+    try:
+        response = await client.post("/orders", json=order)
+    except Exception:
+        results.transport_errors += 1
+        return
+    if response.status_code != 200:
+        results.http_errors += 1
+        return
+    results.order_creations.append(time.perf_counter() - start)
+    order_id = response.json()["id"]
+
+    for template in script:
+        await asyncio.sleep(rng.uniform(*args.think_ms) / 1000)
+        text = template.format(item=rng.choice(order_items)["name"].lower(), new=new.lower())
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"/orders/{order_id}/message", json={"text": text})
+        except Exception:
+            results.transport_errors += 1
+            continue
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            results.http_errors += 1
+            continue
+        results.turns.append(elapsed)
+        if response.json().get("agent_response") in fallback_replies:
+            results.fallback_replies += 1
+
+
+async def run(args, script):
+    import httpx
+    from src.agent.agent import FALLBACK_REPLIES
+    monitor = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from src.main import app
+        from src.api.dependencies import create_db_tables
+        await create_db_tables()
+        monitor = DBLockMonitor(args.lock_wait_ms)
+        monitor.install()
+        # Unhandled app exceptions come back as 500 responses, as behind uvicorn
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout)
+
+    results = Results()
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    async with client:
+        await asyncio.gather(*(run_customer(client, i, args, script, results, random.Random(rng.random()), FALLBACK_REPLIES)
+                               for i in range(args.customers)))
+    wall = time.perf_counter() - started
+    return results, wall, monitor
+
+
+def print_report(args, script, results, wall, monitor):
+    attempted = args.customers * len(script)
+    turns = results.turns
+    print(f"customers: {args.customers}  turns: {len(turns)}/{attempted}  wall time: {wall:.1f}s")
+    print(f"turn latency: p50 {1000 * percentile(turns, 50):.0f}ms  p95 {1000 * percentile(turns, 95):.0f}ms  "
+          f"p99 {1000 * percentile(turns, 99):.0f}ms  max {1000 * max(turns, default=0):.0f}ms")
+    print(f"order creation: p50 {1000 * percentile(results.order_creations, 50):.0f}ms  "
+          f"p99 {1000 * percentile(results.order_creations, 99):.0f}ms")
+    print(f"throughput: {len(turns) / wall:.1f} turns/s")
+    requests = len(turns) + len(results.order_creations) + results.http_errors + results.transport_errors
+    print(f"errors: http {results.http_errors}  transport {results.transport_errors}  "
+          f"fallback replies {results.fallback_replies}  "
+          f"({100 * (results.http_errors + results.transport_errors + results.fallback_replies) / max(1, requests):.1f}% of requests)")
+    if monitor:
+        db = monitor.report()
+        print(f"db: {db['statements']} statements, {db['write_statements']} writes, write p99 {db['write_p99_ms']}ms, "
+              f"{db['lock_waits']} lock waits > {args.lock_wait_ms:g}ms ({db['lock_wait_total_s']}s total), "
+              f"{db['locked_errors']} 'database is locked' errors")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--think-ms", type=float, nargs=2, default=[200, 1000], metavar=("MIN", "MAX"))
+    parser.add_argument("--ramp-s", type=float, default=2.0, help="Customers start at random times within this window")
+    parser.add_argument("--max-items", type=int, default=5)
+    parser.add_argument("--script", help="JSON list of customer messages ({item} and {new} are filled in)")
+    parser.add_argument("--url", help="Base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--llm-latency", default="lognormal:400:0.5", help="Fake LLM latency spec (in-process only)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fake LLM transient error rate (in-process only)")
+    parser.add_argument("--llm-rpm", type=float, default=6000,
+                        help="Gateway requests-per-minute limit (in-process only; the production default of 60 would dominate)")
+    parser.add_argument("--llm-max-in-flight", type=int, default=8, help="Gateway concurrent LLM calls (in-process only)")
+    parser.add_argument("--lock-wait-ms", type=float, default=5.0, help="Write statements slower than this count as lock waits")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    script = json.load(open(args.script)) if args.script else DEFAULT_SCRIPT
+
+    if not args.url:
+        # Offline, isolated app: fake LLM, no outbound Messenger sends, database in a scratch directory
+        os.environ["LLM_BACKEND"] = "fake"
+        os.environ["FAKE_LLM_LATENCY"] = args.llm_latency
+        os.environ["FAKE_LLM_ERROR_RATE"] = str(args.llm_error_rate)
+        os.environ["LLM_REQUESTS_PER_MINUTE"] = str(args.llm_rpm)
+        os.environ["LLM_MAX_IN_FLIGHT"] = str(args.llm_max_in_flight)
+        os.environ["FACEBOOK_PAGE_ACCESS_TOKEN"] = ""
+        # Orders created over POST /orders have no WooCommerce id and the catalog is off, so the store is
+        # never called; the URL is only needed to build the WooCommerce client
+        os.environ["WOOCOMMERCE_CATALOG_ENABLED"] = "false"
+        os.environ["WOOCOMMERCE_STORE_URL"] = "http://woocommerce.invalid"
+        os.environ.setdefault("WOOCOMMERCE_CONSUMER_KEY", "load-test")
+        os.environ.setdefault("WOOCOMMERCE_CONSUMER_SECRET", "load-test")
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        workdir = tempfile.TemporaryDirectory()
+        os.chdir(workdir.name)
+
+    results, wall, monitor = asyncio.run(run(args, script))
+    print_report(args, script, results, wall, monitor)
+
+
+if __name__ == "__main__":
+    main()
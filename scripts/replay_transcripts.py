@@ -0,0 +1,75 @@
+"""Replay recorded agent turns offline to check or profile the agent.
+
+Reads an NDJSON transcript written with TRANSCRIPT_FILE set and feeds every
+turn through OrderConfirmationAgent against an in-memory database, serving
+the recorded LLM replies instead of calling a provider. Reports the replies
+that differ from the recorded ones, LLM calls the transcript has no reply for,
+and the replayed turn latency (agent and database time only, no LLM time).
+
+Usage: python scripts/replay_transcripts.py turns.ndjson
+       python scripts/replay_transcripts.py turns.ndjson --show-mismatches 5
+       python scripts/replay_transcripts.py turns.ndjson --profile replay.prof   # then: python -m pstats replay.prof
+"""
+import os
+import sys
+import asyncio
+import argparse
+import itertools
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")  # The agent builds a WooCommerce client, never called here
+os.environ.pop("TRANSCRIPT_FILE", None)  # Do not record the replay
+
+from src.agent.replay import TranscriptReplayer  # noqa: E402
+from src.agent.transcript import read_transcripts  # noqa: E402
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def print_report(results, show_mismatches):
+    mismatches = [r for r in results if not r["match"]]
+    unexpected = sum(r["unexpected_llm_calls"] for r in results)
+    replayed = [r["ms"] for r in results]
+    recorded = [r["recorded_ms"] for r in results if r["recorded_ms"] is not None]
+    print(f"turns: {len(results)}  mismatched replies: {len(mismatches)}  unexpected LLM calls: {unexpected}")
+    print(f"replayed turn latency: p50 {percentile(replayed, 50):.2f}ms  p95 {percentile(replayed, 95):.2f}ms  "
+          f"p99 {percentile(replayed, 99):.2f}ms  total {sum(replayed) / 1000:.2f}s")
+    if recorded:
+        print(f"recorded turn latency: p50 {percentile(recorded, 50):.0f}ms  p95 {percentile(recorded, 95):.0f}ms")
+    for r in mismatches[:show_mismatches]:
+        print(f"\n{r['order_id']}: {r['input']!r}\n  recorded: {r['recorded_reply']!r}\n  replayed: {r['reply']!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("transcript", help="NDJSON file written with TRANSCRIPT_FILE")
+    parser.add_argument("--limit", type=int, help="Replay only the first N turns")
+    parser.add_argument("--show-mismatches", type=int, default=3, help="Print up to N differing replies")
+    parser.add_argument("--profile", metavar="FILE", help="Run the replay under cProfile and save the stats to FILE")
+    args = parser.parse_args()
+
+    entries = list(itertools.islice(read_transcripts(args.transcript), args.limit))
+    replayer = TranscriptReplayer()
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        results = profiler.runcall(asyncio.run, replayer.replay(entries))
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    else:
+        results = asyncio.run(replayer.replay(entries))
+    print_report(results, args.show_mismatches)
+    if any(not r["match"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,459 +1,447 @@
 from .models import Order, ConversationState, OrderItem, AgentState
 from .database.sqlite import SQLiteDatabase
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, AsyncIterator
 import json
 import re
-from difflib import get_close_matches
-from src.services.ai_service import call_llm, LLMServiceError
+import time
+import logging
+from contextlib import aclosing
+from src.services.ai_service import call_llm, call_llm_stream, token_usage, LLMServiceError, LLMCircuitOpenError
 from src.services.woocommerce_service import WooCommerceService
+from src.services.llm_cache import get_llm_cache, make_cache_key
+from src.services.business_settings import get_business_settings
+from src.services.product_catalog import get_product_catalog
+from src.services.language_service import get_language_detector
+from src.services.metrics import agent_turn_seconds
+from src.services.tracing import get_tracer, current_span, traced
+from .intent import fast_path_stats, timed_classify, is_confirmation_question
+from .prompt_builder import build_prompt, fit_history
+from .stream_parser import AgentReplyStreamParser, TurnTimer
+from .decision import AgentDecision, decode_decision, decode_structured, AGENT_DECISION_SCHEMA, STRUCTURED_OUTPUT
+from .tiering import classify_complexity, model_for_tier, tier_stats
+from .summarizer import summarizer
+from .name_index import AmbiguousNameError, NameIndex, get_catalog_index
+from .keywords import match_keywords, KeywordHits, KEYWORD_GROUPS
+from .turn_context import TurnContext
+from .transcript import get_transcript_recorder
+from .order_lines import OrderLines, Line
+
+PARSE_ERROR_REPLY = "Sorry, I had trouble understanding your last message. Could you please rephrase or clarify? If the problem persists, a human agent will assist you."
+# Replies sent while the LLM is unavailable
+OVERLOAD_REPLY_EN = ("Our assistant is temporarily overloaded. You can reply \"yes\" to confirm your order "
+                     "or \"cancel\" to cancel it; for any change, please try again in a few minutes.")
+OVERLOAD_REPLY_FR = ("Notre assistant est momentanément surchargé. Vous pouvez répondre « oui » pour confirmer votre commande "
+                     "ou « annuler » pour l'annuler ; pour toute modification, merci de réessayer dans quelques minutes.")
+QUOTA_REPLY_EN = "Our assistant is temporarily unavailable (quota exceeded). Please try again later or contact support."
+QUOTA_REPLY_FR = "Notre assistant est temporairement indisponible (quota dépassé). Merci de réessayer plus tard ou de contacter le support."
+FALLBACK_REPLIES = (PARSE_ERROR_REPLY, OVERLOAD_REPLY_EN, OVERLOAD_REPLY_FR, QUOTA_REPLY_EN, QUOTA_REPLY_FR)
+
+logger = logging.getLogger(__name__)
 
 class OrderConfirmationAgent:
     def __init__(self, db: SQLiteDatabase): 
         self.db = db
         self.woocommerce_service = WooCommerceService()
 
-    def _detect_language(self, text: str) -> str:
-        en_words = ['yes', 'no', 'ok', 'correct', 'thanks', 'thank you', 'please', 'order', 'remove', 'add', 'help', 'cancel']
-        fr_words = ['oui', 'non', "d'accord", 'merci', 'commande', 'retirer', 'ajouter', 'supprimer', 'aider', 'annuler']
-        en_count = sum(1 for w in en_words if w in text.lower())
-        fr_count = sum(1 for w in fr_words if w in text.lower())
-        if en_count > fr_count:
-            return 'en'
-        if fr_count > en_count:
-            return 'fr'
-        if len([c for c in text if ord(c) < 128]) / max(1, len(text)) > 0.9:
-            return 'en'
-        return 'fr'
+    def _detect_language(self, text: str, conversation: Optional[ConversationState] = None) -> str:
+        """Language of `text`, remembered on the conversation for undecidable later turns ("ok", "2")."""
+        language = get_language_detector().detect(text, fallback=conversation.language if conversation else None)
+        if conversation is not None:
+            conversation.language = language
+        return language
 
+    @traced("agent.turn")
     async def process_message(self, order_id: str, user_input: str, language: str = "fr") -> str:
+        start, outcome = time.perf_counter(), "error"
+        recorder, snapshot, reply, llm_error = get_transcript_recorder(), None, None, None
         try:
-            conversation_data = await self.db.get_conversation(order_id)
-            conversation = ConversationState(**conversation_data) if conversation_data else None
-            user_input_lower = user_input.strip().lower()
-            # --- Remove unconditional user message append here to avoid duplicates ---
-            # user_confirms, last_assistant_message, etc. remain unchanged
-            user_confirms = any(word in user_input_lower for word in ["yes", "oui", "ok", "correct", "d'accord"])
-            last_assistant_message = None
-            if conversation and conversation.messages:
-                for msg in reversed(conversation.messages):
-                    if msg["role"] == "assistant":
-                        last_assistant_message = msg["content"]
-                        break
-            awaiting_confirmation = False
-            if last_assistant_message:
-                confirmation_phrases = [
-                    "is your order now correct?",
-                    "est-ce correct ?",
-                    "est-ce que tout est correct",
-                    "is everything correct",
-                    "is that correct",
-                    "est-ce en ordre",
-                    "is your order correct"
-                ]
-                for phrase in confirmation_phrases:
-                    if phrase in last_assistant_message.lower():
-                        awaiting_confirmation = True
-                        break
-            only_want_match = re.search(r'(only want|seulement|juste)\s+(\d+)?\s*([\w\s]+)', user_input_lower)
-            if only_want_match:
-                qty = only_want_match.group(2)
-                item = only_want_match.group(3).strip()
-                order_data = await self.db.get_order(order_id)
-                if order_data:
-                    order = Order(**order_data)
-                    for o_item in order.items:
-                        if o_item.name.lower() != item.lower():
-                            o_item.quantity = 0
-                    for o_item in order.items:
-                        if o_item.name.lower() == item.lower():
-                            if qty:
-                                o_item.quantity = int(qty)
-                    order.items = [i for i in order.items if i.quantity > 0]
-                    await self.db.update_order(order_id, {
-                        'items': json.dumps([item.dict() if hasattr(item, 'dict') else item for item in order.items]),
-                        'total_amount': sum(item.price * item.quantity for item in order.items)
-                    })
-                    items_str = ", ".join([f"{item.name} x{item.quantity}" for item in order.items])
-                    total = sum(item.price * item.quantity for item in order.items)
-                    lang = self._detect_language(user_input)
-                    if lang.startswith("en"):
-                        confirmation_message = f"Your order now contains: {items_str}. The total is {total}€. Is your order now correct?"
-                    else:
-                        confirmation_message = f"Votre commande contient maintenant : {items_str}. Le total est de {total}€. Est-ce correct ?"
-                    if conversation:
-                        conversation.messages.append({"role": "user", "content": user_input})
-                        conversation.messages.append({"role": "assistant", "content": confirmation_message})
-                        await self.db.update_conversation(order_id, conversation.dict())
-                    return confirmation_message
-            
-            
+            turn = await TurnContext.load(self.db, order_id)
+            if recorder:
+                snapshot = recorder.snapshot(turn)
+            rule_reply = await self._rule_based_reply(turn, user_input)
+            if rule_reply:
+                await turn.commit()
+                outcome = turn.outcome
+                reply = rule_reply
+                return rule_reply
             # For LLM path, let llm_process_message handle appending the user message
-            llm_response = await self.llm_process_message(order_id, user_input, language=language)
+            llm_response = await self.llm_process_message(order_id, user_input, language=language, turn=turn)
             if llm_response and isinstance(llm_response, str) and llm_response.strip():
+                # A turn that fails part-way writes nothing
+                await turn.commit()
+                outcome = turn.outcome
+                reply = llm_response
                 return llm_response
             else:
                 raise ValueError("LLM returned empty or invalid response")
         except LLMServiceError as e:
-            if str(e) == "quota_exceeded":
-                if language.startswith("en"):
-                    return "Our assistant is temporarily unavailable (quota exceeded). Please try again later or contact support."
+            outcome, llm_error = "fallback", str(e)
+            reply = await self._llm_error_reply(e, order_id, user_input, language)
+            return reply
+        except Exception as e:
+            logger.exception("Turn failed", extra={"order_id": order_id})
+            current_span().set_error(e)  # Failed turns are always kept by the trace sampler
+            reply = PARSE_ERROR_REPLY
+            return reply
+        finally:
+            agent_turn_seconds.labels(outcome).observe(time.perf_counter() - start)
+            if snapshot is not None:
+                recorder.record_turn(snapshot, turn, user_input, language, reply, outcome, llm_error, time.perf_counter() - start)
+            turn_span = current_span()
+            turn_span.set_attribute("order_id", order_id)
+            turn_span.set_attribute("outcome", outcome)
+
+    async def stream_process_message(self, order_id: str, user_input: str, language: str = "fr") -> AsyncIterator[Tuple[str, str]]:
+        """Streaming variant of process_message.
+
+        Yields ("token", text) pieces of the agent message while the LLM is still
+        generating, then one ("done", final_message). The final message can differ
+        from the streamed text (e.g. the order summary after a modification), so
+        clients should replace the streamed bubble with it.
+        """
+        timer = TurnTimer()
+        start, outcome = time.perf_counter(), "error"
+        tracer = get_tracer()
+        # Not made current, since the caller runs between yields; the turn's own spans nest under the request
+        turn_span = tracer.start_span("agent.turn", order_id=order_id, streamed=True) if tracer.enabled else None
+        recorder, snapshot, reply, llm_error = get_transcript_recorder(), None, None, None
+        try:
+            turn = await TurnContext.load(self.db, order_id)
+            if recorder:
+                snapshot = recorder.snapshot(turn)
+            rule_reply = await self._rule_based_reply(turn, user_input)
+            if rule_reply:
+                await turn.commit()
+                outcome, reply = turn.outcome, rule_reply
+                timer.first_token()
+                yield "token", rule_reply
+                yield "done", rule_reply
+                return
+            early_reply, llm_turn = await self._prepare_llm_turn(turn, user_input)
+            if early_reply:
+                outcome, reply = turn.outcome, early_reply
+                timer.first_token()
+                yield "token", early_reply
+                yield "done", early_reply
+                return
+            parser = AgentReplyStreamParser()
+            llm_start = time.perf_counter()
+            with token_usage.capture() as usage:
+                async with aclosing(call_llm_stream(llm_turn["prompt"], model=llm_turn["model"], max_tokens=256, response_schema=self._response_schema())) as stream:
+                    async for chunk in stream:
+                        delta = parser.feed(chunk)
+                        if delta:
+                            timer.first_token()
+                            yield "token", delta
+                        if parser.complete:
+                            # Action and modification are known: run the side effects without waiting for the stream to close
+                            break
+            tier_stats.record(llm_turn["tier"], llm_turn["model"], time.perf_counter() - llm_start, llm_turn["prompt"], parser.buffer, usage)
+            final_message = await self._handle_llm_reply(turn, parser.buffer, user_input, llm_turn["language"])
+            await turn.commit()
+            outcome, reply = turn.outcome, final_message
+            yield "done", final_message
+        except LLMServiceError as e:
+            outcome, llm_error = "fallback", str(e)
+            reply = await self._llm_error_reply(e, order_id, user_input, language)
+            yield "done", reply
+        except Exception as e:
+            logger.exception("Streamed turn failed", extra={"order_id": order_id})
+            if turn_span:
+                turn_span.set_error(e)
+            reply = PARSE_ERROR_REPLY
+            yield "done", reply
+        finally:
+            timer.finish()
+            agent_turn_seconds.labels(outcome).observe(time.perf_counter() - start)
+            if snapshot is not None:
+                recorder.record_turn(snapshot, turn, user_input, language, reply, outcome, llm_error, time.perf_counter() - start)
+            if turn_span:
+                turn_span.set_attribute("outcome", outcome)
+                tracer.end_span(turn_span)
+
+    async def _rule_based_reply(self, turn: TurnContext, user_input: str) -> Optional[str]:
+        """Handle the turns that need no LLM call (fast-path intents, "only want" requests)."""
+        conversation = turn.conversation
+        user_input_lower = user_input.strip().lower()
+        # --- Remove unconditional user message append here to avoid duplicates ---
+        last_assistant_message = None
+        if conversation and conversation.messages:
+            for msg in reversed(conversation.messages):
+                if msg["role"] == "assistant":
+                    last_assistant_message = msg["content"]
+                    break
+        awaiting_confirmation = is_confirmation_question(last_assistant_message)
+        intent, classify_seconds = timed_classify(user_input, awaiting_confirmation)
+        fast_response = None
+        if intent and conversation and conversation.current_step != "completed":
+            fast_response = await self._fast_path(turn, intent, user_input)
+        # Only a produced reply saved an LLM call
+        fast_path_stats.record(intent if fast_response else None, classify_seconds)
+        if fast_response:
+            return fast_response
+        only_want_match = re.search(r'(only want|seulement|juste)\s+(\d+)?\s*([\w\s]+)', user_input_lower)
+        if only_want_match:
+            qty = only_want_match.group(2)
+            item = only_want_match.group(3).strip()
+            if turn.order:
+                lines = turn.lines
+                for line in list(lines):
+                    if line.name.lower() != item.lower():
+                        lines.discard(line)
+                    elif qty:
+                        lines.set_quantity(line, int(qty))
+                turn.save_lines()
+                turn.outcome = "modify"
+                items_str = ", ".join([f"{line.name} x{line.quantity}" for line in lines])
+                total = lines.total
+                lang = self._detect_language(user_input, conversation)
+                if lang.startswith("en"):
+                    confirmation_message = f"Your order now contains: {items_str}. The total is {total}€. Is your order now correct?"
                 else:
-                    return "Notre assistant est temporairement indisponible (quota dépassé). Merci de réessayer plus tard ou de contacter le support."
-            print(f"[LLM ERROR] {e}. Falling back to rule-based agent.")
-            return await self.process_message_basic(order_id, user_input)
+                    confirmation_message = f"Votre commande contient maintenant : {items_str}. Le total est de {total}€. Est-ce correct ?"
+                if conversation:
+                    conversation.messages.append({"role": "user", "content": user_input})
+                    conversation.messages.append({"role": "assistant", "content": confirmation_message})
+                    turn.save_conversation()
+                return confirmation_message
+        return None
+
+    async def _llm_error_reply(self, e: LLMServiceError, order_id: str, user_input: str, language: str) -> str:
+        if isinstance(e, LLMCircuitOpenError):
+            # The provider is known to be failing: answer right away instead of queueing more calls
+            return await self.process_message_basic(order_id, user_input, language=language)
+        if str(e) == "quota_exceeded":
+            return QUOTA_REPLY_EN if language.startswith("en") else QUOTA_REPLY_FR
+        logger.warning("LLM error, falling back to rule-based agent: %s", e, extra={"order_id": order_id})
+        return await self.process_message_basic(order_id, user_input, language=language)
+
+    async def llm_process_message(self, order_id: str, user_input: str, language: str = "fr",
+                                  turn: Optional[TurnContext] = None) -> str:
+        """LLM path of a turn. Loads and commits its own TurnContext unless the caller passes one."""
+        own_turn = turn is None
+        if own_turn:
+            turn = await TurnContext.load(self.db, order_id)
+        try:
+            early_reply, llm_turn = await self._prepare_llm_turn(turn, user_input)
+            if early_reply:
+                return early_reply
+            llm_raw, decision = await self._call_llm_cached(llm_turn["prompt"], turn.order, turn.conversation.messages[:-1], user_input, llm_turn["language"], llm_turn["tier"], llm_turn["model"])
+            reply = await self._handle_llm_reply(turn, llm_raw, user_input, llm_turn["language"], decision=decision)
+            if own_turn:
+                await turn.commit()
+            return reply
         except Exception as e:
-            print("[LLM EXCEPTION]", e)
-            print(f"[LLM PARSE ERROR] {e}")
-            return "Sorry, I had trouble understanding your last message. Could you please rephrase or clarify? If the problem persists, a human agent will assist you."
+            logger.warning("LLM turn failed: %s", e, extra={"order_id": order_id})
+            raise
 
-    async def llm_process_message(self, order_id: str, user_input: str, language: str = "fr") -> str:
-        order_data = await self.db.get_order(order_id)
-        if not order_data:
-            return "Désolé, je ne trouve pas cette commande. Pouvez-vous vérifier le numéro de commande?"
-        print(f"DEBUG: order_data before Order Pydantic model: {order_data}")
-        order = Order(**order_data)
-        # Explicitly set woocommerce_order_id after Pydantic instantiation
-        if 'woocommerce_order_id' in order_data:
-            order.woocommerce_order_id = str(order_data['woocommerce_order_id'])
+    async def _prepare_llm_turn(self, turn: TurnContext, user_input: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """Record the user message on the turn's conversation and build the prompt.
+
+        Returns (reply, None) when the turn can be answered without the LLM, else
+        (None, llm_turn) where llm_turn holds the prompt, language, tier and model.
+        """
+        order = turn.order
+        if not order:
+            return "Désolé, je ne trouve pas cette commande. Pouvez-vous vérifier le numéro de commande?", None
+        logger.debug("LLM turn", extra={"order_id": order.id, "status": order.status, "items": len(order.items)})
         if order.status == "confirmed":
-            return "Votre commande a déjà été confirmée. Merci!"
-        conversation_data = await self.db.get_conversation(order_id)
-        if not conversation_data:
-            conversation = ConversationState(
-                order_id=order_id,
-                messages=[],
-                current_step="greeting"
-            )
-        else:
-            conversation = ConversationState(**conversation_data)
+            return "Votre commande a déjà été confirmée. Merci!", None
+        conversation = turn.start_conversation()
         if conversation.current_step == "completed":
-            return "Cette conversation est terminée. Merci!"
+            return "Cette conversation est terminée. Merci!", None
         
         
         
         conversation.messages.append({"role": "user", "content": user_input})
         conversation.last_active = datetime.utcnow()
 
-        detected_language = self._detect_language(user_input)
+        detected_language = self._detect_language(user_input, conversation)
         language = detected_language
-        prev_assistant_lang = None
-        for msg in reversed(conversation.messages[:-1]):
-            if msg["role"] == "assistant":
-                if any(word in msg["content"].lower() for word in ["votre commande", "est-ce correct", "merci", "parfait"]):
-                    prev_assistant_lang = "fr"
-                elif any(word in msg["content"].lower() for word in ["your order", "is your order", "thank you", "perfect"]):
-                    prev_assistant_lang = "en"
-                break
-        if prev_assistant_lang and prev_assistant_lang != detected_language:
-            conversation_history = f"Client: {user_input}"
-        else:
-            conversation_history = self._format_conversation_history(conversation.messages)
         order_context = self._format_order_context(order, language=language)
-        conversation_history = self._format_conversation_history(conversation.messages)
-        # Add explicit clarification examples for ambiguous/help requests
-        if language.startswith("en"):
-            language_instruction = (
-                "Always reply in English, matching the user's message language. "
-                "The user may switch between French and English (or other languages) at any time. "
-                f"Detected language for this message: {language}.\n"
-                "STRICT JSON RULES: Use ONLY these keys: message, action, modification, old_item, new_item, item, quantity.\n"
-                "NEVER invent new keys (e.g., quantity_new, old_quantity, etc).\n"
-                "ALWAYS use double quotes for all property names and string values.\n"
-                "NEVER use single quotes. NEVER add trailing commas.\n"
-                "If a field is not needed, set it to null.\n"
-                "If you are unsure, ask for clarification.\n"
-                "If you cannot parse the user's intent, reply with action: 'none'.\n"
-                "NEGATIVE EXAMPLES (DO NOT DO THIS):\n"
-                "{ 'message': '...', 'action': 'replace', 'modification': { 'old_item': 'Table', 'new_item': 'Chair', 'quantity_new': 2 } }\n"
-                "{\"message\": \"...\", 'action': 'replace', 'modification': { 'old_item': 'Table', 'new_item': 'Chair', 'quantity': 2, } }\n"
-                "POSITIVE EXAMPLES (DO THIS):\n"
-                "{\"message\": \"...\", \"action\": \"replace\", \"modification\": {\"old_item\": \"Table\", \"new_item\": \"Chair\", \"quantity\": 2, \"item\": null} }\n"
-                "If the user's request is ambiguous or a help request (e.g., 'Can you help?', 'I need help', 'What can you do?'), reply with:\n"
-                "{\"message\": \"Could you please clarify what you would like to do with your order?\", \"action\": \"none\", \"modification\": null}\n"
-            )
-            prompt = f"""
-{language_instruction}
-
-You are a professional and friendly order confirmation agent. Here is the order context:
-{order_context}
-
-Conversation history:
-{conversation_history}
-
-The client said: "{user_input}"
-
-
-
-Reply strictly with a JSON in the following format:
-{{
-  "message": "...",  // What the agent should say to the client
-  "action": "confirm|modify|cancel|add|remove|replace|none",  // The action to take (use 'none' if no action is required)
-  "modification": {{ "old_item": "...", "new_item": "...", "item": "...", "quantity": ... }} // if applicable, otherwise null
-}}
-Do not add any text before or after the JSON.
-
-Examples:
-- If the client says "Yes" or "Correct", reply with the confirm action and a final closing message:
-{{
-  "message": "Great, your order is confirmed! We are preparing it now.",
-  "action": "confirm",
-  "modification": null
-}}
-- If the client wants to add an item, use the add action:
-{{
-  "message": "I've added 2 more motorcycles to your order. The total has been updated. Is there anything else?",
-  "action": "add",
-  "modification": {{ "item": "Motorcycle", "quantity": 2, "old_item": null, "new_item": null }}
-}}
-- If the client wants to modify an item's quantity, use the modify action:
-{{
-  "message": "The total number of bicycles in your order is now 2. Does that look right?",
-  "action": "modify",
-  "modification": {{ "item": "Bicycle", "quantity": 2, "old_item": null, "new_item": null }}
-}}
-- If the client wants to replace an item, use the replace action with old_item and new_item:
-{{
-  "message": "Lasagna has been replaced by Pizza in your order. Anything else?",
-  "action": "replace",
-  "modification": {{ "old_item": "Lasagna", "new_item": "Pizza", "item": null, "quantity": null }}
-}}
-- If the client says "Thank you", reply with the none action:
-{{
-  "message": "You're welcome! Feel free to contact us if you need anything else.",
-  "action": "none",
-  "modification": null
-}}
-- If the client's request is ambiguous or a help request (e.g., "Can you help?", "I need help", "What can you do?"), reply with:
-{{
-  "message": "Could you please clarify what you would like to do with your order?",
-  "action": "none",
-  "modification": null
-}}
-"""
-        else:
-            # French prompt with explicit clarification example
-            language_instruction = (
-                "Réponds toujours en français, en fonction de la langue du client. "
-                "Le client peut passer du français à l'anglais (ou à une autre langue) à tout moment. "
-                f"Langue détectée pour ce message : {language}.\n"
-                "RÈGLES STRICTES JSON : Utilise UNIQUEMENT ces clés : message, action, modification, old_item, new_item, item, quantity.\n"
-                "N'invente JAMAIS de nouvelles clés (ex : quantity_new, old_quantity, etc).\n"
-                "Utilise TOUJOURS des guillemets doubles pour les noms de propriétés et les valeurs de chaîne.\n"
-                "N'utilise JAMAIS de guillemets simples. N'ajoute JAMAIS de virgule finale.\n"
-                "Si un champ n'est pas nécessaire, mets-le à null.\n"
-                "Si tu n'es pas sûr, demande une clarification.\n"
-                "Si tu ne peux pas comprendre l'intention du client, réponds avec action : 'none'.\n"
-                "EXEMPLES NÉGATIFS (À NE PAS FAIRE) :\n"
-                "{ 'message': '...', 'action': 'replace', 'modification': { 'old_item': 'Table', 'new_item': 'Chaise', 'quantity_new': 2 } }\n"
-                "{\"message\": \"...\", 'action': 'replace', 'modification': { 'old_item': 'Table', 'new_item': 'Chaise', 'quantity': 2, } }\n"
-                "EXEMPLES POSITIFS (À FAIRE) :\n"
-                "{\"message\": \"...\", \"action\": \"replace\", \"modification\": {\"old_item\": \"Table\", \"new_item\": \"Chaise\", \"quantity\": 2, \"item\": null} }\n"
-                "Si la demande du client est ambiguë ou une demande d'aide (ex : 'Pouvez-vous m'aider ?', 'J'ai besoin d'aide', 'Que pouvez-vous faire ?'), réponds :\n"
-                "{\"message\": \"Pouvez-vous préciser ce que vous souhaitez faire avec votre commande ?\", \"action\": \"none\", \"modification\": null}\n"
-            )
-            prompt = f"""
-{language_instruction}
-
-Vous êtes un agent de confirmation de commande professionnel et amical. Voici le contexte de la commande :
-{order_context}
-
-Historique de la conversation :
-{conversation_history}
-
-Le client a dit : "{user_input}"
-
-
-
-Répondez strictement avec un JSON dans le format suivant :
-{{
-  "message": "...",  // Ce que l'agent doit dire au client
-  "action": "confirm|modify|cancel|add|remove|replace|none",  // L'action à effectuer (utilise 'none' si aucune action n'est requise)
-  "modification": {{ "old_item": "...", "new_item": "...", "item": "...", "quantity": ... }} // si applicable, sinon null
-}}
-N'ajoute aucun texte avant ou après le JSON.
-
-Exemples :
-- Si le client dit "Oui" ou "Correct", réponds avec l'action confirm et un message de clôture :
-{{
-  "message": "Parfait, votre commande est confirmée ! Nous la préparons dès maintenant.",
-  "action": "confirm",
-  "modification": null
-}}
-- Si le client veut ajouter un article, utilise l'action add :
-{{
-  "message": "J'ai ajouté 2 motos supplémentaires à votre commande. Le total a été mis à jour. Souhaitez-vous autre chose ?",
-  "action": "add",
-  "modification": {{ "item": "Moto", "quantity": 2, "old_item": null, "new_item": null }}
-}}
-- Si le client veut modifier la quantité d'un article, utilise l'action modify :
-{{
-  "message": "Le nombre total de vélos dans votre commande est maintenant de 2. Cela vous convient-il ?",
-  "action": "modify",
-  "modification": {{ "item": "Vélo", "quantity": 2, "old_item": null, "new_item": null }}
-}}
-- Si le client veut remplacer un article, utilise l'action replace avec old_item et new_item :
-{{
-  "message": "La lasagne a été remplacée par une pizza dans votre commande. Autre chose ?",
-  "action": "replace",
-  "modification": {{ "old_item": "Lasagne", "new_item": "Pizza", "item": null, "quantity": null }}
-}}
-- Si le client dit "Merci", réponds avec l'action none :
-{{
-  "message": "Avec plaisir ! N'hésitez pas à nous contacter si besoin.",
-  "action": "none",
-  "modification": null
-}}
-- Si la demande du client est ambiguë ou une demande d'aide (ex : "Pouvez-vous m'aider ?", "J'ai besoin d'aide", "Que pouvez-vous faire ?"), réponds :
-{{
-  "message": "Pouvez-vous préciser ce que vous souhaitez faire avec votre commande ?",
-  "action": "none",
-  "modification": null
-}}
-"""
-        # End of prompt construction
-        try:
-            llm_raw = await call_llm(prompt, max_tokens=256)
-            print("[LLM RAW]", llm_raw)
-            json_str = llm_raw.strip()
-            # Robust JSON repair/validation
-            import re, json
-            def repair_json(s):
-                # Replace single quotes with double quotes
-                s = re.sub(r"'", '"', s)
-                # Remove trailing commas before closing braces/brackets
-                s = re.sub(r',([ \t\r\n]*[}\]])', r'\1', s)
-                # Remove non-breaking spaces and invisible characters
-                s = s.replace('\u00A0', ' ')
-                # Remove unquoted property names (rare)
-                s = re.sub(r'([,{\[])(\s*)([a-zA-Z0-9_]+)(\s*):', r'\1\2"\3"\4:', s)
-                return s
+        summarizer.update(conversation)
+        prompt = build_prompt(language, order_context, summarizer.recent(conversation), user_input, summary=conversation.summary)
+        tier = classify_complexity(user_input, [item.name for item in order.items])
+        return None, {"prompt": prompt, "language": detected_language, "tier": tier, "model": model_for_tier(order.business_id, tier)}
+
+    async def _handle_llm_reply(self, turn: TurnContext, llm_raw: str, user_input: str, detected_language: str,
+                                decision: Optional[AgentDecision] = None) -> str:
+        """Parse the LLM reply (unless already decoded), apply its action and save the conversation. Returns the agent message."""
+        language = detected_language
+        order, conversation = turn.order, turn.conversation
+        # Raw replies repeat order details and the client's words: log their size only
+        logger.debug("LLM reply", extra={"order_id": turn.order_id, "chars": len(llm_raw)})
+        if decision is None:
+            decision = decode_decision(llm_raw.strip())
+        turn.llm_raw, turn.action = llm_raw, decision.action
+        data = {"message": decision.message, "action": decision.action, "modification": decision.modification_dict()}
+        # If the LLM action is confirm, update the order status
+        if data.get("action") == "confirm":
+            return await self._confirm_order(turn, detected_language)
+        elif data.get("action") == "cancel":
+            self._cancel_order(turn)
+        # Handle action if needed (e.g., apply modification)
+        # Only apply modification if not already pending
+        if data.get("action") in {"modify", "replace", "remove", "add"} and data.get("modification"):
+            ambiguous = None
             try:
-                match = re.search(r'\{.*\}', json_str, re.DOTALL)
-                if not match:
-                    raise ValueError("No JSON found in LLM output")
-                cleaned_json = repair_json(match.group(0))
-                print("[LLM CLEANED JSON]", cleaned_json)
-                data = json.loads(cleaned_json)
-            except Exception as e:
-                print(f"[LLM PARSE ERROR] {e}")
-                # Fallback: try to extract action and modification fields with regex
-                action_match = re.search(r'"action"\s*:\s*"(\w+)"', json_str)
-                mod_match = re.search(r'"modification"\s*:\s*(\{.*?\}|null)', json_str, re.DOTALL)
-                msg_match = re.search(r'"message"\s*:\s*"([^"]*)"', json_str)
-                data = {"action": None, "modification": None, "message": "[LLM parse fallback]"}
-                if action_match:
-                    data["action"] = action_match.group(1)
-                if mod_match:
-                    mod_val = mod_match.group(1)
-                    if mod_val == 'null':
-                        data["modification"] = None
-                    else:
-                        try:
-                            data["modification"] = json.loads(repair_json(mod_val))
-                        except Exception:
-                            data["modification"] = None
-                if msg_match:
-                    data["message"] = msg_match.group(1)
-            # If the LLM action is confirm, update the order status
-            if data.get("action") == "confirm":
-                # Always use the language detected from the most recent user message
-                if detected_language.startswith("en"):
-                    final_message = "Perfect, your order is confirmed. We are now preparing it. Thank you!"
-                else:
-                    final_message = "Parfait, votre commande est confirmée. Nous procédons à sa préparation. Merci !"
-                
-                await self.db.update_order(
-                    order_id,
-                    {
-                        "status": "confirmed",
-                        "confirmed_at": datetime.utcnow().isoformat()
-                    }
-                )
-
-                # Update WooCommerce order status
-                # Extract original WooCommerce order ID
-                woo_order_id = order_id.replace("woo_order_", "")
-                if woo_order_id.isdigit(): # Ensure it's a valid ID before sending to WC
-                    self.woocommerce_service.update_order_status(int(woo_order_id), "completed")
-                else:
-                    print(f"WARNING: Could not extract valid WooCommerce order ID from {order_id}")
-
-                # Move conversation to final state after confirmation
-                conversation.messages.append({"role": "assistant", "content": final_message})
-                conversation.current_step = "completed"
-                await self.db.update_conversation(order_id, conversation.dict())
-                return final_message
-            elif data.get("action") == "cancel":
-                await self.db.update_order(
-                    order_id,
-                    {
-                        "status": "cancelled",
-                        "cancelled_at": datetime.utcnow().isoformat()
-                    }
-                )
-            # Handle action if needed (e.g., apply modification)
-            # Only apply modification if not already pending
-            if data.get("action") in {"modify", "replace", "remove", "add"} and data.get("modification"):
-                applied_successfully = await self._apply_llm_modification(order_id, order, data["modification"], data["action"], conversation, user_input)
-                # --- Inform user if fewer items were removed than requested ---
-                if data.get("action") == "remove":
-                    norm = self._normalize_modification(data["modification"], data["action"])
-                    actually_removed = None
-                    if "actually_removed" in norm:
-                        actually_removed = norm["actually_removed"]
-                    # Try to get from the last applied norm if not present
-                    if not actually_removed and "actually_removed" in data["modification"]:
-                        actually_removed = data["modification"]["actually_removed"]
-                    requested = norm.get("old_qty", 1)
-                    removed = actually_removed
-                    if removed is not None and removed < requested:
-                        if language.startswith("en"):
-                            data["message"] = (data["message"] + f" Note: Only {removed} {norm['old_item']}(s) were removed because that was all that remained in your order.")
-                        else:
-                            data["message"] = (data["message"] + f" Note : Seulement {removed} {norm['old_item']}(s) ont été supprimé(s) car c'est tout ce qui restait dans votre commande.")
-                if not applied_successfully:
+                applied_successfully = await self._apply_llm_modification(turn, data["modification"], data["action"], user_input)
+            except AmbiguousNameError as e:
+                # Several items fit the name: ask instead of changing the wrong one
+                applied_successfully, ambiguous = False, e.names
+            # --- Inform user if fewer items were removed than requested ---
+            if data.get("action") == "remove":
+                norm = self._normalize_modification(data["modification"], data["action"])
+                actually_removed = None
+                if "actually_removed" in norm:
+                    actually_removed = norm["actually_removed"]
+                # Try to get from the last applied norm if not present
+                if not actually_removed and "actually_removed" in data["modification"]:
+                    actually_removed = data["modification"]["actually_removed"]
+                requested = norm.get("old_qty", 1)
+                removed = actually_removed
+                if removed is not None and removed < requested:
                     if language.startswith("en"):
-                        data["message"] = "I'm sorry, I didn't understand that. Could you please clarify your request?"
+                        data["message"] = (data["message"] + f" Note: Only {removed} {norm['old_item']}(s) were removed because that was all that remained in your order.")
                     else:
-                        data["message"] = "Je suis désolé, je n'ai pas compris. Pouvez-vous clarifier votre demande ?"
+                        data["message"] = (data["message"] + f" Note : Seulement {removed} {norm['old_item']}(s) ont été supprimé(s) car c'est tout ce qui restait dans votre commande.")
+            if ambiguous:
+                choices = ", ".join(ambiguous[:-1])
+                if language.startswith("en"):
+                    data["message"] = f"Which one do you mean: {choices} or {ambiguous[-1]}?"
+                else:
+                    data["message"] = f"Duquel parlez-vous : {choices} ou {ambiguous[-1]} ?"
+            elif not applied_successfully:
+                if language.startswith("en"):
+                    data["message"] = "I'm sorry, I didn't understand that. Could you please clarify your request?"
                 else:
-                    updated_order_data = await self.db.get_order(order_id)
-                    if isinstance(updated_order_data, str) and updated_order_data is not None:
-                        try:
-                            updated_order_data = json.loads(updated_order_data)
-                        except Exception as e:
-                            print(f"[ERROR] Could not parse updated_order_data: {e}")
-                            updated_order_data = None
-                    if isinstance(updated_order_data, dict):
-                        updated_order = Order(**updated_order_data)
-                        items_str = ", ".join([f"{item.name} x{item.quantity}" for item in updated_order.items])
-                        total = updated_order.total_amount
-                        if language.startswith("en"):
-                            confirmation_message = f"Your order now contains: {items_str}. The total is {total}€. Is your order now correct?"
-                        else:
-                            confirmation_message = f"Votre commande contient maintenant : {items_str}. Le total est de {total}€. Est-ce correct ?"
-                        data["message"] = confirmation_message
+                    data["message"] = "Je suis désolé, je n'ai pas compris. Pouvez-vous clarifier votre demande ?"
             else:
-                # Clear pending_modification if not a modification action
-                pass
-            # Save conversation state
-            # Force the agent to always generate its own message in the detected language for confirm/final state
-            if data.get("action") == "confirm":
-                if detected_language.startswith("en"):
-                    agent_message = "Perfect, your order is confirmed. We are now preparing it. Thank you!"
+                # The modification was applied to turn.lines in place: no need to read the order back
+                items_str = ", ".join([f"{line.name} x{line.quantity}" for line in turn.lines])
+                total = turn.lines.total
+                if language.startswith("en"):
+                    confirmation_message = f"Your order now contains: {items_str}. The total is {total}€. Is your order now correct?"
                 else:
-                    agent_message = "Parfait, votre commande est confirmée. Nous procédons à sa préparation. Merci !"
-                conversation.messages.append({"role": "assistant", "content": agent_message})
-                await self.db.update_conversation(order_id, conversation.dict())
-                return agent_message
+                    confirmation_message = f"Votre commande contient maintenant : {items_str}. Le total est de {total}€. Est-ce correct ?"
+                data["message"] = confirmation_message
+        else:
+            # Clear pending_modification if not a modification action
+            pass
+        # Save conversation state
+        # Force the agent to always generate its own message in the detected language for confirm/final state
+        if data.get("action") == "confirm":
+            if detected_language.startswith("en"):
+                agent_message = "Perfect, your order is confirmed. We are now preparing it. Thank you!"
             else:
-                conversation.messages.append({"role": "assistant", "content": data["message"]})
-                await self.db.update_conversation(order_id, conversation.dict())
-                return data["message"]
-        except Exception as e:
-            print(f"[LLM PARSE ERROR] {e}")
-            raise
+                agent_message = "Parfait, votre commande est confirmée. Nous procédons à sa préparation. Merci !"
+            conversation.messages.append({"role": "assistant", "content": agent_message})
+            turn.save_conversation()
+            return agent_message
+        else:
+            conversation.messages.append({"role": "assistant", "content": data["message"]})
+            turn.save_conversation()
+            return data["message"]
+
+    async def _confirm_order(self, turn: TurnContext, language: str) -> str:
+        """Mark the order confirmed locally and in WooCommerce, and close the conversation."""
+        # Always use the language detected from the most recent user message
+        if language.startswith("en"):
+            final_message = "Perfect, your order is confirmed. We are now preparing it. Thank you!"
+        else:
+            final_message = "Parfait, votre commande est confirmée. Nous procédons à sa préparation. Merci !"
+
+        order_id, conversation = turn.order_id, turn.conversation
+        turn.order.status = "confirmed"
+        turn.outcome = "confirm"
+        turn.update_order({
+            "status": "confirmed",
+            "confirmed_at": datetime.utcnow().isoformat()
+        })
+
+        # Update WooCommerce order status
+        # Extract original WooCommerce order ID
+        woo_order_id = order_id.replace("woo_order_", "")
+        if woo_order_id.isdigit(): # Ensure it's a valid ID before sending to WC
+            self.woocommerce_service.update_order_status(int(woo_order_id), "completed")
+        else:
+            logger.warning("Could not extract a valid WooCommerce order ID", extra={"order_id": order_id})
+
+        # Move conversation to final state after confirmation
+        conversation.messages.append({"role": "assistant", "content": final_message})
+        conversation.current_step = "completed"
+        turn.save_conversation()
+        summarizer.forget(order_id)
+        return final_message
+
+    def _cancel_order(self, turn: TurnContext) -> None:
+        turn.order.status = "cancelled"
+        turn.outcome = "cancel"
+        turn.update_order({
+            "status": "cancelled",
+            "cancelled_at": datetime.utcnow().isoformat()
+        })
+        summarizer.forget(turn.order_id)
+
+    async def _fast_path(self, turn: TurnContext, intent: str, user_input: str) -> Optional[str]:
+        """Answer an unambiguous confirm/cancel/thanks turn without calling the LLM.
+
+        Returns None when the order is not in a state the fast path handles, so the
+        caller falls through to the LLM path.
+        """
+        if not turn.order or turn.order.status != "pending":
+            return None
+        conversation = turn.conversation
+        language = self._detect_language(user_input, conversation)
+        conversation.messages.append({"role": "user", "content": user_input})
+        conversation.last_active = datetime.utcnow()
+        if intent == "confirm":
+            return await self._confirm_order(turn, language)
+        if intent == "cancel":
+            self._cancel_order(turn)
+            if language.startswith("en"):
+                message = "Your order has been cancelled. Feel free to contact us if you need anything else."
+            else:
+                message = "Votre commande a été annulée. N'hésitez pas à nous recontacter si besoin."
+        else:
+            if language.startswith("en"):
+                message = "You're welcome! Feel free to contact us if you need anything else."
+            else:
+                message = "Avec plaisir ! N'hésitez pas à nous contacter si besoin."
+        conversation.messages.append({"role": "assistant", "content": message})
+        turn.save_conversation()
+        return message
+
+    async def _call_llm_cached(self, prompt, order: Order, history: List[Dict[str, str]], user_input: str, language: str,
+                               tier: str, model: str) -> Tuple[str, Optional[AgentDecision]]:
+        """Call the LLM, reusing the reply of an identical earlier turn when the business allows it.
+
+        Returns the raw reply and, for a fresh reply that decodes as it is, its decision.
+        Replies that need the repair chain are not cached: a misread reply must not be served again.
+        """
+        cache = get_llm_cache()
+        if not cache.enabled or not get_business_settings(order.business_id).get("llm_cache", True):
+            return await self._call_llm_tiered(prompt, tier, model), None
+        key = make_cache_key(order.items, order.status, history, user_input, language, customer_name=order.customer_name, model=model)
+        cached = await cache.get(key, customer_name=order.customer_name)
+        if cached is not None:
+            return cached, None
+        llm_raw = await self._call_llm_tiered(prompt, tier, model)
+        decision = decode_structured(llm_raw)
+        if decision is not None:
+            await cache.set(key, llm_raw, customer_name=order.customer_name)
+        return llm_raw, decision
+
+    async def _call_llm_tiered(self, prompt, tier: str, model: str) -> str:
+        start = time.perf_counter()
+        with token_usage.capture() as usage:
+            llm_raw = await call_llm(prompt, model=model, max_tokens=256, response_schema=self._response_schema())
+        tier_stats.record(tier, model, time.perf_counter() - start, prompt, llm_raw, usage)
+        return llm_raw
+
+    def _response_schema(self) -> Optional[Dict]:
+        return AGENT_DECISION_SCHEMA if STRUCTURED_OUTPUT else None
 
     def _normalize_modification(self, modification, action=None):
         mod = modification if isinstance(modification, dict) else {}
@@ -591,117 +579,148 @@ Exemples :
             norm["new_item"] = mod.get("item") or mod.get("article_id_to_add")
             norm["new_qty"] = mod.get("quantity", 1)
             return norm
-        print(f"[WARN] Could not normalize LLM modification: {mod}")
+        logger.warning("Could not normalize LLM modification", extra={"keys": sorted(mod)})
         return norm
 
-    async def _apply_llm_modification(self, order_id, order, modification, action, conversation, user_input=None) -> bool:
+    @traced("agent.apply_modification")
+    async def _apply_llm_modification(self, turn: TurnContext, modification, action, user_input=None) -> bool:
         """Apply the modification as instructed by the LLM. Uses normalized canonical format. Prevents duplicate modifications."""
+        order_id, order = turn.order_id, turn.order
         norm = self._normalize_modification(modification, action)
-        print(f"[NORM] Normalized modification: {norm}")
+        logger.debug("Normalized modification", extra={"order_id": order_id, "action": norm["action"],
+                                                       "old_qty": norm["old_qty"], "new_qty": norm["new_qty"]})
         
         applied = False
+        lines = turn.lines
+        # Built once per turn: resolves "pizzas", "la table", "creme brulee" to the order's item names
+        item_index = NameIndex(lines.names())
         
         if norm["action"] == "replace" and norm["old_item"] and norm["new_item"]:
+            # Both names are resolved before the order changes: either can be ambiguous
+            old_item = self._find_order_item(item_index, lines, norm["old_item"])
+            existing, new_name, price, product_id = self._resolve_product(order, item_index, lines, norm["new_item"])
             # Always remove the old item completely
-            order.items = [i for i in order.items if i.name.lower() != norm["old_item"].lower()]
+            if old_item:
+                lines.discard(old_item)
+                if existing is old_item:
+                    existing = None
             # Add new item(s) with the specified quantity
-            existing = next((item for item in order.items if item.name.lower() == norm["new_item"].lower()), None)
             if existing:
-                existing.quantity += norm["new_qty"]
+                lines.set_quantity(existing, existing.quantity + norm["new_qty"])
             else:
-                # Try to infer price from any item with the same name (case-insensitive)
-                price = 0
-                for item in order.items:
-                    if item.name.lower() == norm["new_item"].lower():
-                        price = item.price
-                        break
-                # If not found, try to use the price of the last item as a fallback
-                if price == 0 and order.items:
-                    price = order.items[-1].price
-                order.items.append(OrderItem(
-                    name=norm["new_item"],
-                    quantity=norm["new_qty"],
-                    price=price,
-                    notes='Ajouté via LLM (replace)'))
+                # Unknown product: use the price of the last item as a fallback
+                if price is None:
+                    price = lines.last().price if lines else 0
+                lines.add(new_name, norm["new_qty"], price, product_id=product_id, notes='Ajouté via LLM (replace)')
             applied = True
             
         elif norm["action"] == "add" and norm["new_item"]:
-            existing = next((item for item in order.items if item.name.lower() == norm["new_item"].lower()), None)
+            existing, new_name, price, product_id = self._resolve_product(order, item_index, lines, norm["new_item"])
             if existing:
-                existing.quantity += norm["new_qty"]
+                lines.set_quantity(existing, existing.quantity + norm["new_qty"])
             else:
-                # Try to infer price from any item with the same name (case-insensitive)
-                price = 0
-                for item in order.items:
-                    if item.name.lower() == norm["new_item"].lower():
-                        price = item.price
-                        break
-                # If not found, try to use the price of the last item as a fallback
-                if price == 0 and order.items:
-                    price = order.items[-1].price
-                order.items.append(OrderItem(
-                    name=norm["new_item"],
-                    quantity=norm["new_qty"],
-                    price=price,
-                    notes='Ajouté via LLM (add)'))
+                # Unknown product: use the price of the last item as a fallback
+                if price is None:
+                    price = lines.last().price if lines else 0
+                lines.add(new_name, norm["new_qty"], price, product_id=product_id, notes='Ajouté via LLM (add)')
             applied = True
             
         elif norm["action"] == "remove" and norm["old_item"]:
             removed_count = 0
-            for item in order.items:
-                if item.name.lower() == norm["old_item"].lower():
-                    to_remove = min(norm["old_qty"], item.quantity)
-                    removed_count = to_remove
-                    item.quantity -= to_remove
-                    if item.quantity <= 0:
-                        order.items = [i for i in order.items if i.name.lower() != norm["old_item"].lower()]
-                    break
+            item = self._find_order_item(item_index, lines, norm["old_item"])
+            if item:
+                removed_count = lines.remove(item, norm["old_qty"])
             applied = True
             # Store removed_count in the object for later use in the confirmation message if needed
             norm["actually_removed"] = removed_count
             
         elif norm["action"] == "modify" and norm["old_item"] and norm["new_item"] and norm["new_qty"] is not None:
             # Set the quantity of the item directly
-            for item in order.items:
-                if item.name.lower() == norm["old_item"].lower():
-                    item.quantity = norm["new_qty"]
-                    applied = True
-                    break
+            item = self._find_order_item(item_index, lines, norm["old_item"])
+            if item:
+                lines.set_quantity(item, norm["new_qty"])
+                applied = True
         
         if not applied:
-            print(f"[WARN] Could not apply normalized modification: {norm}")
+            logger.warning("Could not apply normalized modification", extra={"order_id": order_id, "action": norm["action"]})
             return False
         
-        # Calculate the new total amount
-        new_total_amount = sum(item.price * item.quantity for item in order.items)
-        
-        # Update the order object with the new total
-        order.total_amount = new_total_amount
-        
-        # Update database with new total
-        await self.db.update_order(order_id, {
-            'items': json.dumps([item.dict() if hasattr(item, 'dict') else item for item in order.items]),
-            'total_amount': new_total_amount
-        })
+        # Items and the incrementally updated total are saved with the rest of the turn
+        turn.save_lines()
+        turn.outcome = "modify"
+        new_total_amount = lines.total
 
         # Update WooCommerce order details with the correct total
-        print(f"DEBUG: Order object in _apply_llm_modification: {order}")
-        print(f"DEBUG: order.woocommerce_order_id: {getattr(order, 'woocommerce_order_id', 'Attribute not found')}")
-        print(f"DEBUG: new_total_amount: {new_total_amount}")
+        logger.debug("Modification applied", extra={"order_id": order_id, "items": len(lines), "total_amount": new_total_amount})
         
         if order.woocommerce_order_id:
             woo_order_id = int(order.woocommerce_order_id)
-            self.woocommerce_service.update_order_details(woo_order_id, order.items, new_total_amount)
+            self.woocommerce_service.update_order_details(woo_order_id, list(lines), new_total_amount)
         else:
-            print(f"WARNING: WooCommerce order ID not found for local order {order_id}. Cannot update WooCommerce details.")
+            logger.warning("No WooCommerce order ID: WooCommerce details not updated", extra={"order_id": order_id})
 
         return True
 
-    async def process_message_basic(self, order_id: str, user_input: str) -> str:
-        # The old rule-based logic, unchanged. Just call the previous process_message logic here if fallback is needed.
-        # For now, call the previous implementation (copy the old process_message logic here if needed).
-        # This is a placeholder for the fallback.
-        return "[Fallback] LLM n'a pas compris. (Ancienne logique à implémenter ici.)"
+    def _find_order_item(self, item_index: NameIndex, lines: OrderLines, name: Optional[str]) -> Optional[Line]:
+        """The order line `name` refers to, if it is still in the order. Raises AmbiguousNameError."""
+        match = item_index.best(name) if name else None
+        if not match:
+            return None
+        return lines.get(match.name)
+
+    def _resolve_product(self, order: Order, item_index: NameIndex, lines: OrderLines,
+                         name: str) -> Tuple[Optional[Line], str, Optional[float], Optional[int]]:
+        """(order line, name, price, product_id) for a product the client wants to add.
+
+        The order's own items are matched first, by exact normalized name only:
+        more of an item already ordered is that line, but "table" is not more of
+        a "Tablette". Otherwise the cached WooCommerce catalog is searched, then
+        the business catalog names; the line is None for a new product, and price
+        and product_id are None when unknown. Raises AmbiguousNameError when the
+        catalog has several products for the name.
+        """
+        existing = self._exact_order_item(item_index, lines, name)
+        if existing:
+            return existing, existing.name, existing.price, existing.product_id
+        catalog = get_product_catalog()
+        product = catalog.lookup(name=name) if catalog else None
+        if product:
+            resolved, price, product_id = product["name"], product["price"], product["id"]
+        else:
+            index = get_catalog_index(order.business_id)
+            match = index.best(name) if index else None
+            resolved, price, product_id = (match.name if match else name), None, None
+        # The catalog spelling can still be an item of the order ("chaises" -> "Chaise en bois")
+        return self._exact_order_item(item_index, lines, resolved), resolved, price, product_id
+
+    def _exact_order_item(self, item_index: NameIndex, lines: OrderLines, name: str) -> Optional[Line]:
+        match = item_index.exact(name)
+        return lines.get(match.name) if match else None
+
+    async def process_message_basic(self, order_id: str, user_input: str, language: str = "fr") -> str:
+        """Reply used while the LLM is unavailable.
+
+        Clear confirmations and cancellations were already handled by the fast path,
+        so steer the client towards those and ask them to retry modifications later.
+        The exchange is saved to the conversation: the reply counts as a confirmation
+        question, so a bare "yes" on the next turn confirms without the LLM.
+        """
+        if self._detect_language(user_input).startswith("en") or language.startswith("en"):
+            reply = OVERLOAD_REPLY_EN
+        else:
+            reply = OVERLOAD_REPLY_FR
+        try:
+            turn = await TurnContext.load(self.db, order_id)
+            if turn.order and turn.order.status == "pending":
+                conversation = turn.start_conversation()
+                conversation.messages.append({"role": "user", "content": user_input})
+                conversation.messages.append({"role": "assistant", "content": reply})
+                conversation.last_active = datetime.utcnow()
+                turn.save_conversation()
+                await turn.commit()
+        except Exception as e:
+            logger.warning("Could not save the fallback turn: %s", e, extra={"order_id": order_id})
+        return reply
 
     async def _handle_modification_request(self, order_context: str) -> str:
         # Stub implementation for missing method
@@ -709,7 +728,8 @@ Exemples :
 
     def _is_clear_confirmation(self, user_input: str) -> bool:
         # Stub implementation for missing method
-        return any(word in user_input.lower() for word in ["oui", "non", "correct", "incorrect", "yes", "no"])
+        hits = match_keywords(user_input)
+        return "confirm" in hits or "deny" in hits
 
     async def _parse_modification_request(self, user_input: str, order_context: str, order_items: List[str]) -> Optional[Dict]:
         # Stub implementation for missing method
@@ -753,31 +773,18 @@ Status: {order.status}
         Statut: {order.status}
         """
     
-    def _format_conversation_history(self, messages: List[Dict[str, str]]) -> str:
-        context_messages = messages[-10:]
-        if len(messages) > 10:
-            summary = f"[Résumé: Conversation commencée il y a {len(messages)} messages]\n"
-        else:
-            summary = ""
-        history = [f"{ 'Client' if msg['role'] == 'user' else 'Agent'}: {msg['content']}" 
-                  for msg in context_messages]
-        return summary + "\n".join(history)
+    def _format_conversation_history(self, messages: List[Dict[str, str]], summary: Optional[str] = None) -> str:
+        return fit_history(messages, summary=summary)
     
-    def _analyze_sentiment(self, text: str) -> float:
-        positive_words = ["merci", "parfait", "super", "content"]
-        negative_words = ["fâché", "mécontent", "déçu", "insatisfait"]
-        score = 0
-        for word in positive_words:
-            if word in text.lower():
-                score += 1
-        for word in negative_words:
-            if word in text.lower():
-                score -= 1
-        return score
+    def _analyze_sentiment(self, text: str, hits: Optional[KeywordHits] = None) -> float:
+        hits = hits or match_keywords(text)
+        # One point per distinct word, as the old per-word substring checks did
+        return (len(hits.words.intersection(KEYWORD_GROUPS["positive"]))
+                - len(hits.words.intersection(KEYWORD_GROUPS["negative"])))
 
     async def _generate_response(self, order_context: str, current_step: str, 
                         conversation_history: str, user_input: str, conversation=None) -> Tuple[str, ConversationState]:
-        print(f"[DEBUG] _generate_response: current_step={current_step}, modification_request={getattr(conversation, 'modification_request', None) if conversation else None}")
+        logger.debug("_generate_response", extra={"step": current_step})
         order_id_match = re.search(r"Commande ID: (.+)", order_context)
         order_id = order_id_match.group(1).strip() if order_id_match else ""
         if not conversation:
@@ -792,11 +799,11 @@ Status: {order.status}
             else:
                 conversation = ConversationState(**conversation_data)
         conversation.last_active = datetime.utcnow()
-        sentiment = self._analyze_sentiment(user_input)
+        hits = match_keywords(user_input)
+        sentiment = self._analyze_sentiment(user_input, hits)
         if sentiment <= -1:
             return ("Je m'excuse pour ce désagrément. Comment puis-je vous aider à résoudre ce problème ?", conversation)
-        user_input_lower = user_input.lower()
-        if any(word in user_input_lower for word in ["annuler", "stop", "arrêter"]):
+        if "cancel" in hits:
             return ("Voulez-vous vraiment annuler la confirmation de commande ?", conversation)
         customer_name = "client"
         match = re.search(r"Client: (.+)", order_context)
@@ -805,17 +812,17 @@ Status: {order.status}
         items_text = order_context.split('Articles:')[1].split('Total:')[0]
         order_items = [line.split(' x')[0].strip('- ').strip() for line in items_text.split('\n') if line.strip() and 'x' in line]
         if current_step == "greeting":
-            if "modifier" in user_input_lower:
+            if "modifier" in hits.words:
                 return (await self._handle_modification_request(order_context), conversation)
             return (f"Bonjour {customer_name}! Je vous appelle pour confirmer votre commande. {order_context.split('Articles:')[1].split('Total:')[0]} pour un total de {order_context.split('Total: ')[1].split('€')[0]}€. Est-ce que ces informations sont correctes ?", conversation)
         elif current_step == "confirming_items":
-            if not self._is_clear_confirmation(user_input):
+            if "confirm" not in hits and "deny" not in hits:
                 return ("Je ne suis pas certain d'avoir bien compris. "
                         "Pouvez-vous préciser si les articles mentionnés sont corrects "
                         "ou s'il y a des modifications à apporter ?", conversation)
-            if any(word in user_input_lower for word in ["oui", "correct", "ok", "d'accord"]):
+            if "confirm" in hits:
                 return ("Parfait ! Pouvez-vous me confirmer votre nom et votre adresse de livraison ?", conversation)
-            elif any(word in user_input_lower for word in ["non", "incorrect", "erreur"]):
+            elif "deny" in hits:
                 return ("Je vois qu'il y a un problème avec votre commande. "
                         "Pouvez-vous me préciser quel article vous souhaitez modifier ou supprimer ?\n"
                         "Par exemple:\n"
@@ -830,18 +837,16 @@ Status: {order.status}
                     return (self._get_modification_confirmation_prompt(modification), conversation)
                 return ("Je ne suis pas sûr de comprendre. Pouvez-vous me dire si les articles de votre commande sont corrects ?", conversation)
         elif current_step == "modifying_items":
-            print(f"[DEBUG] _generate_response (modifying_items): modification_request={getattr(conversation, 'modification_request', None)}")
             result, conversation = await self._process_modification(order_context, user_input, conversation=conversation)
-            print(f"[DEBUG] _generate_response (after _process_modification): modification_request={getattr(conversation, 'modification_request', None)}")
             return (result, conversation)
         elif current_step == "confirming_address":
             # Prompt user for delivery address or confirm it
             address = getattr(conversation, 'pending_address', None)
-            lang = self._detect_language(user_input)
+            lang = self._detect_language(user_input, conversation)
             if not address:
                 # Try to extract address from user_input
                 user_address = user_input.strip()
-                if any(word in user_address.lower() for word in ["oui", "correct", "ok", "d'accord"]):
+                if "confirm" in hits:
                     # User just said yes, but no address provided; ask for address
                     if lang.startswith("en"):
                         return ("Could you please provide your delivery address?", conversation)
@@ -855,7 +860,7 @@ Status: {order.status}
                     return (f"Pour confirmer, est-ce bien votre adresse de livraison : '{user_address}' ? (Oui/Non)", conversation)
             else:
                 # User confirms the address
-                if any(word in user_input.lower() for word in ["oui", "correct", "ok", "d'accord"]):
+                if "confirm" in hits:
                     # Save address to order and clear pending_address
                     order_id = conversation.order_id
                     await self.db.update_order(order_id, {"delivery_address": address})
@@ -879,7 +884,7 @@ Status: {order.status}
             conversation.current_step = "final_confirmation"
             return ("Merci, nous récapitulons votre commande. Confirmez-vous que tout est correct avant que nous procédions à la préparation ?", conversation)
         elif current_step == "final_confirmation":
-            if any(word in user_input_lower for word in ["oui", "confirme", "ok", "d'accord"]):
+            if "confirm" in hits:
                 await self.db.update_order(
                     order_id=order_context.split('Commande ID: ')[1].split('\n')[0],
                     updates={"status": "confirmed", "confirmed_at": datetime.utcnow().isoformat()})
@@ -900,16 +905,16 @@ Status: {order.status}
             "confirming_details": "final_confirmation",
             "final_confirmation": "completed"
         }
+        hits = match_keywords(user_input)
         # If user wants to modify items
-        if current_step == "confirming_items" and any(word in user_input.lower() 
-        for word in ["changer", "modifier", "remplacer", "supprimer", "ajouter"]):
+        if current_step == "confirming_items" and "modify" in hits:
             return "modifying_items"
         
         # If confirming details, move to final confirmation
-        if current_step == "confirming_details" and any(word in user_input.lower() for word in ["oui", "correct", "ok", "d'accord"]):
+        if current_step == "confirming_details" and "confirm" in hits:
             return "final_confirmation"
         # If final confirmation, complete
-        if current_step == "final_confirmation" and any(word in user_input.lower() for word in ["oui", "confirme", "ok", "d'accord"]):
+        if current_step == "final_confirmation" and "confirm" in hits:
             return "completed"
         return step_transitions.get(current_step, current_step)
 
@@ -1,6 +1,6 @@
 # src/agent/database/base.py
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any  # Added Any import
+from typing import List, Dict, Optional, Any, Tuple  # Added Any import
 from pydantic import BaseModel
 
 class DatabaseInterface(ABC):
@@ -18,4 +18,26 @@ class DatabaseInterface(ABC):
     
     @abstractmethod
     def update_conversation(self, order_id: str, conversation: Dict[str, Any]) -> bool:  # Fixed
-        pass
\ No newline at end of file
+        pass
+
+    async def load_turn(self, order_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Order and conversation of `order_id`: (order, conversation), either None if missing.
+
+        Implementations should read both in one query; this default makes two calls.
+        """
+        order = await self.get_order(order_id)
+        if order is None:
+            return None, None
+        return order, await self.get_conversation(order_id)
+
+    async def save_turn(self, order_id: str, order_updates: Optional[Dict[str, Any]] = None,
+                        conversation: Optional[Dict[str, Any]] = None) -> bool:
+        """Apply order updates and save the conversation.
+
+        Implementations should write both in one transaction; this default makes two calls.
+        """
+        if order_updates:
+            await self.update_order(order_id, order_updates)
+        if conversation is not None:
+            await self.update_conversation(order_id, conversation)
+        return True
@@ -1,5 +1,5 @@
 # src/agent/database/sqlite.py
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Tuple
 from datetime import datetime
 import json
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
@@ -7,6 +7,8 @@ from sqlalchemy.orm import sessionmaker
 from .models import Base, OrderModel, ConversationModel, BusinessUser
 from src.api.schemas import OrderItem
 from .base import DatabaseInterface
+from src.services.metrics import db_query_seconds, observe_async
+from src.services.tracing import traced
 from sqlalchemy import select, delete
 
 from sqlalchemy import create_engine
@@ -25,6 +27,8 @@ class SQLiteDatabase(DatabaseInterface):
     def get_session(self):
         return self.SyncSession()
 
+    @observe_async(db_query_seconds, "create_order")
+    @traced("db.create_order")
     async def create_order(self, order_data: Dict) -> None:
         async with self.AsyncSession() as session:
             order_data['created_at'] = datetime.fromisoformat(order_data['created_at'])
@@ -32,48 +36,62 @@ class SQLiteDatabase(DatabaseInterface):
             session.add(order)
             await session.commit()
 
+    @observe_async(db_query_seconds, "get_order")
+    @traced("db.get_order")
     async def get_order(self, order_id: str) -> Optional[Dict]:
         async with self.AsyncSession() as session:
             result = await session.execute(select(OrderModel).filter_by(id=order_id))
             order = result.scalars().first()
             if order:
-                items = order.items
-                if isinstance(items, str):
-                    try:
-                        items = json.loads(items)
-                    except Exception:
-                        items = []
-                return {
-                    "id": order.id,
-                    "customer_name": order.customer_name,
-                    "customer_phone": order.customer_phone,
-                    "items": items,
-                    "total_amount": order.total_amount,
-                    "status": order.status,
-                    "created_at": order.created_at.isoformat(),
-                    "confirmed_at": order.confirmed_at.isoformat() if order.confirmed_at else None,
-                    "notes": order.notes,
-                    "woocommerce_order_id": order.woocommerce_order_id,
-                    "business_id": order.business_id,
-                    "site_url": order.site_url,
-                    "site_id": order.site_id
-                }
+                return self._order_to_dict(order)
         return None
 
+    @observe_async(db_query_seconds, "update_order")
+    @traced("db.update_order")
     async def update_order(self, order_id: str, updates: Dict[str, Any]) -> bool:
         async with self.AsyncSession() as session:
             result = await session.execute(select(OrderModel).filter_by(id=order_id))
             order = result.scalars().first()
             if order:
-                for key, value in updates.items():
-                    if key == "confirmed_at" and isinstance(value, str):
-                        setattr(order, key, datetime.fromisoformat(value))
-                    else:
-                        setattr(order, key, value)
+                self._apply_order_updates(order, updates)
                 await session.commit()
                 return True
         return False
 
+    @observe_async(db_query_seconds, "load_turn")
+    @traced("db.load_turn")
+    async def load_turn(self, order_id: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Order and conversation of `order_id` in one query: (order, conversation), either None if missing."""
+        async with self.AsyncSession() as session:
+            result = await session.execute(
+                select(OrderModel, ConversationModel)
+                .outerjoin(ConversationModel, ConversationModel.order_id == OrderModel.id)
+                .filter(OrderModel.id == order_id)
+            )
+            row = result.first()
+            if not row:
+                return None, None
+            order, conv = row
+            return self._order_to_dict(order), self._conversation_to_dict(conv) if conv else None
+
+    @observe_async(db_query_seconds, "save_turn")
+    @traced("db.save_turn")
+    async def save_turn(self, order_id: str, order_updates: Optional[Dict[str, Any]] = None,
+                        conversation: Optional[Dict] = None) -> bool:
+        """Apply order updates and save the conversation in a single transaction."""
+        async with self.AsyncSession() as session:
+            if order_updates:
+                order = await session.get(OrderModel, order_id)
+                if order:
+                    self._apply_order_updates(order, order_updates)
+            if conversation is not None:
+                conv = await session.get(ConversationModel, order_id)
+                self._write_conversation(session, conv, order_id, conversation)
+            await session.commit()
+            return True
+
+    @observe_async(db_query_seconds, "get_order_by_phone")
+    @traced("db.get_order_by_phone")
     async def get_order_by_phone(self, phone_number: str) -> Optional[Dict]:
         """Get the most recent active order for a given phone number."""
         async with self.AsyncSession() as session:
@@ -83,87 +101,126 @@ class SQLiteDatabase(DatabaseInterface):
             ).order_by(OrderModel.id.desc()))
             order = result.scalars().first()
             if order:
-                items = order.items
-                if isinstance(items, str):
-                    try:
-                        items = json.loads(items)
-                    except Exception:
-                        items = []
-                return {
-                    "id": order.id,
-                    "customer_name": order.customer_name,
-                    "customer_phone": order.customer_phone,
-                    "items": items,
-                    "total_amount": order.total_amount,
-                    "status": order.status,
-                    "created_at": order.created_at.isoformat(),
-                    "confirmed_at": order.confirmed_at.isoformat() if order.confirmed_at else None,
-                    "notes": order.notes,
-                    "woocommerce_order_id": order.woocommerce_order_id,
-                    "business_id": order.business_id,
-                    "site_url": order.site_url,
-                    "site_id": order.site_id
-                }
+                return self._order_to_dict(order)
         return None
 
+    @observe_async(db_query_seconds, "get_conversation")
+    @traced("db.get_conversation")
     async def get_conversation(self, order_id: str) -> Optional[Dict]:
         async with self.AsyncSession() as session:
             result = await session.execute(select(ConversationModel).filter_by(order_id=order_id))
             conv = result.scalars().first()
             if conv:
-                # Try to load pending_address if present (backward compatible)
-                pending_address = getattr(conv, 'pending_address', None)
-                try:
-                    # If stored as a JSON in notes or elsewhere
-                    if hasattr(conv, 'notes') and conv.notes:
-                        notes_data = json.loads(conv.notes)
-                        pending_address = notes_data.get('pending_address', pending_address)
-                except Exception:
-                    pass
-                return {
-                    "order_id": conv.order_id,
-                    "messages": json.loads(conv.messages),
-                    "current_step": conv.current_step,
-                    "confirmed_items": json.loads(conv.confirmed_items),
-                    "issues_found": json.loads(conv.issues_found),
-                    "pending_address": pending_address
-                }
+                return self._conversation_to_dict(conv)
         return None
 
+    @observe_async(db_query_seconds, "update_conversation")
+    @traced("db.update_conversation")
     async def update_conversation(self, order_id: str, conversation: Dict) -> bool:
         async with self.AsyncSession() as session:
             result = await session.execute(select(ConversationModel).filter_by(order_id=order_id))
             conv = result.scalars().first()
-            if conv:
-                # Update existing
-                conv.messages = json.dumps(conversation["messages"])
-                conv.current_step = conversation["current_step"]
-                conv.confirmed_items = json.dumps(conversation.get("confirmed_items", []))
-                conv.issues_found = json.dumps(conversation.get("issues_found", []))
-                # Persist pending_address in notes as JSON
-                notes_data = {}
-                try:
-                    if conv.notes:
-                        notes_data = json.loads(conv.notes)
-                except Exception:
-                    notes_data = {}
-                notes_data["pending_address"] = conversation.get("pending_address")
-                conv.notes = json.dumps(notes_data)
-            else:
-                # Create new
-                notes_data = {"pending_address": conversation.get("pending_address")}
-                new_conv = ConversationModel(
-                    order_id=order_id,
-                    messages=json.dumps(conversation["messages"]),
-                    current_step=conversation["current_step"],
-                    confirmed_items=json.dumps(conversation.get("confirmed_items", [])),
-                    issues_found=json.dumps(conversation.get("issues_found", [])),
-                    notes=json.dumps(notes_data)
-                )
-                session.add(new_conv)
+            self._write_conversation(session, conv, order_id, conversation)
             await session.commit()
             return True
 
+    @staticmethod
+    def _order_to_dict(order: OrderModel) -> Dict:
+        items = order.items
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except Exception:
+                items = []
+        return {
+            "id": order.id,
+            "customer_name": order.customer_name,
+            "customer_phone": order.customer_phone,
+            "items": items,
+            "total_amount": order.total_amount,
+            "status": order.status,
+            "created_at": order.created_at.isoformat(),
+            "confirmed_at": order.confirmed_at.isoformat() if order.confirmed_at else None,
+            "notes": order.notes,
+            "woocommerce_order_id": order.woocommerce_order_id,
+            "business_id": order.business_id,
+            "site_url": order.site_url,
+            "site_id": order.site_id
+        }
+
+    @staticmethod
+    def _apply_order_updates(order: OrderModel, updates: Dict[str, Any]):
+        for key, value in updates.items():
+            if key == "confirmed_at" and isinstance(value, str):
+                setattr(order, key, datetime.fromisoformat(value))
+            else:
+                setattr(order, key, value)
+
+    @staticmethod
+    def _conversation_to_dict(conv: ConversationModel) -> Dict:
+        # Try to load pending_address if present (backward compatible)
+        pending_address = getattr(conv, 'pending_address', None)
+        notes_data = {}
+        try:
+            # If stored as a JSON in notes or elsewhere
+            if hasattr(conv, 'notes') and conv.notes:
+                notes_data = json.loads(conv.notes)
+                pending_address = notes_data.get('pending_address', pending_address)
+        except Exception:
+            pass
+        return {
+            "order_id": conv.order_id,
+            "messages": json.loads(conv.messages),
+            "current_step": conv.current_step,
+            "confirmed_items": json.loads(conv.confirmed_items),
+            "issues_found": json.loads(conv.issues_found),
+            "pending_address": pending_address,
+            "summary": notes_data.get("summary"),
+            "summarized_count": notes_data.get("summarized_count", 0),
+            "language": notes_data.get("language")
+        }
+
+    @staticmethod
+    def _write_conversation(session, conv: Optional[ConversationModel], order_id: str, conversation: Dict):
+        """Update `conv` from a ConversationState dict, or add a new row when it is None."""
+        if conv:
+            # Update existing
+            conv.messages = json.dumps(conversation["messages"])
+            conv.current_step = conversation["current_step"]
+            conv.confirmed_items = json.dumps(conversation.get("confirmed_items", []))
+            conv.issues_found = json.dumps(conversation.get("issues_found", []))
+            # Persist pending_address in notes as JSON
+            notes_data = {}
+            try:
+                if conv.notes:
+                    notes_data = json.loads(conv.notes)
+            except Exception:
+                notes_data = {}
+            notes_data["pending_address"] = conversation.get("pending_address")
+            notes_data["summary"] = conversation.get("summary")
+            notes_data["summarized_count"] = conversation.get("summarized_count", 0)
+            notes_data["language"] = conversation.get("language")
+            conv.notes = json.dumps(notes_data)
+        else:
+            # Create new
+            notes_data = {
+                "pending_address": conversation.get("pending_address"),
+                "summary": conversation.get("summary"),
+                "summarized_count": conversation.get("summarized_count", 0),
+                "language": conversation.get("language")
+            }
+            new_conv = ConversationModel(
+                order_id=order_id,
+                messages=json.dumps(conversation["messages"]),
+                current_step=conversation["current_step"],
+                confirmed_items=json.dumps(conversation.get("confirmed_items", [])),
+                issues_found=json.dumps(conversation.get("issues_found", [])),
+                notes=json.dumps(notes_data)
+            )
+            session.add(new_conv)
+
+    @observe_async(db_query_seconds, "delete_conversation")
+    @traced("db.delete_conversation")
     async def delete_conversation(self, order_id: str) -> bool:
         """Delete conversation for an order"""
         async with self.AsyncSession() as session:
@@ -171,6 +228,8 @@ class SQLiteDatabase(DatabaseInterface):
             await session.commit()
             return True
 
+    @observe_async(db_query_seconds, "get_all_orders")
+    @traced("db.get_all_orders")
     async def get_all_orders(self) -> list[Dict]:
         """Get all orders from the database."""
         async with self.AsyncSession() as session:
@@ -201,16 +260,22 @@ class SQLiteDatabase(DatabaseInterface):
                 })
             return orders
 
+    @observe_async(db_query_seconds, "get_business_user_by_username")
+    @traced("db.get_business_user_by_username")
     async def get_business_user_by_username(self, username: str) -> Optional[BusinessUser]:
         async with self.AsyncSession() as session:
             result = await session.execute(select(BusinessUser).filter_by(username=username))
             return result.scalars().first()
 
+    @observe_async(db_query_seconds, "get_business_user_by_api_key")
+    @traced("db.get_business_user_by_api_key")
     async def get_business_user_by_api_key(self, api_key: str) -> Optional[BusinessUser]:
         async with self.AsyncSession() as session:
             result = await session.execute(select(BusinessUser).filter_by(api_key=api_key))
             return result.scalars().first()
 
+    @observe_async(db_query_seconds, "get_orders_by_business_id")
+    @traced("db.get_orders_by_business_id")
     async def get_orders_by_business_id(self, business_id: str, skip: int = 0, limit: int = 10) -> List[Dict]:
         async with self.AsyncSession() as session:
             result = await session.execute(
@@ -245,6 +310,8 @@ class SQLiteDatabase(DatabaseInterface):
                 })
             return orders
 
+    @observe_async(db_query_seconds, "get_order_by_business_id")
+    @traced("db.get_order_by_business_id")
     async def get_order_by_business_id(self, order_id: str, business_id: str) -> Optional[Dict]:
         async with self.AsyncSession() as session:
             result = await session.execute(
@@ -274,4 +341,4 @@ class SQLiteDatabase(DatabaseInterface):
                     "site_url": order.site_url,
                     "site_id": order.site_id
                 }
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import time
+import logging
+from typing import Any, Optional
+from pydantic import BaseModel, ValidationError, validator
+from src.services.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Ask the provider for schema-constrained JSON (response MIME type + schema)
+STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() != "false"
+
+ACTIONS = ("confirm", "modify", "cancel", "add", "remove", "replace", "none")
+FALLBACK_MESSAGE = "[LLM parse fallback]"
+
+# Response schema in the OpenAPI subset accepted by Gemini's `response_schema`
+AGENT_DECISION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "message": {"type": "STRING"},
+        "action": {"type": "STRING", "enum": list(ACTIONS)},
+        "modification": {
+            "type": "OBJECT",
+            "nullable": True,
+            "properties": {
+                "item": {"type": "STRING", "nullable": True},
+                "quantity": {"type": "INTEGER", "nullable": True},
+                "old_item": {"type": "STRING", "nullable": True},
+                "new_item": {"type": "STRING", "nullable": True},
+            },
+        },
+    },
+    "required": ["message", "action"],
+}
+
+
+class Modification(BaseModel):
+    """Typed view of the schema's fields. Other keys are kept, since unstructured replies
+    and old cache entries use the legacy shapes `_normalize_modification` understands."""
+
+    item: Optional[str] = None
+    quantity: Any = None  # An int, or {item: delta} in the legacy delta shape
+    old_item: Optional[str] = None
+    new_item: Optional[str] = None
+
+    class Config:
+        extra = "allow"
+
+
+class AgentDecision(BaseModel):
+    """The agent's reply to one turn: what to say and which action to apply."""
+
+    message: str
+    action: str = "none"
+    modification: Optional[Modification] = None
+
+    @validator("action", pre=True)
+    def check_action(cls, v):
+        v = str(v or "none").strip().lower()
+        if v not in ACTIONS:
+            raise ValueError(f"unknown action: {v}")
+        return v
+
+    def modification_dict(self) -> Optional[dict]:
+        """The modification with the keys the LLM sent, and only those."""
+        return self.modification.dict(exclude_unset=True) if self.modification else None
+
+
+class DecoderStats:
+    """How often LLM replies decode in one pass versus needing the regex fallback."""
+
+    def __init__(self):
+        self.decoded = 0
+        self.fallbacks = 0
+        self.fallback_seconds = 0.0
+
+    def stats(self):
+        total = self.decoded + self.fallbacks
+        return {
+            "decoded": self.decoded,
+            "fallbacks": self.fallbacks,
+            "fallback_ratio": round(self.fallbacks / total, 3) if total else 0.0,
+            "avg_fallback_ms": round(1000 * self.fallback_seconds / self.fallbacks, 3) if self.fallbacks else 0.0,
+        }
+
+
+decoder_stats = DecoderStats()
+
+
+@traced("llm.parse")
+def decode_decision(raw: str) -> AgentDecision:
+    """Validate the raw LLM reply into an AgentDecision in a single pass.
+
+    Replies that are not valid JSON for the schema (free-text models, a provider
+    without structured output, old cache entries) go through the regex fallback,
+    which is counted in `decoder_stats`.
+    """
+    decision = decode_structured(raw)
+    if decision is not None:
+        return decision
+    start = time.perf_counter()
+    try:
+        return _fallback_decision(raw)
+    finally:
+        decoder_stats.fallbacks += 1
+        decoder_stats.fallback_seconds += time.perf_counter() - start
+
+
+def decode_structured(raw: str) -> Optional[AgentDecision]:
+    """The AgentDecision of a reply that is valid JSON for the schema as it is, else None."""
+    try:
+        decision = AgentDecision.parse_raw(raw)
+    except (ValidationError, ValueError, TypeError):
+        return None
+    decoder_stats.decoded += 1
+    return decision
+
+
+_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r',([ \t\r\n]*[}\]])')
+_UNQUOTED_KEY_RE = re.compile(r'([,{\[])(\s*)([a-zA-Z0-9_]+)(\s*):')
+# Single quotes used as JSON delimiters only; apostrophes inside words ("l'article") are kept
+_SINGLE_QUOTE_RE = re.compile(r"(?<=[{\[,:])(\s*)'|'(?=\s*[:,}\]])")
+_ACTION_RE = re.compile(r'"action"\s*:\s*"(\w+)"')
+_MODIFICATION_RE = re.compile(r'"modification"\s*:\s*(\{.*?\}|null)', re.DOTALL)
+_MESSAGE_RE = re.compile(r'"message"\s*:\s*"([^"]*)"')
+
+
+def _repair_json(s: str) -> str:
+    s = s.replace("\\'", "'")  # \' is not a valid JSON escape
+    s = _SINGLE_QUOTE_RE.sub(lambda m: (m.group(1) or "") + '"', s)
+    s = _TRAILING_COMMA_RE.sub(r'\1', s)
+    s = s.replace('\u00A0', ' ')
+    return _UNQUOTED_KEY_RE.sub(r'\1\2"\3"\4:', s)
+
+
+def _fallback_decision(raw: str) -> AgentDecision:
+    """Legacy repair chain: extract the JSON object, repair it, then regex out the fields."""
+    logger.debug("Structured decode failed, using the repair chain", extra={"chars": len(raw)})
+    match = _OBJECT_RE.search(raw)
+    if match:
+        try:
+            return AgentDecision.parse_raw(_repair_json(match.group(0)))
+        except (ValidationError, ValueError, TypeError) as e:
+            logger.debug("Repaired JSON still invalid: %s", e)
+    action_match = _ACTION_RE.search(raw)
+    mod_match = _MODIFICATION_RE.search(raw)
+    msg_match = _MESSAGE_RE.search(raw)
+    action = action_match.group(1).lower() if action_match else "none"
+    modification = None
+    if mod_match and mod_match.group(1) != "null":
+        try:
+            modification = Modification(**json.loads(_repair_json(mod_match.group(1))))
+        except (ValidationError, ValueError, TypeError):
+            modification = None
+    return AgentDecision(
+        message=msg_match.group(1) if msg_match else FALLBACK_MESSAGE,
+        action=action if action in ACTIONS else "none",
+        modification=modification,
+    )
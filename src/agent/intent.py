@@ -0,0 +1,112 @@
+import re
+import time
+from typing import Optional, Tuple
+
+# Whole-message phrases (after normalization) that are unambiguous on their own.
+CONFIRM_PHRASES = {
+    "oui", "yes", "ok", "okay", "correct", "d'accord", "daccord", "parfait", "c'est bon",
+    "c'est correct", "oui c'est correct", "oui c'est bon", "oui parfait", "oui merci", "oui d'accord",
+    "tout est correct", "c'est parfait", "je confirme", "confirme", "confirmé", "yes please", "yep",
+    "yeah", "that's correct", "yes that's correct", "yes it is", "perfect", "all good", "i confirm", "confirmed",
+}
+CANCEL_PHRASES = {
+    "annuler", "annulez", "annuler la commande", "annuler ma commande", "annulez ma commande",
+    "je veux annuler", "je veux annuler ma commande", "je souhaite annuler ma commande",
+    "cancel", "cancel order", "cancel my order", "cancel the order", "please cancel my order",
+    "i want to cancel", "i want to cancel my order",
+}
+THANKS_PHRASES = {
+    "merci", "merci beaucoup", "merci bien", "thanks", "thank you", "thank you very much", "thanks a lot",
+}
+
+# Assistant questions after which a bare "yes" confirms the order.
+CONFIRMATION_QUESTIONS = (
+    "is your order now correct?",
+    "est-ce correct ?",
+    "est-ce que tout est correct",
+    "is everything correct",
+    "is that correct",
+    "est-ce en ordre",
+    "is your order correct",
+    "est-ce que c'est correct",
+    "is this correct",
+    # The overload reply of process_message_basic, so a bare "yes" confirms while the LLM is down
+    "reply \"yes\" to confirm",
+    "répondre « oui » pour confirmer",
+)
+
+_PUNCTUATION_RE = re.compile(r"[!?.,;:…\"()\[\]]+")
+_SPACES_RE = re.compile(r"\s+")
+
+def normalize_utterance(text: str) -> str:
+    text = text.strip().lower().replace("’", "'")
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+def is_confirmation_question(message: Optional[str]) -> bool:
+    if not message:
+        return False
+    message = message.lower()
+    return any(phrase in message for phrase in CONFIRMATION_QUESTIONS)
+
+def classify_intent(user_input: str, awaiting_confirmation: bool) -> Optional[str]:
+    """Return 'confirm', 'cancel' or 'thanks' for unambiguous messages, None otherwise.
+
+    Only whole-message matches count, so anything with extra content
+    ("oui mais sans la table") is left to the LLM. Confirm and cancel change
+    the order, so they only count as answers to a confirmation question.
+    """
+    text = normalize_utterance(user_input)
+    if not text:
+        return None
+    if text in CONFIRM_PHRASES:
+        return "confirm" if awaiting_confirmation else None
+    if text in CANCEL_PHRASES:
+        return "cancel" if awaiting_confirmation else None
+    if text in THANKS_PHRASES:
+        return "thanks"
+    return None
+
+
+class FastPathStats:
+    """Counts how many turns were answered without an LLM call."""
+
+    def __init__(self):
+        self.turns = 0
+        self.bypassed = 0
+        self.by_intent = {}
+        self.classify_seconds = 0.0
+
+    def record(self, intent: Optional[str], elapsed: float = 0.0):
+        """Count a turn; `intent` is the fast-path intent that answered it, None when the LLM did."""
+        self.turns += 1
+        self.classify_seconds += elapsed
+        if intent:
+            self.bypassed += 1
+            self.by_intent[intent] = self.by_intent.get(intent, 0) + 1
+
+    @property
+    def bypass_ratio(self) -> float:
+        return self.bypassed / self.turns if self.turns else 0.0
+
+    def stats(self):
+        return {
+            "turns": self.turns,
+            "bypassed": self.bypassed,
+            "bypass_ratio": round(self.bypass_ratio, 4),
+            "by_intent": dict(self.by_intent),
+            "avg_classify_ms": round(1000 * self.classify_seconds / self.turns, 4) if self.turns else 0.0,
+        }
+
+
+fast_path_stats = FastPathStats()
+
+def timed_classify(user_input: str, awaiting_confirmation: bool) -> Tuple[Optional[str], float]:
+    """classify_intent and the seconds it took.
+
+    The caller records the turn in `fast_path_stats` once it knows whether the
+    fast path answered: a classified turn can still need the LLM.
+    """
+    start = time.perf_counter()
+    intent = classify_intent(user_input, awaiting_confirmation)
+    return intent, time.perf_counter() - start
@@ -0,0 +1,80 @@
+import re
+from typing import Dict, Iterable, Set
+
+# Keyword groups looked up in client messages. A word may belong to several groups.
+KEYWORD_GROUPS = {
+    "confirm": ("oui", "yes", "ok", "okay", "correct", "d'accord", "daccord", "confirme", "confirm"),
+    "deny": ("non", "no", "incorrect", "erreur"),
+    "cancel": ("annuler", "stop", "arrêter", "arreter", "cancel"),
+    "modify": ("changer", "modifier", "remplacer", "supprimer", "ajouter"),
+    "positive": ("merci", "parfait", "super", "content"),
+    "negative": ("fâché", "mécontent", "déçu", "insatisfait"),
+    # Words that settle the language of a short message on their own
+    "lang_en": (
+        "yes", "no", "thanks", "thank", "you", "please", "order", "remove", "add",
+        "help", "cancel", "the", "and", "want", "with", "replace", "instead", "yep", "yeah", "perfect", "fine",
+    ),
+    "lang_fr": (
+        "oui", "non", "d'accord", "daccord", "merci", "commande", "retirer", "ajouter", "supprimer", "aider",
+        "annuler", "le", "la", "les", "et", "je", "veux", "avec", "remplacer", "parfait", "c'est", "bien",
+        "bonjour", "svp", "plaît", "plait", "beaucoup",
+    ),
+    # Words used as is in both languages: they cast no vote
+    "lang_neutral": ("ok", "okay", "correct"),
+}
+
+
+class KeywordHits:
+    """Keywords found in one message: the matched words and the number of hits per group."""
+
+    __slots__ = ("words", "counts")
+
+    def __init__(self):
+        self.words: Set[str] = set()
+        self.counts: Dict[str, int] = {}
+
+    def __contains__(self, group: str) -> bool:
+        return group in self.counts
+
+    def count(self, group: str) -> int:
+        return self.counts.get(group, 0)
+
+    def __repr__(self):
+        return f"KeywordHits({self.counts})"
+
+
+class KeywordMatcher:
+    """Finds the keywords of every group in a single pass over the text.
+
+    All keywords are compiled into one alternation with word boundaries, so
+    "ok" does not match "book" and "correct" does not match "incorrect".
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        self.groups_of: Dict[str, tuple] = {}
+        for group, words in groups.items():
+            for word in words:
+                word = word.lower()
+                self.groups_of[word] = self.groups_of.get(word, ()) + (group,)
+        # Longest first so multi-word or longer keywords win over their prefixes
+        alternation = "|".join(re.escape(w) for w in sorted(self.groups_of, key=len, reverse=True))
+        self.pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)")
+
+    def match(self, text: str) -> KeywordHits:
+        hits = KeywordHits()
+        if not text:
+            return hits
+        counts = hits.counts
+        for found in self.pattern.finditer(text.lower().replace("’", "'")):
+            word = found.group()
+            hits.words.add(word)
+            for group in self.groups_of[word]:
+                counts[group] = counts.get(group, 0) + 1
+        return hits
+
+
+_matcher = KeywordMatcher(KEYWORD_GROUPS)
+
+def match_keywords(text: str) -> KeywordHits:
+    """Keyword hits of `text` for all groups in KEYWORD_GROUPS."""
+    return _matcher.match(text)
@@ -53,6 +53,9 @@ class ConversationState(BaseModel):
     modification_request: Optional[Dict] = None
     last_modification: Optional[tuple] = None
     pending_address: Optional[str] = None  # Persist delivery address being confirmed
+    summary: Optional[str] = None  # Rolling summary of messages[:summarized_count]
+    summarized_count: int = 0
+    language: Optional[str] = None  # Last detected client language ("fr", "en")
     last_active: datetime = Field(default_factory=datetime.utcnow)
 
 class Message(BaseModel):
@@ -0,0 +1,251 @@
+import os
+import re
+import math
+import heapq
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import islice
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+NAME_MATCH_MIN_SCORE = float(os.getenv("NAME_MATCH_MIN_SCORE", "0.6"))
+NAME_MATCH_MARGIN = float(os.getenv("NAME_MATCH_MARGIN", "0.1"))  # Lead the best match needs over the runner-up
+WORD_CANDIDATES_TARGET = 64  # Stop narrowing by words once this few names are left
+WORD_MATCH_MIN_SCORE = 0.5  # Trigram similarity needed to read a misspelled word as a known one
+
+# Words that never identify a product ("la table", "the chairs", "des pizzas")
+STOP_WORDS = {
+    "le", "la", "les", "l", "un", "une", "des", "du", "de", "d",
+    "the", "a", "an", "some", "of",
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class NameMatch(NamedTuple):
+    name: str
+    score: float
+    value: Any = None
+    ambiguous: Tuple[str, ...] = ()  # Other names matching about as well; the client has to choose
+
+
+class AmbiguousNameError(LookupError):
+    """A name matches several entries about equally well ("pizza" with two pizzas in the order)."""
+
+    def __init__(self, query: str, names: Iterable[str]):
+        self.query = query
+        self.names = list(names)
+        super().__init__(f"{query!r} matches {', '.join(self.names)}")
+
+
+def fold_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _singular(token: str) -> str:
+    # Crude plural folding shared by French and English: "pizzas" -> "pizza", "gateaux" -> "gateau"
+    return token[:-1] if len(token) > 3 and token[-1] in "sx" else token
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, accent-fold, drop articles and fold plurals: "Les Crêpes" -> "crepe"."""
+    text = fold_accents((text or "").lower())
+    return " ".join(_singular(t) for t in _TOKEN_RE.findall(text) if t not in STOP_WORDS)
+
+
+def trigrams(normalized: str) -> frozenset:
+    grams = set()
+    for token in normalized.split():
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class NameIndex:
+    """Fuzzy product name lookup over normalized, accent-folded trigrams.
+
+    Exact normalized names resolve with one dict lookup. Other queries are
+    scored with the Dice coefficient of their trigram sets against a small
+    candidate set: the names containing the query's words (misspelled words are
+    first mapped to the closest known word), narrowed rarest word first. Only if
+    none of those scores does it fall back to the names sharing one of the rarest
+    query trigrams that any name reaching `min_score` must contain (prefix
+    filtering). This keeps lookups fast on catalogs of tens of thousands of names.
+
+    A fuzzy best match is ambiguous when the runner-up scores within `margin` of
+    it, or when other names contain the query's words as well and the best one
+    has more words than the query ("pizza" for "Pizza Reine" and "Pizza
+    Margherita"): its `ambiguous` field then lists those names. A best match with
+    exactly the query's words, misspelled, is never ambiguous.
+    """
+
+    def __init__(self, names: Iterable[str] = (), min_score: float = NAME_MATCH_MIN_SCORE,
+                 margin: float = NAME_MATCH_MARGIN):
+        self.min_score = min_score
+        self.margin = margin
+        self.names: List[str] = []
+        self.values: List[Any] = []
+        self._grams: List[frozenset] = []
+        self._words: List[frozenset] = []
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._token_postings: Dict[str, List[int]] = defaultdict(list)
+        self._word_grams: Dict[str, List[str]] = defaultdict(list)  # trigram -> known words containing it
+        self._word_sizes: Dict[str, int] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name: str, value: Any = None):
+        normalized = normalize_name(name)
+        if not normalized:
+            return
+        i = len(self.names)
+        grams = trigrams(normalized)
+        self.names.append(name)
+        self.values.append(value)
+        self._grams.append(grams)
+        self._words.append(frozenset(normalized.split()))
+        self._exact.setdefault(normalized, i)
+        for gram in grams:
+            self._postings[gram].append(i)
+        for token in set(normalized.split()):
+            if token not in self._word_sizes:
+                token_grams = trigrams(token)
+                self._word_sizes[token] = len(token_grams)
+                for gram in token_grams:
+                    self._word_grams[gram].append(token)
+            self._token_postings[token].append(i)
+
+    def search(self, query: str, limit: int = 5, min_score: Optional[float] = None) -> List[NameMatch]:
+        """Best matches for `query`, highest score first; the first one is flagged when ambiguous."""
+        min_score = self.min_score if min_score is None else min_score
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+        exact = self._exact.get(normalized)
+        if exact is not None and limit == 1:
+            return [NameMatch(self.names[exact], 1.0, self.values[exact])]
+        q = trigrams(normalized)
+        words = self._known_words(normalized)
+        postings = sorted((self._token_postings[w] for w in words), key=len)
+        scored = []
+        # All words first, then without the rarest one in case it is the wrong one
+        for attempt in (postings, postings[1:]):
+            candidates = self._narrow(attempt)
+            if candidates:
+                scored = self._score(q, candidates, min_score)
+                if scored:
+                    break
+        if not scored:
+            # Dice >= s implies at least ceil(s * |q| / 2) shared trigrams, so a match must
+            # contain one of the |q| - ceil(s * |q| / 2) + 1 rarest query trigrams
+            probe = len(q) - math.ceil(min_score * len(q) / 2) + 1
+            rarest = sorted(q, key=lambda g: len(self._postings.get(g, ())))[:probe]
+            candidates = set()
+            for gram in rarest:
+                candidates.update(self._postings.get(gram, ()))
+            scored = self._score(q, candidates, min_score)
+        matches = self._top(scored, limit)
+        if matches and exact is None:
+            rivals = self._rivals(scored, words)
+            if rivals:
+                matches[0] = matches[0]._replace(ambiguous=tuple(self.names[i] for i in rivals))
+        return matches
+
+    def _rivals(self, scored: List[tuple], words: set) -> List[int]:
+        """Names matching about as well as the best scored one, best first."""
+        score, best = max(scored)
+        if words and words == self._words[-best]:
+            return []  # Same words as the query, only misspelled: "pizza margarita"
+        rivals = [-i for s, i in sorted(scored, reverse=True) if i != best and s >= score - self.margin]
+        best = -best
+        # Every query word is in the best name but it says more: other names with those words are as likely
+        if words and words < self._words[best]:
+            rarest = min((self._token_postings[w] for w in words), key=len)
+            rivals += islice((i for i in rarest if i != best and i not in rivals and words <= self._words[i]), 4)
+        return rivals[:4]
+
+    def _known_words(self, normalized: str) -> set:
+        """Query words mapped onto the index vocabulary; misspelled words become their closest known word."""
+        words = set()
+        for token in set(normalized.split()):
+            if token in self._token_postings:
+                words.add(token)
+                continue
+            grams = trigrams(token)
+            counts = Counter()
+            for gram in grams:
+                counts.update(self._word_grams.get(gram, ()))
+            best, best_score = None, WORD_MATCH_MIN_SCORE
+            for word, shared in counts.items():
+                score = 2 * shared / (len(grams) + self._word_sizes[word])
+                if score >= best_score:
+                    best, best_score = word, score
+            if best:
+                words.add(best)
+        return words
+
+    def _narrow(self, postings: List[List[int]]) -> Optional[set]:
+        """Names containing the given words, intersected rarest first until few enough are left."""
+        if not postings:
+            return None
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            if len(candidates) <= WORD_CANDIDATES_TARGET:
+                break
+            narrowed = candidates.intersection(ids)
+            if not narrowed:
+                break
+            candidates = narrowed
+        return candidates
+
+    def _score(self, q: frozenset, candidates: Iterable[int], min_score: float) -> List[tuple]:
+        scored = []
+        size = len(q)
+        for i in candidates:
+            grams = self._grams[i]
+            score = 2 * len(q & grams) / (size + len(grams))
+            if score >= min_score:
+                scored.append((score, -i))
+        return scored
+
+    def _top(self, scored: List[tuple], limit: int) -> List[NameMatch]:
+        # Ties go to the name added first
+        return [NameMatch(self.names[-i], round(score, 3), self.values[-i]) for score, i in heapq.nlargest(limit, scored)]
+
+    def best(self, query: str, min_score: Optional[float] = None) -> Optional[NameMatch]:
+        """The match for `query`, None if nothing matches; raises AmbiguousNameError when several do."""
+        matches = self.search(query, limit=1, min_score=min_score)
+        if not matches:
+            return None
+        if matches[0].ambiguous:
+            raise AmbiguousNameError(query, (matches[0].name,) + matches[0].ambiguous)
+        return matches[0]
+
+    def exact(self, query: str) -> Optional[NameMatch]:
+        """The name equal to `query` once normalized ("les chaises" for "Chaise"), if any."""
+        i = self._exact.get(normalize_name(query))
+        return None if i is None else NameMatch(self.names[i], 1.0, self.values[i])
+
+
+_catalog_indexes: Dict[str, NameIndex] = {}
+
+
+def set_catalog_index(business_id: str, index: NameIndex):
+    _catalog_indexes[business_id] = index
+
+
+def get_catalog_index(business_id: Optional[str]) -> Optional[NameIndex]:
+    """Per-business product catalog index, built from the "catalog" business setting on first use."""
+    if not business_id:
+        return None
+    index = _catalog_indexes.get(business_id)
+    if index is None:
+        from src.services.business_settings import get_business_settings
+        names = get_business_settings(business_id).get("catalog") or []
+        if not names:
+            return None
+        index = NameIndex(names)
+        _catalog_indexes[business_id] = index
+    return index
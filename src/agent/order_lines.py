@@ -0,0 +1,149 @@
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+from .models import OrderItem
+
+# Fields of a stored order item, in OrderItem order
+LINE_FIELDS = ("name", "quantity", "price", "notes", "woocommerce_order_id", "product_id", "woo_line_item_id")
+
+
+class Line:
+    """One order line. Has the attributes of OrderItem, so it can be passed wherever items are read."""
+
+    __slots__ = LINE_FIELDS + ("_key",)
+
+    def __init__(self, name: str, quantity: int, price: float, notes: Optional[str] = None,
+                 woocommerce_order_id: Optional[str] = None, product_id: Optional[int] = None,
+                 woo_line_item_id: Optional[int] = None):
+        self.name = name
+        self.quantity = quantity
+        self.price = price
+        self.notes = notes
+        self.woocommerce_order_id = woocommerce_order_id
+        self.product_id = product_id
+        self.woo_line_item_id = woo_line_item_id
+        self._key = None
+
+    def as_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in LINE_FIELDS}
+
+    def __repr__(self):
+        return f"Line({self.name!r} x{self.quantity} @ {self.price})"
+
+
+class OrderLines:
+    """Mutable line items of an order with O(1) lookup, add, remove and set-quantity.
+
+    Lines are kept in an insertion-ordered dict with a name index, and the
+    total is updated on every change instead of being re-summed. Built from and
+    serialized to the stored items JSON directly, without OrderItem copies.
+    """
+
+    __slots__ = ("_lines", "_by_name", "_next_key", "_total")
+
+    def __init__(self, lines: Iterable[Line] = ()):
+        self._lines: Dict[int, Line] = {}
+        self._by_name: Dict[str, List[int]] = {}  # Same-name lines are rare but allowed
+        self._next_key = 0
+        self._total = 0.0
+        for line in lines:
+            self._insert(line)
+
+    @classmethod
+    def from_items(cls, items: Union[str, Iterable, None]) -> "OrderLines":
+        """From stored items: a JSON string, a list of dicts or OrderItem-like objects."""
+        if isinstance(items, str):
+            items = json.loads(items) if items else []
+        lines = []
+        for item in items or ():
+            if isinstance(item, dict):
+                lines.append(Line(**{field: item[field] for field in LINE_FIELDS if field in item}))
+            else:
+                lines.append(Line(**{field: getattr(item, field, None) for field in LINE_FIELDS}))
+        return cls(lines)
+
+    @staticmethod
+    def _name_key(name: str) -> str:
+        return name.strip().lower()
+
+    def _insert(self, line: Line) -> Line:
+        line._key = self._next_key
+        self._next_key += 1
+        self._lines[line._key] = line
+        self._by_name.setdefault(self._name_key(line.name), []).append(line._key)
+        self._total += line.price * line.quantity
+        return line
+
+    def get(self, name: str) -> Optional[Line]:
+        """First line named `name` (case-insensitive)."""
+        keys = self._by_name.get(self._name_key(name))
+        return self._lines[keys[0]] if keys else None
+
+    def add(self, name: str, quantity: int, price: float, **fields) -> Line:
+        """Add `quantity` to the line named `name`, or append a new line."""
+        line = self.get(name)
+        if line is not None:
+            self.set_quantity(line, line.quantity + quantity)
+            return line
+        return self._insert(Line(name, quantity, price, **fields))
+
+    def set_quantity(self, line: Union[Line, str], quantity: int) -> Optional[Line]:
+        """Set a line's quantity; zero or less removes it."""
+        line = self.get(line) if isinstance(line, str) else line
+        if line is None:
+            return None
+        if quantity <= 0:
+            self.discard(line)
+            return None
+        self._total += line.price * (quantity - line.quantity)
+        line.quantity = quantity
+        return line
+
+    def remove(self, line: Union[Line, str], quantity: Optional[int] = None) -> int:
+        """Remove `quantity` units (all when None). Returns how many were actually removed."""
+        line = self.get(line) if isinstance(line, str) else line
+        if line is None:
+            return 0
+        removed = line.quantity if quantity is None else min(quantity, line.quantity)
+        self.set_quantity(line, line.quantity - removed)
+        return removed
+
+    def discard(self, line: Line):
+        """Drop a line whatever its quantity."""
+        if self._lines.get(line._key) is not line:
+            return
+        del self._lines[line._key]
+        keys = self._by_name[self._name_key(line.name)]
+        keys.remove(line._key)
+        if not keys:
+            del self._by_name[self._name_key(line.name)]
+        self._total -= line.price * line.quantity
+        if not self._lines:
+            self._total = 0.0
+
+    @property
+    def total(self) -> float:
+        # Rounded so that float drift from many incremental updates never shows
+        return round(self._total, 6)
+
+    def last(self) -> Optional[Line]:
+        """The most recently added line."""
+        return next(reversed(self._lines.values()), None)
+
+    def names(self) -> List[str]:
+        return [line.name for line in self._lines.values()]
+
+    def __iter__(self) -> Iterator[Line]:
+        return iter(self._lines.values())
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __contains__(self, name: str) -> bool:
+        return self._name_key(name) in self._by_name
+
+    def to_json(self) -> str:
+        """Items JSON as stored in the orders table."""
+        return json.dumps([line.as_dict() for line in self._lines.values()])
+
+    def to_items(self) -> List[OrderItem]:
+        return [OrderItem(**line.as_dict()) for line in self._lines.values()]
@@ -0,0 +1,178 @@
+import os
+from typing import Dict, List, Optional
+
+# Budget for the conversation history part of the prompt, in estimated tokens.
+HISTORY_TOKEN_BUDGET = int(os.getenv("PROMPT_HISTORY_TOKEN_BUDGET", "400"))
+MAX_HISTORY_MESSAGES = 10
+CHARS_PER_TOKEN = 4  # Rough estimate for French/English text
+# Phrases telling which language the agent's last reply was in
+_FR_REPLY_MARKERS = ("votre commande", "est-ce correct", "merci", "parfait")
+_EN_REPLY_MARKERS = ("your order", "is your order", "thank you", "perfect")
+
+# The static part of the prompt (rules, output format, examples) comes first and never
+# changes between turns, so it is built once at import time and can be reused as a
+# cached prefix by the provider. Only the order, history and user input follow it.
+STATIC_PREFIX_EN = """Always reply in English, matching the user's message language. The user may switch between French and English (or other languages) at any time.
+STRICT JSON RULES: Use ONLY these keys: message, action, modification, old_item, new_item, item, quantity.
+NEVER invent new keys (e.g., quantity_new, old_quantity, etc).
+ALWAYS use double quotes for all property names and string values.
+NEVER use single quotes. NEVER add trailing commas.
+If a field is not needed, set it to null.
+If you are unsure, ask for clarification.
+If you cannot parse the user's intent, reply with action: 'none'.
+NEGATIVE EXAMPLES (DO NOT DO THIS):
+{ 'message': '...', 'action': 'replace', 'modification': { 'old_item': 'Table', 'new_item': 'Chair', 'quantity_new': 2 } }
+{"message": "...", 'action': 'replace', 'modification': { 'old_item': 'Table', 'new_item': 'Chair', 'quantity': 2, } }
+POSITIVE EXAMPLES (DO THIS):
+{"message": "...", "action": "replace", "modification": {"old_item": "Table", "new_item": "Chair", "quantity": 2, "item": null} }
+
+You are a professional and friendly order confirmation agent.
+
+Reply strictly with a JSON in the following format:
+{
+  "message": "...",  // What the agent should say to the client
+  "action": "confirm|modify|cancel|add|remove|replace|none",  // The action to take (use 'none' if no action is required)
+  "modification": { "old_item": "...", "new_item": "...", "item": "...", "quantity": ... } // if applicable, otherwise null
+}
+Do not add any text before or after the JSON.
+
+Examples:
+- If the client says "Yes" or "Correct", reply with the confirm action and a final closing message:
+{"message": "Great, your order is confirmed! We are preparing it now.", "action": "confirm", "modification": null}
+- If the client wants to add an item, use the add action:
+{"message": "I've added 2 more motorcycles to your order. The total has been updated. Is there anything else?", "action": "add", "modification": {"item": "Motorcycle", "quantity": 2, "old_item": null, "new_item": null}}
+- If the client wants to modify an item's quantity, use the modify action:
+{"message": "The total number of bicycles in your order is now 2. Does that look right?", "action": "modify", "modification": {"item": "Bicycle", "quantity": 2, "old_item": null, "new_item": null}}
+- If the client wants to replace an item, use the replace action with old_item and new_item:
+{"message": "Lasagna has been replaced by Pizza in your order. Anything else?", "action": "replace", "modification": {"old_item": "Lasagna", "new_item": "Pizza", "item": null, "quantity": null}}
+- If the client says "Thank you", reply with the none action:
+{"message": "You're welcome! Feel free to contact us if you need anything else.", "action": "none", "modification": null}
+- If the client's request is ambiguous or a help request (e.g., "Can you help?", "I need help", "What can you do?"), reply with:
+{"message": "Could you please clarify what you would like to do with your order?", "action": "none", "modification": null}
+"""
+
+STATIC_PREFIX_FR = """Réponds toujours en français, en fonction de la langue du client. Le client peut passer du français à l'anglais (ou à une autre langue) à tout moment.
+RÈGLES STRICTES JSON : Utilise UNIQUEMENT ces clés : message, action, modification, old_item, new_item, item, quantity.
+N'invente JAMAIS de nouvelles clés (ex : quantity_new, old_quantity, etc).
+Utilise TOUJOURS des guillemets doubles pour les noms de propriétés et les valeurs de chaîne.
+N'utilise JAMAIS de guillemets simples. N'ajoute JAMAIS de virgule finale.
+Si un champ n'est pas nécessaire, mets-le à null.
+Si tu n'es pas sûr, demande une clarification.
+Si tu ne peux pas comprendre l'intention du client, réponds avec action : 'none'.
+EXEMPLES NÉGATIFS (À NE PAS FAIRE) :
+{ 'message': '...', 'action': 'replace', 'modification': { 'old_item': 'Table', 'new_item': 'Chaise', 'quantity_new': 2 } }
+{"message": "...", 'action': 'replace', 'modification': { 'old_item': 'Table', 'new_item': 'Chaise', 'quantity': 2, } }
+EXEMPLES POSITIFS (À FAIRE) :
+{"message": "...", "action": "replace", "modification": {"old_item": "Table", "new_item": "Chaise", "quantity": 2, "item": null} }
+
+Vous êtes un agent de confirmation de commande professionnel et amical.
+
+Répondez strictement avec un JSON dans le format suivant :
+{
+  "message": "...",  // Ce que l'agent doit dire au client
+  "action": "confirm|modify|cancel|add|remove|replace|none",  // L'action à effectuer (utilise 'none' si aucune action n'est requise)
+  "modification": { "old_item": "...", "new_item": "...", "item": "...", "quantity": ... } // si applicable, sinon null
+}
+N'ajoute aucun texte avant ou après le JSON.
+
+Exemples :
+- Si le client dit "Oui" ou "Correct", réponds avec l'action confirm et un message de clôture :
+{"message": "Parfait, votre commande est confirmée ! Nous la préparons dès maintenant.", "action": "confirm", "modification": null}
+- Si le client veut ajouter un article, utilise l'action add :
+{"message": "J'ai ajouté 2 motos supplémentaires à votre commande. Le total a été mis à jour. Souhaitez-vous autre chose ?", "action": "add", "modification": {"item": "Moto", "quantity": 2, "old_item": null, "new_item": null}}
+- Si le client veut modifier la quantité d'un article, utilise l'action modify :
+{"message": "Le nombre total de vélos dans votre commande est maintenant de 2. Cela vous convient-il ?", "action": "modify", "modification": {"item": "Vélo", "quantity": 2, "old_item": null, "new_item": null}}
+- Si le client veut remplacer un article, utilise l'action replace avec old_item et new_item :
+{"message": "La lasagne a été remplacée par une pizza dans votre commande. Autre chose ?", "action": "replace", "modification": {"old_item": "Lasagne", "new_item": "Pizza", "item": null, "quantity": null}}
+- Si le client dit "Merci", réponds avec l'action none :
+{"message": "Avec plaisir ! N'hésitez pas à nous contacter si besoin.", "action": "none", "modification": null}
+- Si la demande du client est ambiguë ou une demande d'aide (ex : "Pouvez-vous m'aider ?", "J'ai besoin d'aide", "Que pouvez-vous faire ?"), réponds :
+{"message": "Pouvez-vous préciser ce que vous souhaitez faire avec votre commande ?", "action": "none", "modification": null}
+"""
+
+_TURN_TEMPLATE_EN = """
+Detected language for this message: {language}.
+
+Here is the order context:
+{order_context}
+
+Conversation history:
+{history}
+
+The client said: "{user_input}"
+"""
+
+_TURN_TEMPLATE_FR = """
+Langue détectée pour ce message : {language}.
+
+Voici le contexte de la commande :
+{order_context}
+
+Historique de la conversation :
+{history}
+
+Le client a dit : "{user_input}"
+"""
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def static_prefix(language: str) -> str:
+    return STATIC_PREFIX_EN if language.startswith("en") else STATIC_PREFIX_FR
+
+def reply_language(message: str) -> Optional[str]:
+    """'fr' or 'en' when an agent reply is recognizably in that language, else None."""
+    text = message.lower()
+    if any(marker in text for marker in _FR_REPLY_MARKERS):
+        return "fr"
+    if any(marker in text for marker in _EN_REPLY_MARKERS):
+        return "en"
+    return None
+
+def _switched_language(messages: List[Dict[str, str]], language: str) -> bool:
+    """True when the last agent reply before the client's newest message was in another language."""
+    for msg in reversed(messages[:-1]):
+        if msg["role"] == "assistant":
+            previous = reply_language(msg["content"])
+            return previous is not None and previous != language[:2]
+    return False
+
+def fit_history(messages: List[Dict[str, str]], token_budget: int = HISTORY_TOKEN_BUDGET, max_messages: int = MAX_HISTORY_MESSAGES,
+                summary: Optional[str] = None, language: Optional[str] = None) -> str:
+    """Format the most recent messages that fit in `token_budget`, newest kept first.
+
+    `summary` is the rolling summary of the messages before `messages`; it is
+    shown first so older context survives the truncation. When `language` is
+    given and the client has switched away from the language of the agent's
+    last reply, only the client's newest message is kept, so the model is not
+    led to answer in the old language.
+    """
+    if language and messages and messages[-1]["role"] == "user" and _switched_language(messages, language):
+        return f"Client: {messages[-1]['content']}"
+    lines = []
+    used = 0
+    for msg in reversed(messages[-max_messages:]):
+        line = f"{'Client' if msg['role'] == 'user' else 'Agent'}: {msg['content']}"
+        cost = estimate_tokens(line) + 1
+        if lines and used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    lines.reverse()
+    header = ""
+    if summary:
+        header = f"[Résumé: {summary}]\n"
+    elif len(lines) < len(messages):
+        header = f"[Résumé: Conversation commencée il y a {len(messages)} messages]\n"
+    return header + "\n".join(lines)
+
+def build_prompt(language: str, order_context: str, messages: List[Dict[str, str]], user_input: str, history_budget: int = HISTORY_TOKEN_BUDGET,
+                 summary: Optional[str] = None) -> str:
+    """Static prefix for `language` followed by the per-turn order, history and input."""
+    template = _TURN_TEMPLATE_EN if language.startswith("en") else _TURN_TEMPLATE_FR
+    return static_prefix(language) + template.format(
+        language=language,
+        order_context=order_context.strip(),
+        history=fit_history(messages, history_budget, summary=summary, language=language),
+        user_input=user_input
+    )
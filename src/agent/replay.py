@@ -0,0 +1,132 @@
+import json
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from src.services.ai_service import use_llm_backend
+from src.services.llm_backend import LLMBackend
+from src.services.llm_cache import get_llm_cache, CUSTOMER_PLACEHOLDER
+from src.services.llm_errors import LLMQuotaError, LLMCircuitOpenError, LLMTransientError
+from src.services.logging_config import redact
+from src.services import product_catalog
+from src.services.llm_gateway import CircuitBreaker
+from .agent import OrderConfirmationAgent
+from .database.models import Base
+from .database.sqlite import SQLiteDatabase
+from .summarizer import summarizer
+
+
+class ReplayLLMBackend(LLMBackend):
+    """Answers each LLM call with the reply recorded for the turn being replayed.
+
+    Raises the recorded error instead when the turn fell back. A call for a turn
+    that recorded no LLM reply is counted as unexpected: the code now asks the
+    LLM where it did not when the transcript was recorded.
+    """
+
+    name = "replay"
+
+    def __init__(self):
+        self.reply: Optional[str] = None
+        self.error: Optional[str] = None
+        self.calls = 0
+        self.unexpected = 0
+
+    def load(self, entry: Dict):
+        self.reply, self.error = entry.get("llm"), entry.get("llm_error")
+
+    async def generate(self, prompt: str, model: str = None, max_tokens: int = 512, timeout: float = None,
+                       response_schema: dict = None) -> str:
+        self.calls += 1
+        if self.error == "quota_exceeded":
+            raise LLMQuotaError()
+        if self.error == "circuit_open":
+            raise LLMCircuitOpenError()
+        if self.error:
+            raise LLMTransientError(self.error)
+        if self.reply is None:
+            self.unexpected += 1
+            raise LLMTransientError("no recorded LLM reply for this turn")
+        return self.reply
+
+
+class _OfflineWooCommerce:
+    """Stands in for WooCommerceService: replays must not update the store."""
+
+    def __init__(self):
+        self.calls = []
+
+    def update_order_status(self, order_id, status):
+        self.calls.append(("update_order_status", order_id, status))
+
+    def update_order_details(self, order_id, items, total_amount):
+        self.calls.append(("update_order_details", order_id, total_amount))
+
+
+class TranscriptReplayer:
+    """Feeds recorded turns through OrderConfirmationAgent, offline.
+
+    Each turn runs against an in-memory database reset to the recorded order
+    (and conversation, when the transcript has it), with the recorded LLM reply
+    served by ReplayLLMBackend. The LLM cache is turned off, summaries use the
+    rule-based mode and the product catalog is an empty offline one, so no turn
+    calls a provider or the store. These switches and the LLM backend are
+    process-wide: run replays in their own process.
+    """
+
+    def __init__(self, db: Optional[SQLiteDatabase] = None):
+        self.db = db or SQLiteDatabase(db_url="sqlite+aiosqlite:///:memory:", sync_db_url="sqlite://")
+        self.backend = ReplayLLMBackend()
+        self.gateway = use_llm_backend(self.backend, rate_per_minute=0, max_retries=0)
+        get_llm_cache().enabled = False
+        summarizer.mode = "rules"
+        if product_catalog.WOOCOMMERCE_STORE_URL:
+            # An empty catalog that never calls the store: added products resolve without catalog prices
+            store_url = product_catalog.WOOCOMMERCE_STORE_URL
+            product_catalog._catalogs[store_url] = product_catalog.ProductCatalog(store_url, lambda *args: ([], 1))
+        self.agent = OrderConfirmationAgent(self.db)
+        self.agent.woocommerce_service = _OfflineWooCommerce()
+        self._ready = False
+
+    async def _seed(self, entry: Dict):
+        """Reset the entry's order, and its conversation when recorded, to the state the turn started from."""
+        if not self._ready:
+            async with self.db.async_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            self._ready = True
+        order_id, order = entry["order_id"], entry["order"]
+        columns = {"items": json.dumps(order["items"]), "total_amount": order["total_amount"], "status": order["status"]}
+        if await self.db.get_order(order_id) is None:
+            await self.db.create_order({
+                "id": order_id, "customer_name": CUSTOMER_PLACEHOLDER, "customer_phone": "", "created_at": datetime.utcnow().isoformat(),
+                "woocommerce_order_id": order.get("woocommerce_order_id"), **columns})
+        else:
+            await self.db.update_order(order_id, columns)
+        if "conversation" in entry:
+            if entry["conversation"] is None:
+                await self.db.delete_conversation(order_id)
+            else:
+                await self.db.update_conversation(order_id, {**entry["conversation"], "order_id": order_id})
+
+    async def replay_turn(self, entry: Dict) -> Dict:
+        """Run one recorded turn; the result compares its reply with the recorded one."""
+        await self._seed(entry)
+        self.backend.load(entry)
+        self.gateway.breaker = CircuitBreaker()  # A recorded quota error must not fail the following turns
+        calls, unexpected = self.backend.calls, self.backend.unexpected
+        start = time.perf_counter()
+        reply = await self.agent.process_message(entry["order_id"], entry["input"], language=entry.get("language") or "fr")
+        seconds = time.perf_counter() - start
+        return {
+            "order_id": entry["order_id"],
+            "input": entry["input"],
+            "reply": reply,
+            "recorded_reply": entry.get("reply"),
+            "match": redact(reply or "") == redact(entry.get("reply") or ""),
+            "llm_calls": self.backend.calls - calls,
+            "unexpected_llm_calls": self.backend.unexpected - unexpected,
+            "ms": round(seconds * 1000, 3),
+            "recorded_ms": entry.get("ms"),
+        }
+
+    async def replay(self, entries: Iterable[Dict]) -> List[Dict]:
+        return [await self.replay_turn(entry) for entry in entries]
@@ -0,0 +1,153 @@
+import re
+import time
+from typing import Optional
+
+_MESSAGE_KEY_RE = re.compile(r'"message"\s*:\s*"')
+_ACTION_RE = re.compile(r'"action"\s*:\s*"(\w+)"')
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class AgentReplyStreamParser:
+    """Incrementally reads the agent JSON reply as it streams in.
+
+    `feed` returns the newly decoded part of the `message` string so it can be
+    forwarded to the client before the rest of the JSON arrives. `action` is set
+    as soon as the action field is complete and `complete` once the top-level
+    object is closed.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.action: Optional[str] = None
+        self.complete = False
+        self.message = ""
+        self._msg_pos = None  # Index in buffer of the next unread message character
+        self._msg_done = False
+        self._scan_pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        delta = self._read_message()
+        if self.action is None:
+            match = _ACTION_RE.search(self.buffer)
+            if match:
+                self.action = match.group(1)
+        self._track_depth()
+        return delta
+
+    def _read_message(self) -> str:
+        if self._msg_done:
+            return ""
+        if self._msg_pos is None:
+            match = _MESSAGE_KEY_RE.search(self.buffer)
+            if not match:
+                return ""
+            self._msg_pos = match.end()
+        out = []
+        buf = self.buffer
+        i = self._msg_pos
+        while i < len(buf):
+            c = buf[i]
+            if c == '\\':
+                if i + 1 >= len(buf):
+                    break  # Wait for the rest of the escape sequence
+                nxt = buf[i + 1]
+                if nxt == 'u':
+                    if i + 6 > len(buf):
+                        break
+                    code = int(buf[i + 2:i + 6], 16)
+                    if 0xD800 <= code < 0xDC00:
+                        # High surrogate: emoji and other astral characters come as a \uD83D\uDE00 pair
+                        pair = buf[i + 6:i + 12]
+                        if len(pair) < 6 and '\\u'.startswith(pair[:2]):
+                            break  # Wait for the low half, which may be in the next chunk
+                        low = int(pair[2:], 16) if pair.startswith('\\u') else 0
+                        if 0xDC00 <= low < 0xE000:
+                            out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                            i += 12
+                            continue
+                    out.append(chr(code))
+                    i += 6
+                else:
+                    out.append(_ESCAPES.get(nxt, nxt))
+                    i += 2
+                continue
+            if c == '"':
+                self._msg_done = True
+                i += 1
+                break
+            out.append(c)
+            i += 1
+        self._msg_pos = i
+        delta = "".join(out)
+        self.message += delta
+        return delta
+
+    def _track_depth(self):
+        buf = self.buffer
+        for i in range(self._scan_pos, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == '\\':
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c == '{':
+                self._depth += 1
+                self._started = True
+            elif c == '}':
+                self._depth -= 1
+                if self._started and self._depth == 0:
+                    self.complete = True
+        self._scan_pos = len(buf)
+
+
+class StreamingStats:
+    """Time-to-first-token versus full-turn latency for streamed replies."""
+
+    def __init__(self):
+        self.turns = 0
+        self.ttft_total = 0.0
+        self.turn_total = 0.0
+        self.max_ttft = 0.0
+
+    def record(self, ttft: Optional[float], turn_seconds: float):
+        self.turns += 1
+        self.turn_total += turn_seconds
+        if ttft is not None:
+            self.ttft_total += ttft
+            self.max_ttft = max(self.max_ttft, ttft)
+
+    def stats(self):
+        return {
+            "turns": self.turns,
+            "avg_ttft_ms": round(1000 * self.ttft_total / self.turns, 1) if self.turns else 0.0,
+            "max_ttft_ms": round(1000 * self.max_ttft, 1),
+            "avg_turn_ms": round(1000 * self.turn_total / self.turns, 1) if self.turns else 0.0,
+        }
+
+
+streaming_stats = StreamingStats()
+
+
+class TurnTimer:
+    """Measures one streamed turn; call `first_token()` when the first text is sent."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ttft = None
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+
+    def finish(self):
+        streaming_stats.record(self.ttft, time.perf_counter() - self.start)
@@ -0,0 +1,135 @@
+import os
+import re
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_EVERY_TURNS = int(os.getenv("CONVERSATION_SUMMARY_EVERY_TURNS", "3"))  # K: fold messages in batches of K turns
+RECENT_MESSAGES = int(os.getenv("PROMPT_RECENT_MESSAGES", "6"))  # Messages always kept verbatim in the prompt
+SUMMARY_MODE = os.getenv("CONVERSATION_SUMMARY_MODE", "rules").lower()  # "rules" or "llm"
+SUMMARY_MAX_CHARS = 600
+FACT_MAX_CHARS = 80
+MAX_PENDING_SUMMARIES = 10000  # LLM summaries waiting for their conversation's next turn; the oldest are dropped
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+_LLM_SUMMARY_PROMPT = """Summarize this order confirmation conversation in at most 3 short sentences.
+Keep every change the client asked for (items, quantities, replacements, address) and any open question.
+Reply with the summary text only.
+
+Previous summary: {summary}
+
+New messages:
+{messages}
+"""
+
+
+def _shorten(text: str, limit: int = FACT_MAX_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def summarize_messages(summary: Optional[str], messages: List[Dict[str, str]], max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Rule-based summary update: one short fact per message, oldest facts dropped past `max_chars`."""
+    facts = [f for f in (summary or "").split(" | ") if f]
+    for msg in messages:
+        content = msg.get("content", "")
+        if msg.get("role") == "user":
+            facts.append("Client: " + _shorten(content))
+        else:
+            # The first sentence of an agent reply carries what was done or asked
+            facts.append("Agent: " + _shorten(_SENTENCE_END_RE.split(content.strip(), 1)[0]))
+    while len(facts) > 1 and len(" | ".join(facts)) > max_chars:
+        facts.pop(0)
+    return " | ".join(facts)
+
+
+class RollingSummarizer:
+    """Keeps `ConversationState.summary` up to date every K turns.
+
+    Messages older than the recent window are folded into the summary in batches,
+    so the prompt holds a bounded summary plus at most RECENT_MESSAGES messages
+    however long the conversation gets. In "llm" mode the batch is summarized by
+    the LLM in the background and picked up on a later turn; until then the
+    messages simply stay in the recent part of the history. Summaries of
+    conversations that never come back are dropped when the order is closed
+    (`forget`) or, past `max_pending`, oldest first.
+    """
+
+    def __init__(self, every_turns: int = SUMMARY_EVERY_TURNS, recent_messages: int = RECENT_MESSAGES, mode: str = SUMMARY_MODE,
+                 max_pending: int = MAX_PENDING_SUMMARIES):
+        self.batch_size = 2 * every_turns  # One turn = client message + agent reply
+        self.recent_messages = recent_messages
+        self.mode = mode
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()  # order_id -> (summary, summarized_count) from the LLM
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.updates = 0
+        self.dropped = 0
+
+    def update(self, conversation) -> bool:
+        """Fold a batch of old messages into the summary if one is due. Returns True if updated."""
+        if conversation.summarized_count > len(conversation.messages):
+            # History was reset or trimmed elsewhere; the summary no longer matches it
+            conversation.summary, conversation.summarized_count = None, 0
+        pending = self._pending.pop(conversation.order_id, None)
+        if pending and pending[1] > conversation.summarized_count:
+            conversation.summary, conversation.summarized_count = pending
+            self.updates += 1
+        end = len(conversation.messages) - self.recent_messages
+        if end - conversation.summarized_count < self.batch_size:
+            return bool(pending)
+        batch = conversation.messages[conversation.summarized_count:end]
+        if self.mode == "llm":
+            self._schedule_llm_summary(conversation.order_id, conversation.summary, batch, end)
+            return bool(pending)
+        conversation.summary = summarize_messages(conversation.summary, batch)
+        conversation.summarized_count = end
+        self.updates += 1
+        return True
+
+    def forget(self, order_id: str):
+        """Drop the pending summary and any running summary of a closed order."""
+        self._pending.pop(order_id, None)
+        task = self._tasks.pop(order_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    def _set_pending(self, order_id: str, summary: str, end: int):
+        self._pending[order_id] = (summary, end)
+        self._pending.move_to_end(order_id)
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+
+    def _schedule_llm_summary(self, order_id: str, summary: Optional[str], batch: List[Dict[str, str]], end: int):
+        task = self._tasks.get(order_id)
+        if task is not None and not task.done():
+            return
+        self._tasks[order_id] = asyncio.ensure_future(self._llm_summary(order_id, summary, batch, end))
+
+    async def _llm_summary(self, order_id: str, summary: Optional[str], batch: List[Dict[str, str]], end: int):
+        from src.services.ai_service import call_llm
+        from .tiering import model_for_tier, SIMPLE_TIER
+        messages = "\n".join(f"{'Client' if m['role'] == 'user' else 'Agent'}: {m['content']}" for m in batch)
+        try:
+            text = await call_llm(_LLM_SUMMARY_PROMPT.format(summary=summary or "-", messages=messages),
+                                  model=model_for_tier(None, SIMPLE_TIER), max_tokens=160)
+            self._set_pending(order_id, _shorten(text, SUMMARY_MAX_CHARS), end)
+        except Exception as e:
+            # Fall back to the rule-based summary rather than letting the history grow
+            logger.warning("LLM summary failed: %s", e, extra={"order_id": order_id})
+            self._set_pending(order_id, summarize_messages(summary, batch), end)
+        finally:
+            if self._tasks.get(order_id) is asyncio.current_task():
+                del self._tasks[order_id]
+
+    def recent(self, conversation) -> List[Dict[str, str]]:
+        """Messages not covered by the summary, i.e. the verbatim part of the history."""
+        return conversation.messages[conversation.summarized_count:]
+
+
+summarizer = RollingSummarizer()
@@ -0,0 +1,87 @@
+import os
+import re
+from typing import Dict, List, Optional
+from src.services.business_settings import get_business_settings
+from .prompt_builder import estimate_tokens
+
+SIMPLE_TIER = "simple"
+COMPLEX_TIER = "complex"
+
+# Default model per tier; businesses override them with "model_tiers" in BUSINESS_SETTINGS_FILE
+DEFAULT_MODEL_TIERS = {
+    SIMPLE_TIER: os.getenv("LLM_SIMPLE_TIER_MODEL", "models/gemini-2.0-flash-lite"),
+    COMPLEX_TIER: os.getenv("LLM_COMPLEX_TIER_MODEL", "models/gemini-2.0-flash"),
+}
+COMPLEX_WORD_COUNT = 20  # Long messages usually carry several instructions
+
+_REPLACE_RE = re.compile(r"\b(replace|swap|instead|remplace[rz]?|échange[rz]?|au lieu)\b")
+_CONJUNCTION_RE = re.compile(r"\b(and|also|plus|et|aussi|puis)\b|,")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_WORD_RE = re.compile(r"\w+")
+
+
+def classify_complexity(user_input: str, item_names: List[str]) -> str:
+    """Route a turn to the simple or complex model tier.
+
+    Replacements, turns naming several order items or quantities, and long
+    multi-clause messages go to the complex tier; everything else (thanks,
+    questions, a single add/remove) to the simple tier.
+    """
+    text = user_input.lower()
+    if _REPLACE_RE.search(text):
+        return COMPLEX_TIER
+    mentioned = sum(1 for name in item_names if name and name.lower().rstrip("sx") in text)
+    numbers = len(_NUMBER_RE.findall(text))
+    if mentioned >= 2 or numbers >= 2:
+        return COMPLEX_TIER
+    if _CONJUNCTION_RE.search(text) and (mentioned or numbers):
+        return COMPLEX_TIER
+    if len(_WORD_RE.findall(text)) > COMPLEX_WORD_COUNT:
+        return COMPLEX_TIER
+    return SIMPLE_TIER
+
+
+def model_for_tier(business_id: Optional[str], tier: str) -> str:
+    """Model configured for `tier` by the business, falling back to the default tiers."""
+    tiers = dict(DEFAULT_MODEL_TIERS)
+    tiers.update(get_business_settings(business_id).get("model_tiers") or {})
+    return tiers.get(tier) or tiers[COMPLEX_TIER]
+
+
+class TierStats:
+    """Latency and token counts of LLM calls, per model tier."""
+
+    def __init__(self):
+        self.tiers: Dict[str, Dict] = {}
+
+    def record(self, tier: str, model: str, seconds: float, prompt: str, reply: str, usage=None):
+        """Record one call. Token counts come from `usage` (a UsageCapture) when the provider
+        reported any, else they are estimated from the prompt and reply."""
+        t = self.tiers.setdefault(tier, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                         "prompt_tokens": 0, "completion_tokens": 0, "models": {}})
+        t["calls"] += 1
+        t["seconds"] += seconds
+        t["max_seconds"] = max(t["max_seconds"], seconds)
+        if usage is not None and usage.calls:
+            t["prompt_tokens"] += usage.prompt_tokens
+            t["completion_tokens"] += usage.completion_tokens
+        else:
+            t["prompt_tokens"] += estimate_tokens(prompt)
+            t["completion_tokens"] += estimate_tokens(reply or "")
+        t["models"][model] = t["models"].get(model, 0) + 1
+
+    def stats(self):
+        return {
+            tier: {
+                "calls": t["calls"],
+                "avg_latency_ms": round(1000 * t["seconds"] / t["calls"], 1),
+                "max_latency_ms": round(1000 * t["max_seconds"], 1),
+                "avg_prompt_tokens": round(t["prompt_tokens"] / t["calls"], 1),
+                "avg_completion_tokens": round(t["completion_tokens"] / t["calls"], 1),
+                "models": dict(t["models"]),
+            }
+            for tier, t in self.tiers.items()
+        }
+
+
+tier_stats = TierStats()
@@ -0,0 +1,136 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional
+from src.services.llm_cache import mask_customer
+from src.services.logging_config import redact
+from .turn_context import TurnContext
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_FILE = os.getenv("TRANSCRIPT_FILE")  # NDJSON file of recorded turns; unset disables recording
+TRANSCRIPT_REDACT = os.getenv("TRANSCRIPT_REDACT", "true").lower() == "true"  # Mask e-mails, phone numbers and customer names in texts
+TRANSCRIPT_VERSION = 1
+
+
+class TranscriptRecorder:
+    """Appends one JSON line per agent turn, written by a background thread.
+
+    A line holds what replaying the turn needs: the client message and
+    language, the order as loaded (items, total, status), the raw LLM reply or
+    error, the decoded action, the reply sent and the outcome. The conversation
+    is only written the first time an order is seen; later turns of the order
+    continue from the state the replay left.
+    """
+
+    def __init__(self, path: str, redact_text: bool = TRANSCRIPT_REDACT, max_orders: int = 10000):
+        self.path = path
+        self.redact_text = redact_text
+        self.max_orders = max_orders
+        self._seen: "OrderedDict[str, None]" = OrderedDict()  # Orders whose conversation is already in the file
+        self._queue: queue.Queue = queue.Queue(maxsize=1000)
+        self._worker: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def _text(self, text: Optional[str], turn: TurnContext) -> Optional[str]:
+        if not self.redact_text or not text:
+            return text
+        # The customer's name becomes the same placeholder as in LLM cache keys; replays seed the order with it
+        return redact(mask_customer(text, turn.order.customer_name if turn.order else None))
+
+    def snapshot(self, turn: TurnContext) -> Optional[Dict]:
+        """The order (and, for a new order, the conversation) as loaded; None if the order does not exist."""
+        order = turn.order
+        if order is None:
+            return None
+        snapshot = {"order": {
+            "items": [line.as_dict() for line in turn.lines],
+            "total_amount": order.total_amount,
+            "status": order.status,
+            "woocommerce_order_id": order.woocommerce_order_id,
+        }}
+        if turn.order_id not in self._seen:
+            self._seen[turn.order_id] = None
+            if len(self._seen) > self.max_orders:
+                self._seen.popitem(last=False)
+            conversation = turn.conversation
+            if conversation is None:
+                snapshot["conversation"] = None
+            else:
+                state = conversation.dict(exclude={"order_id", "last_active"})
+                state["messages"] = [{**m, "content": self._text(m.get("content"), turn)} for m in conversation.messages]
+                state["summary"] = self._text(conversation.summary, turn)
+                state["pending_address"] = self._text(conversation.pending_address, turn)
+                snapshot["conversation"] = state
+        return snapshot
+
+    def record_turn(self, snapshot: Dict, turn: TurnContext, user_input: str, language: str, reply: Optional[str],
+                    outcome: str, llm_error: Optional[str], seconds: float):
+        entry = {
+            "v": TRANSCRIPT_VERSION,
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "order_id": turn.order_id,
+            "input": self._text(user_input, turn),
+            "language": language,
+            **snapshot,
+            "llm": self._text(turn.llm_raw, turn),
+            "llm_error": llm_error,
+            "action": turn.action,
+            "reply": self._text(reply, turn),
+            "outcome": outcome,
+            "ms": round(seconds * 1000, 2),
+        }
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run_writes, name="transcript-writer", daemon=True)
+            self._worker.start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run_writes(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                self.recorded += 1
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Transcript write failed: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued turn has been written."""
+        if self._worker is not None:
+            self._queue.join()
+
+    def stats(self):
+        return {"path": self.path, "recorded": self.recorded, "dropped": self.dropped, "errors": self.errors}
+
+
+def read_transcripts(path: str) -> Iterator[Dict]:
+    """The recorded turns of an NDJSON transcript file, in order."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+_recorder = None
+
+def get_transcript_recorder() -> Optional[TranscriptRecorder]:
+    """The shared recorder writing to TRANSCRIPT_FILE, or None when recording is off."""
+    global _recorder
+    if _recorder is None and TRANSCRIPT_FILE:
+        _recorder = TranscriptRecorder(TRANSCRIPT_FILE)
+        atexit.register(_recorder.flush)
+    return _recorder
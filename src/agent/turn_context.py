@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from .models import Order, ConversationState
+from .order_lines import OrderLines
+
+
+class TurnContext:
+    """Order and conversation of one client message.
+
+    Both are loaded with a single query when the turn starts and the same
+    objects are passed to every stage of the turn. Stages record their writes
+    with `update_order` and `save_conversation`; `commit` applies them in one
+    transaction at the end of the turn.
+    """
+
+    def __init__(self, db, order_id: str, order_data: Optional[Dict] = None, conversation_data: Optional[Dict] = None):
+        self.db = db
+        self.order_id = order_id
+        self.order: Optional[Order] = None
+        self._items = order_data.get("items") if order_data else None
+        self._lines: Optional[OrderLines] = None
+        if order_data:
+            self.order = Order(**order_data)
+            # Stored as a number by some integrations; the model expects a string
+            if order_data.get("woocommerce_order_id") is not None:
+                self.order.woocommerce_order_id = str(order_data["woocommerce_order_id"])
+        self.conversation: Optional[ConversationState] = ConversationState(**conversation_data) if conversation_data else None
+        self.order_updates: Dict[str, Any] = {}
+        self.conversation_changed = False
+        self.outcome = "reply"  # confirm, cancel or modify when the turn changed the order; used for metrics
+        self.llm_raw: Optional[str] = None  # LLM reply and decoded action of the turn, kept for transcripts
+        self.action: Optional[str] = None
+
+    @classmethod
+    async def load(cls, db, order_id: str) -> "TurnContext":
+        order_data, conversation_data = await db.load_turn(order_id)
+        return cls(db, order_id, order_data, conversation_data)
+
+    def start_conversation(self) -> ConversationState:
+        """The turn's conversation, created on the client's first message."""
+        if self.conversation is None:
+            self.conversation = ConversationState(order_id=self.order_id, messages=[], current_step="greeting",
+                                                  last_active=datetime.utcnow())
+        return self.conversation
+
+    @property
+    def lines(self) -> OrderLines:
+        """The order's items as OrderLines, built from the stored items on first use.
+
+        Modifications go through `lines`; `order.items` stays the snapshot loaded
+        at the start of the turn.
+        """
+        if self._lines is None:
+            self._lines = OrderLines.from_items(self._items)
+        return self._lines
+
+    def save_lines(self):
+        """Queue the current lines and their total for the order update."""
+        self.order.total_amount = self.lines.total
+        self.update_order({"items": self.lines.to_json(), "total_amount": self.lines.total})
+
+    def update_order(self, updates: Dict[str, Any]):
+        """Queue order column updates; later updates of the same column win."""
+        self.order_updates.update(updates)
+
+    def save_conversation(self):
+        """Mark the conversation to be saved at commit."""
+        self.conversation_changed = True
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.order_updates) or (self.conversation_changed and self.conversation is not None)
+
+    async def commit(self):
+        """Write the queued changes in one transaction. Does nothing when the turn changed nothing."""
+        if not self.dirty:
+            return
+        conversation = self.conversation.dict() if self.conversation_changed and self.conversation else None
+        await self.db.save_turn(self.order_id, self.order_updates or None, conversation)
+        self.order_updates = {}
+        self.conversation_changed = False
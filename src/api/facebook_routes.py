@@ -8,9 +8,7 @@ from src.api.dependencies import get_agent, get_db_interface
 from src.agent.database.base import DatabaseInterface
 from src.agent.models import Order
 
-# Configure logging
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 # This must be a secret string you create and set in your Facebook App settings.
 VERIFY_TOKEN = os.environ.get("FACEBOOK_VERIFY_TOKEN")
@@ -29,26 +27,18 @@ async def facebook_webhook_verify(request: Request):
     Handles the verification GET request from Facebook to confirm the webhook.
     """
     try:
-        # Log all query parameters for debugging
         params = dict(request.query_params)
-        logger.info(f"Received webhook verification request with params: {params}")
-        
         hub_mode = params.get("hub.mode")
         hub_verify_token = params.get("hub.verify_token")
         hub_challenge = params.get("hub.challenge")
         
-        # Log detailed verification attempt
-        logger.info(f"""
-        Webhook Verification Attempt:
-        - Mode: {hub_mode}
-        - Token Match: {hub_verify_token == VERIFY_TOKEN}
-        - Challenge Present: {bool(hub_challenge)}
-        - Full Params: {params}
-        """)
+        # The verify token and challenge are secrets: log whether they match, never their values
+        logger.info("Webhook verification attempt", extra={"mode": hub_mode, "token_match": hub_verify_token == VERIFY_TOKEN,
+                                                           "challenge_present": bool(hub_challenge)})
         
         # Verify all required parameters are present
         if not all([hub_mode, hub_verify_token, hub_challenge]):
-            logger.error(f"Missing required parameters. Received: mode={hub_mode}, token={hub_verify_token}, challenge={hub_challenge}")
+            logger.error("Missing webhook verification parameters", extra={"params": sorted(params)})
             raise HTTPException(
                 status_code=400,
                 detail="Missing required parameters for webhook verification"
@@ -56,7 +46,7 @@ async def facebook_webhook_verify(request: Request):
         
         # Verify the mode and token
         if hub_mode == "subscribe" and hub_verify_token == VERIFY_TOKEN:
-            logger.info(f"Webhook verified successfully! Challenge: {hub_challenge}")
+            logger.info("Webhook verified")
             # Facebook expects the challenge value as plain text
             return Response(
                 content=hub_challenge,
@@ -64,7 +54,7 @@ async def facebook_webhook_verify(request: Request):
                 status_code=200
             )
         
-        logger.warning(f"Verification failed. Mode: {hub_mode}, Token match: {hub_verify_token == VERIFY_TOKEN}")
+        logger.warning("Webhook verification failed", extra={"mode": hub_mode, "token_match": hub_verify_token == VERIFY_TOKEN})
         raise HTTPException(
             status_code=403,
             detail="Verification token mismatch"
@@ -73,7 +63,7 @@ async def facebook_webhook_verify(request: Request):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error during webhook verification: {str(e)}")
+        logger.error("Unexpected error during webhook verification: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Internal server error during webhook verification"
@@ -87,7 +77,8 @@ async def facebook_webhook(request: Request):
     try:
         facebook_service = FacebookService()
         data = await request.json()
-        logger.info(f"Received webhook payload: {data}")
+        # Payloads carry the clients' messages: ids and counts only, the full payload at DEBUG
+        logger.debug("Messenger webhook payload: %s", data)
         
         # Verify the request is from Facebook
         if "object" not in data:
@@ -96,7 +87,7 @@ async def facebook_webhook(request: Request):
             
         # Return 200 OK for any page object to acknowledge receipt
         if data["object"] == "page":
-            logger.info("Received valid page webhook")
+            logger.info("Received page webhook", extra={"entries": len(data.get("entry", []))})
             parsed_message = facebook_service.parse_incoming_message(data)
             
             if parsed_message:
@@ -107,7 +98,7 @@ async def facebook_webhook(request: Request):
                 HARDCODED_PSID = "24195304350131271"
 
                 if sender_id == HARDCODED_PSID:
-                    logger.info(f"Received message from hardcoded PSID {sender_id}: {message_text}")
+                    logger.info("Messenger message", extra={"sender_id": sender_id, "chars": len(message_text or "")})
                     
                     # Get agent and db instances
                     db: DatabaseInterface = get_db_interface()
@@ -123,14 +114,14 @@ async def facebook_webhook(request: Request):
 
                     if pending_orders:
                         order_id = pending_orders[0]["id"]
-                        logger.info(f"Processing message for order {order_id}")
+                        logger.info("Processing Messenger message", extra={"order_id": order_id, "sender_id": sender_id})
                         agent_response = await agent.process_message(order_id, message_text)
                         await facebook_service.send_message(sender_id, agent_response)
                     else:
-                        logger.warning(f"No pending order found for PSID {sender_id}. Cannot process message.")
+                        logger.warning("No pending order for Messenger sender", extra={"sender_id": sender_id})
                         await facebook_service.send_message(sender_id, "Désolé, je n'ai pas de commande en attente pour vous. Veuillez démarrer une nouvelle conversation via l'interface web.")
                 else:
-                    logger.warning(f"Received message from unknown PSID: {sender_id}. Message: {message_text}")
+                    logger.warning("Messenger message from unknown sender", extra={"sender_id": sender_id, "chars": len(message_text or "")})
                     await facebook_service.send_message(sender_id, "Désolé, je ne peux pas traiter les messages de ce compte. Veuillez contacter l'administrateur.")
             
             # Always return 200 OK to acknowledge receipt
@@ -138,7 +129,7 @@ async def facebook_webhook(request: Request):
             
         return Response(status_code=404, content="Unsupported object type")
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
+        logger.error("Error processing Messenger webhook: %s", e)
         # Still return 200 OK to prevent Facebook from retrying
         return Response(status_code=200)
 
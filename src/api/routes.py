@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Body, Depends, Form, Response, Request
+from fastapi import APIRouter, HTTPException, Body, Depends, Form, Response, Request, Header
 from typing import List, Optional, Dict
 from src.agent.models import OrderItem, Order, ConversationState, Message
 from src.agent.database.models import OrderModel, BusinessUser
@@ -7,15 +7,33 @@ from src.api.dependencies import get_db_interface, get_agent, verify_api_key
 from src.agent.database.base import DatabaseInterface
 from src.agent.agent import OrderConfirmationAgent as Agent
 import uuid
+import logging
 from datetime import datetime
 import json
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select, func
 from src.services.twilio_service import send_sms
 from src.services.facebook_service import FacebookService
 from twilio.twiml.messaging_response import MessagingResponse
+from src.agent.intent import fast_path_stats
+from src.agent.stream_parser import streaming_stats
+from src.agent.decision import decoder_stats
+from src.agent.tiering import tier_stats
+from src.services.product_catalog import get_product_catalog
+from src.services.language_service import get_language_detector
+from src.services.llm_cache import get_llm_cache
+from src.services.ai_service import token_usage, get_llm_gateway, get_llm_backend
+from src.services.logging_config import logging_stats
+from src.services.metrics import registry, queue_depth, record_cache
+from src.services.tracing import get_tracer
+from src.services.profiling import get_profiler, profile_authorized
+from src.agent.transcript import get_transcript_recorder
+from src.agent.summarizer import summarizer
 import os
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.get("/orders")
@@ -109,7 +127,7 @@ async def start_confirmation(
             send_sms(to_number=customer_phone, message=initial_response)
         except Exception as e:
             # If SMS fails, we should still proceed, but log the error.
-            print(f"ERROR: Failed to send initial confirmation SMS to {customer_phone}: {e}")
+            logger.error("Failed to send initial confirmation SMS: %s", e, extra={"order_id": order_id})
     elif mode == "messenger":
         # Hardcoded PSID for now
         PSID = "24195304350131271"
@@ -117,7 +135,7 @@ async def start_confirmation(
         try:
             await facebook_service.send_message(recipient_id=PSID, message_text=initial_response)
         except Exception as e:
-            print(f"ERROR: Failed to send initial confirmation Messenger message to {PSID}: {e}")
+            logger.error("Failed to send initial confirmation Messenger message: %s", e)
 
     # Return the response to the frontend for both modes
     return {
@@ -128,14 +146,10 @@ async def start_confirmation(
 
 @router.post("/orders/{order_id}/message")
 async def send_message(order_id: str, message: dict, agent=Depends(get_agent)):
-    from langdetect import detect
     user_input = message.get("text", "")
     if not user_input:
         raise HTTPException(status_code=400, detail="Message text is required")
-    try:
-        language = detect(user_input)
-    except Exception:
-        language = "fr"  # Default to French if detection fails
+    language = get_language_detector().detect(user_input)
     response = await agent.process_message(order_id, user_input, language=language)
     return {
         "order_id": order_id,
@@ -143,6 +157,86 @@ async def send_message(order_id: str, message: dict, agent=Depends(get_agent)):
         "agent_response": response
     }
 
+@router.post("/orders/{order_id}/message/stream")
+async def stream_message(order_id: str, message: dict, agent=Depends(get_agent)):
+    """Same as /orders/{order_id}/message, but streams the agent reply as Server-Sent Events.
+
+    Emits `token` events with pieces of the reply while it is generated and a
+    final `done` event carrying the complete agent response.
+    """
+    user_input = message.get("text", "")
+    if not user_input:
+        raise HTTPException(status_code=400, detail="Message text is required")
+    language = get_language_detector().detect(user_input)
+
+    async def event_stream():
+        async for event, text in agent.stream_process_message(order_id, user_input, language=language):
+            if event == "done":
+                payload = {"order_id": order_id, "user_message": user_input, "agent_response": text}
+            else:
+                payload = {"text": text}
+            yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/agent/stats")
+async def get_agent_stats():
+    """Share of turns answered without the LLM and LLM cache efficiency."""
+    catalog = get_product_catalog()
+    recorder = get_transcript_recorder()
+    return {
+        "fast_path": fast_path_stats.stats(),
+        "llm_cache": get_llm_cache().stats(),
+        "llm_tokens": token_usage.stats(),
+        "llm_gateway": get_llm_gateway().stats(),
+        "llm_backend": get_llm_backend().stats(),
+        "streaming": streaming_stats.stats(),
+        "decoder": decoder_stats.stats(),
+        "model_tiers": tier_stats.stats(),
+        "product_catalog": catalog.stats() if catalog else None,
+        "language": get_language_detector().stats(),
+        "logging": logging_stats(),
+        "tracing": get_tracer().stats(),
+        "transcripts": recorder.stats() if recorder else None,
+        "profiling": get_profiler().stats()
+    }
+
+def _collect_runtime_metrics():
+    """Refresh queue and cache gauges from the stats objects at scrape time."""
+    gateway = get_llm_gateway()
+    queue_depth.labels("llm_in_flight").set(gateway.in_flight)
+    queue_depth.labels("llm_waiting").set(gateway.waiting)
+    queue_depth.labels("log_records").set(logging_stats()["queued"])
+    queue_depth.labels("summaries").set(len(summarizer._tasks))
+    cache = get_llm_cache()
+    record_cache("llm", cache.hits, cache.misses)
+    detector = get_language_detector()
+    record_cache("language", detector.cache_hits, detector.calls - detector.cache_hits)
+    catalog = get_product_catalog()
+    if catalog:
+        record_cache("product_catalog", catalog.hits, catalog.misses)
+
+registry.add_collector(_collect_runtime_metrics)
+
+@router.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/profiles/{name}")
+async def get_profile(name: str, x_profile: Optional[str] = Header(None)):
+    """Folded stacks of a request profile, named by the X-Profile-File response header. Needs the admin token."""
+    if not profile_authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+    folded = get_profiler().read(name)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(folded, media_type="text/plain")
+
 @router.get("/orders/{order_id}/conversation")
 async def get_conversation(order_id: str, db=Depends(get_db_interface)):
     conversation = await db.get_conversation(order_id)
@@ -177,7 +271,7 @@ async def create_order(order: CreateOrder, db=Depends(get_db_interface), agent:
         facebook_service = FacebookService()
         await facebook_service.send_message(recipient_id=PSID, message_text=initial_response)
     except Exception as e:
-        print(f"ERROR: Failed to send initial confirmation Messenger message to {PSID}: {e}")
+        logger.error("Failed to send initial confirmation Messenger message: %s", e)
 
     return {"id": order_id, "status": "created"}
 
@@ -191,20 +285,20 @@ async def woocommerce_webhook(
     try:
         body = await request.body()
         body_str = body.decode('utf-8')
-        print(f"DEBUG: Received webhook body: {body_str}")
+        logger.debug("Received WooCommerce webhook", extra={"bytes": len(body)})
 
         # Check for WooCommerce test webhook
         if "webhook_id=1" in body_str:
-            print("INFO: Received WooCommerce test webhook. Returning success.")
+            logger.info("Received WooCommerce test webhook. Returning success.")
             return {"status": "test_webhook_received"}
 
         if not body_str:
-            print("INFO: Received empty webhook request. Likely a test from WooCommerce.")
+            logger.info("Received empty webhook request. Likely a test from WooCommerce.")
             return {"status": "empty_request"}
 
         webhook_data = json.loads(body_str)
         
-        print(f"DEBUG: Received WooCommerce webhook: {webhook_data}")
+        logger.debug("WooCommerce webhook parsed", extra={"woocommerce_order_id": webhook_data.get("id"), "status": webhook_data.get("status")})
         
         # Extract order information from WooCommerce format
         order_id = f"woo_order_{webhook_data.get('id')}"
@@ -257,7 +351,7 @@ async def woocommerce_webhook(
         
         await db.create_order(new_order_data)
         
-        print(f"DEBUG: Created order in system: {order_id}")
+        logger.info("Created order from WooCommerce webhook", extra={"order_id": order_id})
         
         # Trigger AI agent conversation
         try:
@@ -268,15 +362,15 @@ async def woocommerce_webhook(
             if PSID:
                 facebook_service = FacebookService()
                 await facebook_service.send_message(recipient_id=PSID, message_text=initial_response)
-                print(f"DEBUG: Sent Messenger message to {PSID}")
+                logger.debug("Sent Messenger message", extra={"order_id": order_id})
                 
         except Exception as e:
-            print(f"ERROR: Failed to send initial confirmation message: {e}")
+            logger.error("Failed to send initial confirmation message: %s", e, extra={"order_id": order_id})
         
         return {"status": "success", "order_id": order_id}
         
     except Exception as e:
-        print(f"ERROR processing WooCommerce webhook: {e}")
+        logger.exception("Error processing WooCommerce webhook")
         raise HTTPException(status_code=500, detail="Failed to process webhook")
 
 @router.post("/orders/submit", response_model=OrderSchema)
@@ -289,7 +383,7 @@ async def submit_order(
     order_id = f"order_{str(uuid.uuid4())[:8]}"
     now = datetime.utcnow()
 
-    print(f"DEBUG: items before OrderModel: {order_data.order_data.items}")
+    logger.debug("Submitting order", extra={"order_id": order_id, "items": len(order_data.order_data.items)})
     new_order_data = {
         "id": order_id,
         "customer_name": order_data.customer_info.customer_name,
@@ -330,7 +424,7 @@ async def submit_order(
         facebook_service = FacebookService()
         await facebook_service.send_message(recipient_id=PSID, message_text=initial_response)
     except Exception as e:
-        print(f"ERROR: Failed to send initial confirmation Messenger message to {PSID}: {e}")
+        logger.error("Failed to send initial confirmation Messenger message: %s", e)
 
     return response_order
 
@@ -402,7 +496,7 @@ async def sms_webhook(
 
     if not order or order.get("status") != "pending":
         # If no pending order is found, log it and send a polite generic message.
-        print(f"Webhook received from {customer_phone} but no pending order found.")
+        logger.info("SMS webhook received but no pending order found")
         twiml_response.message("Désolé, je ne trouve aucune commande en attente de confirmation pour ce numéro.")
     else:
         # If a pending order is found, process the message with the agent
@@ -1,7 +1,13 @@
 from dotenv import load_dotenv
 load_dotenv() # Load environment variables from .env file
 
-from fastapi import FastAPI
+import time
+import logging
+from contextlib import nullcontext
+from src.services.logging_config import setup_logging
+setup_logging()  # Before the other imports, so module-level log calls go through the queue
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
@@ -9,8 +15,15 @@ from src.api.routes import router as api_router
 from src.api.facebook_routes import router as facebook_router
 from src.api.business import router as business_router
 from src.api.dependencies import create_db_tables
+from src.services.ai_service import get_llm_backend, GOOGLE_API_KEY
+from src.services.product_catalog import get_product_catalog
+from src.services.metrics import http_request_seconds, route_template
+from src.services.tracing import get_tracer, parse_traceparent
+from src.services.profiling import get_profiler, should_profile, profile_name, PROFILE_HEADER
 import os
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Order Confirmation Agent API", version="1.0.0")
 
 # Add CORS middleware
@@ -22,15 +35,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    # Requested with the admin token or sampled: profile the request and the tasks it starts
+    profile = None
+    if should_profile(request.headers.get(PROFILE_HEADER), request.url.path):
+        profile = get_profiler().start(profile_name(request.method, request.url.path))
+    # Root span of the request; the agent turn, DB, LLM and outbound calls it triggers are its children
+    tracer = get_tracer()
+    request_span = None
+    if tracer.enabled:
+        request_span = tracer.start_span("http.request", remote_parent=parse_traceparent(request.headers.get("traceparent")),
+                                         method=request.method)
+
+    def finish(error=None):
+        # Labelled with the route template so order ids do not create new series
+        route = route_template(request) or "unmatched"
+        http_request_seconds.labels(request.method, route, status).observe(time.perf_counter() - start)
+        if request_span:
+            request_span.set_attribute("route", route)
+            request_span.set_attribute("status", status)
+            if error is not None:
+                request_span.set_error(error)
+            tracer.end_span(request_span)
+
+    try:
+        with tracer.use_span(request_span) if request_span else nullcontext():
+            response = await call_next(request)
+    except BaseException as e:
+        finish(e)
+        if profile:
+            await get_profiler().finish(profile)
+        raise
+    status = response.status_code
+    body = response.body_iterator
+
+    async def observed_body():
+        # call_next returns once the headers are ready: a streamed reply is only done when its body is sent
+        error = None
+        try:
+            async for chunk in body:
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            finish(error)
+
+    response.body_iterator = observed_body()
+    return get_profiler().attach(profile, response) if profile else response
+
 @app.on_event("startup")
 async def startup_event():
     try:
         db_initialized = await create_db_tables()
         if not db_initialized:
-            print("[WARNING] Database initialization failed, but continuing startup...")
+            logger.warning("Database initialization failed, but continuing startup...")
     except Exception as e:
-        print(f"[WARNING] Error during startup: {e}")
-        print("[INFO] Continuing startup without database...")
+        logger.warning("Error during startup: %s. Continuing startup without database...", e)
+    # Create the shared LLM backend once and open its connection before the first turn
+    backend = get_llm_backend()
+    if backend.name != "gemini" or GOOGLE_API_KEY:
+        await backend.warmup()
+    # Start loading the product catalog so added items can be priced locally
+    catalog = get_product_catalog()
+    if catalog:
+        catalog.refresh_in_background()
 
 # Serve static files from the 'src/web' directory at /static
 app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "web"), html=True), name="static")
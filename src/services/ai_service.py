@@ -1,16 +1,31 @@
 import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import aclosing
+from collections import OrderedDict
 from dotenv import load_dotenv
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from src.services.llm_errors import LLMServiceError, LLMTransientError, LLMQuotaError, LLMCircuitOpenError
+from src.services.llm_gateway import LLMGateway
+from src.services.llm_backend import LLMBackend, token_usage
+from src.services.llm_router import HedgedRouter
+from src.services.metrics import llm_call_seconds
+from src.services.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 # Constants
 DEFAULT_MODEL = "models/gemini-2.0-flash"  # Latest and most capable model
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))  # Per-call timeout
+WARMUP_TIMEOUT = 10.0
+MAX_MODEL_HANDLES = 8  # Pooled GenerativeModel instances (model name x generation config)
 
-class LLMServiceError(Exception):
-    """Custom exception for LLM service errors."""
-    pass
 
 class AIService:
     pass
@@ -18,7 +33,7 @@ class AIService:
 def list_available_models():
     """List all available models for debugging."""
     if not GOOGLE_API_KEY:
-        print("GOOGLE_API_KEY not set in environment.")
+        logger.error("GOOGLE_API_KEY not set in environment.")
         return []
     
     genai.configure(api_key=GOOGLE_API_KEY)  # type: ignore
@@ -26,41 +41,208 @@ def list_available_models():
     try:
         models = genai.list_models()  # type: ignore
         available_models = []
-        print("Available models:")
         for model in models:
             if 'generateContent' in model.supported_generation_methods:
-                print(f"  - {model.name}")
                 available_models.append(model.name)
+        logger.info("Available models: %s", ", ".join(available_models))
         return available_models
     except Exception as e:
-        print(f"Error listing models: {e}")
+        logger.error("Error listing models: %s", e)
         return []
 
-async def call_llm(prompt, model=DEFAULT_MODEL, system_prompt=None, max_tokens=512):
-    if not GOOGLE_API_KEY:
-        raise LLMServiceError("GOOGLE_API_KEY not set in environment.")
-    
-    # Configure the API key
-    genai.configure(api_key=GOOGLE_API_KEY) #type: ignore
-    
+def _map_provider_error(e, timeout):
+    """Translate provider exceptions into the LLMServiceError hierarchy used by the gateway."""
+    if isinstance(e, LLMServiceError):
+        return e
+    if isinstance(e, asyncio.TimeoutError):
+        return LLMTransientError(f"LLM call timed out after {timeout}s")
+    if isinstance(e, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return LLMQuotaError()
+    if isinstance(e, (google_exceptions.ServiceUnavailable, google_exceptions.DeadlineExceeded,
+                      google_exceptions.InternalServerError, google_exceptions.BadGateway)):
+        return LLMTransientError(f"LLM call failed: {e}")
+    return LLMServiceError(f"LLM call failed: {e}")
+
+
+class LLMClient(LLMBackend):
+    """Long-lived Gemini client.
+
+    The API key is configured once and model handles are pooled by model name
+    and generation config, so the hot path only pays for the request itself.
+    """
+
+    def __init__(self, api_key=None, timeout=DEFAULT_TIMEOUT, max_handles=MAX_MODEL_HANDLES):
+        self.name = "gemini"
+        self.api_key = api_key or GOOGLE_API_KEY
+        self.timeout = timeout
+        self.max_handles = max_handles
+        self._configured = False
+        self._handles = OrderedDict()
+
+    def _ensure_configured(self):
+        if not self.api_key:
+            raise LLMServiceError("GOOGLE_API_KEY not set in environment.")
+        if not self._configured:
+            genai.configure(api_key=self.api_key)  # type: ignore
+            self._configured = True
+
+    def get_model(self, model=DEFAULT_MODEL, generation_config=None):
+        """Return a pooled model handle for (model, generation_config)."""
+        self._ensure_configured()
+        key = (model, json.dumps(generation_config or {}, sort_keys=True))
+        handle = self._handles.get(key)
+        if handle is not None:
+            self._handles.move_to_end(key)
+            return handle
+        handle = genai.GenerativeModel(model, generation_config=generation_config or None)  # type: ignore
+        self._handles[key] = handle
+        if len(self._handles) > self.max_handles:
+            self._handles.popitem(last=False)
+        return handle
+
+    @staticmethod
+    def _generation_config(max_tokens, response_schema=None):
+        config = {"max_output_tokens": max_tokens}
+        if response_schema:
+            # Constrained decoding: the model can only emit JSON matching the schema
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = response_schema
+        return config
+
+    async def generate(self, prompt, model=DEFAULT_MODEL, max_tokens=512, timeout=None, response_schema=None):
+        timeout = timeout or self.timeout
+        model_instance = self.get_model(model, self._generation_config(max_tokens, response_schema))
+        try:
+            response = await asyncio.wait_for(
+                model_instance.generate_content_async(prompt, request_options={"timeout": timeout}),
+                timeout=timeout
+            )
+            token_usage.record_response(model, prompt, response)
+            return response.text
+        except Exception as e:
+            raise _map_provider_error(e, timeout)
+
+    async def stream(self, prompt, model=DEFAULT_MODEL, max_tokens=512, timeout=None, response_schema=None):
+        """Yield the reply text chunk by chunk as the provider produces it."""
+        timeout = timeout or self.timeout
+        model_instance = self.get_model(model, self._generation_config(max_tokens, response_schema))
+        try:
+            response = await asyncio.wait_for(
+                model_instance.generate_content_async(prompt, stream=True, request_options={"timeout": timeout}),
+                timeout=timeout
+            )
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. a final safety/usage chunk)
+                    continue
+                if text:
+                    yield text
+            token_usage.record_response(model, prompt, response)
+        except Exception as e:
+            raise _map_provider_error(e, timeout)
+
+    async def warmup(self, model=DEFAULT_MODEL):
+        """Create the default model handle and send a tiny request to open the connection."""
+        try:
+            await self.generate("ping", model=model, max_tokens=1, timeout=WARMUP_TIMEOUT)
+            return True
+        except LLMServiceError as e:
+            logger.warning("LLM warmup failed: %s", e)
+            return False
+
+
+_client = None
+
+def get_llm_client():
+    """Return the process-wide LLMClient, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = LLMClient()
+    return _client
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+LLM_HEDGE_BACKEND = os.getenv("LLM_HEDGE_BACKEND", "").lower()  # Empty disables hedged requests
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL") or None  # Model for the hedge request (default: same model)
+
+_backend = None
+
+def _make_backend(name):
+    if name == "fake":
+        from src.services.fake_llm import FakeLLMBackend
+        return FakeLLMBackend.from_env()
+    return get_llm_client()
+
+def get_llm_backend():
+    """Return the process-wide backend selected by LLM_BACKEND ("gemini" or "fake"),
+    wrapped in a HedgedRouter when LLM_HEDGE_BACKEND is set."""
+    global _backend
+    if _backend is None:
+        _backend = _make_backend(LLM_BACKEND)
+        if LLM_HEDGE_BACKEND:
+            _backend = HedgedRouter(_backend, _make_backend(LLM_HEDGE_BACKEND), hedge_model=LLM_HEDGE_MODEL)
+    return _backend
+
+_gateway = None
+
+def get_llm_gateway():
+    """Return the process-wide LLMGateway in front of the selected backend."""
+    global _gateway
+    if _gateway is None:
+        backend = get_llm_backend()
+        _gateway = LLMGateway(backend.generate, stream_backend=backend.stream)
+    return _gateway
+
+def use_llm_backend(backend, **gateway_options):
+    """Send all LLM calls to `backend` from now on, through a new gateway (replays and tests)."""
+    global _backend, _gateway
+    _backend = backend
+    _gateway = LLMGateway(backend.generate, stream_backend=backend.stream, **gateway_options)
+    return _gateway
+
+async def call_llm(prompt, model=DEFAULT_MODEL, system_prompt=None, max_tokens=512, timeout=None, response_schema=None):
+    start = time.perf_counter()
+    result = "error"
+    with get_tracer().span("llm.call", model=model) as llm_span:
+        try:
+            reply = await get_llm_gateway().call(prompt, model=model, max_tokens=max_tokens, timeout=timeout,
+                                                 response_schema=response_schema)
+            result = "ok"
+            llm_span.set_attribute("reply_chars", len(reply or ""))
+            return reply
+        finally:
+            llm_call_seconds.labels(model, result).observe(time.perf_counter() - start)
+
+async def call_llm_stream(prompt, model=DEFAULT_MODEL, max_tokens=512, timeout=None, response_schema=None):
+    """Async iterator over the reply text chunks, through the shared gateway.
+
+    `timeout` (default LLM_TIMEOUT_SECONDS) bounds the wait for each chunk, not only the first.
+    """
+    timeout = timeout or DEFAULT_TIMEOUT
+    start = time.perf_counter()
+    result = "error"
+    tracer = get_tracer()
+    # Not made current: the consumer runs between chunks and must not nest its own spans under this one
+    llm_span = tracer.start_span("llm.stream", model=model) if tracer.enabled else None
     try:
-        # Create the model
-        model_instance = genai.GenerativeModel(model) #type: ignore
-        
-        # Generate content with generation config
-        response = await model_instance.generate_content_async(
-            prompt,
-            generation_config={
-                "max_output_tokens": max_tokens
-            }
-        )
-        return response.text
-    except Exception as e:
-        # Programmatic quota error detection: check for quota-related errors in the exception message
-        msg = str(e).lower()
-        if ("quota" in msg or "exceed" in msg or "resource exhausted" in msg or "too many requests" in msg):
-            raise LLMServiceError("quota_exceeded")
-        raise LLMServiceError(f"LLM call failed: {e}")
+        async with aclosing(get_llm_gateway().stream(prompt, model=model, max_tokens=max_tokens, timeout=timeout,
+                                                     response_schema=response_schema)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+        result = "ok"
+    except GeneratorExit:
+        # The caller stopped reading once the decision was complete
+        result = "ok"
+        raise
+    except BaseException as e:
+        if llm_span:
+            llm_span.set_error(e)
+        raise
+    finally:
+        llm_call_seconds.labels(model, result).observe(time.perf_counter() - start)
+        if llm_span:
+            tracer.end_span(llm_span)
 
 # Usage example (remove or comment out in production):
 # if __name__ == "__main__":
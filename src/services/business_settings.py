@@ -0,0 +1,39 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-business overrides, loaded from a JSON file mapping business_id -> settings, e.g.
+# {"acme": {"llm_cache": false, "model_tiers": {"simple": "models/gemini-2.0-flash"}}}
+BUSINESS_SETTINGS_FILE = os.getenv("BUSINESS_SETTINGS_FILE")
+
+DEFAULT_SETTINGS = {
+    "llm_cache": True,  # Reuse cached LLM replies for identical turn contexts
+    "model_tiers": {},  # Tier name ("simple", "complex") -> model, on top of the default tiers
+}
+
+_settings = None
+
+def load_business_settings(path=None):
+    """Load the per-business settings file. Missing or invalid files mean no overrides."""
+    global _settings
+    path = path or BUSINESS_SETTINGS_FILE
+    _settings = {}
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                _settings = json.load(f)
+        except Exception as e:
+            logger.warning("Could not load business settings from %s: %s", path, e)
+            _settings = {}
+    return _settings
+
+def get_business_settings(business_id=None):
+    """Return the default settings merged with the overrides of `business_id`."""
+    if _settings is None:
+        load_business_settings()
+    settings = dict(DEFAULT_SETTINGS)
+    if business_id and business_id in _settings:
+        settings.update(_settings[business_id])
+    return settings
@@ -2,6 +2,7 @@ import httpx
 import os
 import logging
 from typing import Optional, Dict, Any
+from src.services.tracing import traced
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -32,6 +33,7 @@ class FacebookService:
             "Content-Type": "application/json",
         }
 
+    @traced("facebook.send_message")
     async def send_message(self, recipient_id: str, message_text: str) -> Dict[str, Any]:
         """
         Sends a text message to a specific user.
@@ -58,13 +60,13 @@ class FacebookService:
                     headers=self.headers
                 )
                 response.raise_for_status()
-                logger.info(f"Successfully sent message to {recipient_id}")
+                logger.info("Sent Messenger message", extra={"recipient_id": recipient_id, "chars": len(message_text)})
                 return response.json()
             except httpx.HTTPStatusError as e:
-                logger.error(f"Error sending Facebook message: {e.response.text}")
+                logger.error("Error sending Facebook message: %s", e.response.text, extra={"recipient_id": recipient_id})
                 return {"error": e.response.text}
             except httpx.RequestError as e:
-                logger.error(f"An error occurred while requesting Facebook API: {e}")
+                logger.error("An error occurred while requesting Facebook API: %s", e, extra={"recipient_id": recipient_id})
                 return {"error": str(e)}
 
     def parse_incoming_message(self, webhook_payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
@@ -73,8 +75,9 @@ class FacebookService:
         """
         if webhook_payload.get("object") == "page":
             for entry in webhook_payload.get("entry", []):
-                for messaging_event in entry.get("messaging", []):
-                    logger.info(f"Processing messaging event: {messaging_event}")
+                events = entry.get("messaging", [])
+                logger.debug("Messenger entry", extra={"entry_id": entry.get("id"), "events": len(events)})
+                for messaging_event in events:
                     sender_id = messaging_event.get("sender", {}).get("id")
                     if not sender_id:
                         logger.warning("Could not find sender ID in messaging event.")
@@ -82,12 +85,12 @@ class FacebookService:
 
                     if "message" in messaging_event and "text" in messaging_event["message"]:
                         message_text = messaging_event["message"]["text"]
-                        logger.info(f"Parsed message from {sender_id}: {message_text}")
+                        logger.debug("Parsed Messenger message", extra={"sender_id": sender_id, "chars": len(message_text)})
                         return {
                             "sender_id": sender_id,
                             "message_text": message_text,
                         }
                     else:
-                        logger.warning("Received a messaging event that is not a standard text message.")
+                        logger.warning("Received a messaging event that is not a standard text message.", extra={"sender_id": sender_id})
                         return {"sender_id": sender_id, "message_text": None}
         return None
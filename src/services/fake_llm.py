@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import random
+import asyncio
+from typing import AsyncIterator, List, Optional
+from src.services.llm_backend import LLMBackend, token_usage
+from src.services.llm_errors import LLMTransientError, LLMQuotaError
+
+# Latency spec: "fixed:MS", "uniform:MIN_MS:MAX_MS", "normal:MEAN_MS:STDDEV_MS" or "lognormal:MEDIAN_MS:SIGMA"
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:400:0.5")
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))  # Share of calls failing with a transient error
+FAKE_LLM_QUOTA_RATE = float(os.getenv("FAKE_LLM_QUOTA_RATE", "0"))  # Share of calls failing with quota_exceeded
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED")
+STREAM_CHUNK_CHARS = 12
+
+_USER_INPUT_RE = re.compile(r'(?:The client said|Le client a dit) ?: "(.*)"\s*$', re.DOTALL)
+_LANGUAGE_RE = re.compile(r'(?:Detected language for this message|Langue détectée pour ce message) ?: (\w+)')
+_ITEM_RE = re.compile(r'^\s*- (.+?) x(\d+) \(', re.MULTILINE)
+_NUMBER_RE = re.compile(r'\b(\d+)\b')
+_LATENCY_PARAMS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+
+class LatencyModel:
+    """Samples call latencies (in seconds) from a configured distribution."""
+
+    def __init__(self, spec: str = FAKE_LLM_LATENCY, rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        parts = spec.split(":")
+        self.kind = parts[0]
+        if self.kind not in _LATENCY_PARAMS:
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        try:
+            self.params = [float(p) for p in parts[1:]]
+        except ValueError:
+            raise ValueError(f"Latency parameters must be numbers: {spec}") from None
+        if len(self.params) != _LATENCY_PARAMS[self.kind]:
+            raise ValueError(f"{self.kind} latency takes {_LATENCY_PARAMS[self.kind]} parameter(s): {spec}")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = self.rng.gauss(p[0], p[1])
+        else:
+            ms = self.rng.lognormvariate(0, p[1]) * p[0]
+        return max(0.0, ms) / 1000.0
+
+
+class FakeLLMBackend(LLMBackend):
+    """Offline stand-in for Gemini that answers agent prompts with valid agent JSON.
+
+    It reads the client message, language and order items from the prompt and
+    answers confirm, cancel, add, remove, replace and modify intents, with
+    configurable latency and injected transient or quota errors.
+    """
+
+    def __init__(self, latency: str = FAKE_LLM_LATENCY, error_rate: float = FAKE_LLM_ERROR_RATE,
+                 quota_rate: float = FAKE_LLM_QUOTA_RATE, seed=FAKE_LLM_SEED):
+        if not (0 <= error_rate <= 1 and 0 <= quota_rate <= 1 and error_rate + quota_rate <= 1):
+            raise ValueError(f"Fake LLM error and quota rates must be in [0, 1] and add up to at most 1, "
+                             f"got {error_rate} and {quota_rate}")
+        self.name = "fake"
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls):
+        """A backend configured from the FAKE_LLM_* variables as they are now."""
+        return cls(latency=os.getenv("FAKE_LLM_LATENCY", FAKE_LLM_LATENCY),
+                   error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", FAKE_LLM_ERROR_RATE)),
+                   quota_rate=float(os.getenv("FAKE_LLM_QUOTA_RATE", FAKE_LLM_QUOTA_RATE)),
+                   seed=os.getenv("FAKE_LLM_SEED", FAKE_LLM_SEED))
+
+    def _maybe_fail(self):
+        roll = self.rng.random()
+        if roll < self.quota_rate:
+            raise LLMQuotaError()
+        if roll < self.quota_rate + self.error_rate:
+            raise LLMTransientError("LLM call failed: fake 503 Service Unavailable")
+
+    async def generate(self, prompt: str, model: str = None, max_tokens: int = 512, timeout: float = None,
+                       response_schema: dict = None) -> str:
+        self.calls += 1
+        delay = self.latency.sample()
+        if timeout and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise LLMTransientError(f"LLM call timed out after {timeout}s")
+        await asyncio.sleep(delay)
+        self._maybe_fail()
+        reply = json.dumps(self.decide(prompt), ensure_ascii=False)
+        token_usage.record(model or "fake", len(prompt) // 4, len(reply) // 4)
+        return reply
+
+    async def stream(self, prompt: str, model: str = None, max_tokens: int = 512, timeout: float = None,
+                     response_schema: dict = None) -> AsyncIterator[str]:
+        self.calls += 1
+        total = self.latency.sample()
+        await asyncio.sleep(total * 0.3)  # Time to first token
+        self._maybe_fail()
+        reply = json.dumps(self.decide(prompt), ensure_ascii=False)
+        chunks = [reply[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(reply), STREAM_CHUNK_CHARS)]
+        for chunk in chunks:
+            await asyncio.sleep(total * 0.7 / len(chunks))
+            yield chunk
+        token_usage.record(model or "fake", len(prompt) // 4, len(reply) // 4)
+
+    def decide(self, prompt: str) -> dict:
+        """Build the agent decision for the client message found in `prompt`."""
+        match = _USER_INPUT_RE.search(prompt)
+        text = (match.group(1) if match else "").strip().lower()
+        lang_match = _LANGUAGE_RE.search(prompt)
+        en = bool(lang_match and lang_match.group(1).startswith("en"))
+        items = [name for name, _ in _ITEM_RE.findall(prompt)]
+        quantities = {name: int(qty) for name, qty in _ITEM_RE.findall(prompt)}
+        numbers = [int(n) for n in _NUMBER_RE.findall(text)]
+
+        def reply(message_en, message_fr, action="none", modification=None):
+            return {"message": message_en if en else message_fr, "action": action, "modification": modification}
+
+        def mod(item=None, quantity=None, old_item=None, new_item=None):
+            return {"item": item, "quantity": quantity, "old_item": old_item, "new_item": new_item}
+
+        if re.search(r"\b(replace|remplacer|remplace)\b", text) and re.search(r"\b(with|by|par)\b", text):
+            left, new_name = re.split(r"\b(?:with|by|par)\b", text, maxsplit=1)
+            old_item = _find_item(left, items)
+            new_name = new_name.strip(" .!?")
+            new_name = re.sub(r"^(a|an|the|un|une|des|du|de la|le|la|les)\s+", "", new_name)
+            if old_item and new_name:
+                new_item = new_name.capitalize()
+                return reply(f"{old_item} has been replaced by {new_item}.", f"{old_item} a été remplacé par {new_item}.",
+                             "replace", mod(old_item=old_item, new_item=new_item))
+        if re.search(r"\b(remove|delete|supprimer|retirer|enlever)\b", text):
+            item = _find_item(text, items)
+            if item:
+                quantity = numbers[0] if numbers else quantities.get(item, 1)
+                return reply(f"I've removed {item} from your order.", f"J'ai retiré {item} de votre commande.",
+                             "remove", mod(item=item, quantity=quantity, old_item=item))
+        if re.search(r"\b(add|ajouter|ajoute|rajouter)\b", text):
+            item = _find_item(text, items) or _guess_new_item(text)
+            if item:
+                quantity = numbers[0] if numbers else 1
+                return reply(f"I've added {quantity} {item} to your order.", f"J'ai ajouté {quantity} {item} à votre commande.",
+                             "add", mod(item=item, quantity=quantity))
+        if re.search(r"\b(change|changer|modifier|set|mettre)\b", text) and numbers:
+            item = _find_item(text, items)
+            if item:
+                return reply(f"{item} quantity is now {numbers[-1]}.", f"La quantité de {item} est maintenant de {numbers[-1]}.",
+                             "modify", mod(item=item, quantity=numbers[-1]))
+        if re.search(r"\b(cancel|annuler|annulez)\b", text):
+            return reply("Your order has been cancelled.", "Votre commande a été annulée.", "cancel")
+        if re.search(r"\b(yes|ok|okay|correct|oui|d'accord|parfait|confirme)\b", text):
+            return reply("Great, your order is confirmed!", "Parfait, votre commande est confirmée !", "confirm")
+        if re.search(r"\b(thanks|thank you|merci)\b", text):
+            return reply("You're welcome!", "Avec plaisir !")
+        return reply("Could you please clarify what you would like to do with your order?",
+                     "Pouvez-vous préciser ce que vous souhaitez faire avec votre commande ?")
+
+
+def _find_item(text: str, items: List[str]) -> Optional[str]:
+    """Order item mentioned in `text`, tolerating plurals ("chairs" -> "Chair")."""
+    for name in items:
+        stem = name.lower().rstrip("sx")
+        if stem and stem in text:
+            return name
+    return None
+
+
+def _guess_new_item(text: str) -> Optional[str]:
+    words = [w for w in re.findall(r"[a-zà-ÿ]+", text) if len(w) > 2]
+    return words[-1].rstrip("s").capitalize() if words else None
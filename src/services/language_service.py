@@ -0,0 +1,116 @@
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+from src.agent.keywords import match_keywords
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_LANGUAGES = ("fr", "en")
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "fr")
+LANGUAGE_CACHE_SIZE = int(os.getenv("LANGUAGE_CACHE_SIZE", "4096"))
+MIN_DETECTOR_CHARS = 12  # Below this the statistical detector is unreliable; keep the conversation language
+_WORD_RE = re.compile(r"\w+")
+
+
+class LanguageDetector:
+    """Detects the language of client messages (French or English).
+
+    Short messages are settled by a keyword vote; longer ones go to langdetect,
+    whose language profiles are loaded once, and results are memoized per text.
+    Messages too short or ambiguous to tell keep the conversation's language.
+    """
+
+    def __init__(self, cache_size: int = LANGUAGE_CACHE_SIZE, default: str = DEFAULT_LANGUAGE):
+        self.cache_size = cache_size
+        self.default = default
+        self._cache = OrderedDict()
+        self._detector = None  # langdetect.detect_langs once loaded, False if unavailable
+        self.calls = 0
+        self.fast_path = 0
+        self.cache_hits = 0
+        self.detector_calls = 0
+        self.detector_seconds = 0.0
+
+    def detect(self, text: str, fallback: Optional[str] = None) -> str:
+        """Language code of `text`; `fallback` (e.g. the conversation language) when undecidable."""
+        self.calls += 1
+        fallback = fallback or self.default
+        key = " ".join((text or "").lower().split())
+        if not key:
+            return fallback
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached or fallback
+        language = self._keyword_vote(key)
+        if language is not None:
+            self.fast_path += 1
+        elif len(key) >= MIN_DETECTOR_CHARS:
+            language = self._run_detector(key)
+        # Undecided texts are cached as "" so the detector is not retried for them
+        self._cache[key] = language or ""
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return language or fallback
+
+    def _keyword_vote(self, text: str) -> Optional[str]:
+        """Language of a short message: "" keeps the fallback (only "ok", "correct"...), None means undecided."""
+        hits = match_keywords(text)
+        en, fr = hits.count("lang_en"), hits.count("lang_fr")
+        if en == fr == 0 and hits.count("lang_neutral") == len(_WORD_RE.findall(text)):
+            return ""
+        # Only trust the vote on short messages or when it is one-sided
+        if en == fr or (len(text.split()) > 6 and min(en, fr) > 0):
+            return None
+        return "en" if en > fr else "fr"
+
+    def _load_detector(self):
+        if self._detector is None:
+            try:
+                from langdetect import DetectorFactory, detect_langs
+                DetectorFactory.seed = 0  # Deterministic results for the same text
+                self._detector = detect_langs
+            except ImportError:
+                logger.warning("langdetect is not installed; using keyword language detection only.")
+                self._detector = False
+        return self._detector
+
+    def _run_detector(self, text: str) -> Optional[str]:
+        detector = self._load_detector()
+        if not detector:
+            return None
+        start = time.perf_counter()
+        try:
+            candidates = detector(text)
+        except Exception:
+            return None
+        finally:
+            self.detector_calls += 1
+            self.detector_seconds += time.perf_counter() - start
+        for candidate in candidates:
+            if candidate.lang in SUPPORTED_LANGUAGES:
+                return candidate.lang
+        return None
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "fast_path": self.fast_path,
+            "cache_hits": self.cache_hits,
+            "detector_calls": self.detector_calls,
+            "avg_detector_ms": round(1000 * self.detector_seconds / self.detector_calls, 3) if self.detector_calls else 0.0,
+        }
+
+
+_detector = None
+
+def get_language_detector() -> LanguageDetector:
+    """Return the process-wide LanguageDetector."""
+    global _detector
+    if _detector is None:
+        _detector = LanguageDetector()
+    return _detector
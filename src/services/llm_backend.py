@@ -0,0 +1,107 @@
+import logging
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator
+from src.services.metrics import llm_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """Interface every LLM provider implements (Gemini, the local fake, ...).
+
+    Backends raise the LLMServiceError hierarchy from `llm_errors` so the gateway
+    can tell quota, transient and permanent failures apart.
+    """
+
+    name = "base"
+
+    async def generate(self, prompt: str, model: str = None, max_tokens: int = 512, timeout: float = None,
+                       response_schema: dict = None) -> str:
+        """Return the reply text. With `response_schema`, the reply must be JSON matching it."""
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, model: str = None, max_tokens: int = 512, timeout: float = None,
+                     response_schema: dict = None) -> AsyncIterator[str]:
+        # Default: a single chunk with the full reply
+        yield await self.generate(prompt, model=model, max_tokens=max_tokens, timeout=timeout, response_schema=response_schema)
+
+    async def warmup(self, model: str = None) -> bool:
+        return True
+
+    def stats(self):
+        return {"name": self.name}
+
+
+class UsageCapture:
+    """Tokens reported by the LLM calls made inside one `TokenUsage.capture()` block."""
+
+    __slots__ = ("calls", "prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+_capture: contextvars.ContextVar = contextvars.ContextVar("token_capture", default=None)
+
+
+class TokenUsage:
+    """Prompt/completion token counts per LLM call, with running totals."""
+
+    def __init__(self, history_size=100):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.recent = deque(maxlen=history_size)
+
+    def record_response(self, model, prompt, response):
+        """Record a provider response, reading its usage metadata when present."""
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        completion_tokens = getattr(usage, "candidates_token_count", None)
+        # Fall back to a character-based estimate when the provider omits usage
+        if prompt_tokens is None:
+            prompt_tokens = len(prompt) // 4
+        if completion_tokens is None:
+            completion_tokens = len(getattr(response, "text", "") or "") // 4
+        self.record(model, prompt_tokens, completion_tokens)
+
+    def record(self, model, prompt_tokens, completion_tokens):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.recent.append({"model": model, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+        capture = _capture.get()
+        if capture is not None:
+            capture.calls += 1
+            capture.prompt_tokens += prompt_tokens
+            capture.completion_tokens += completion_tokens
+        llm_tokens.labels(model, "prompt").inc(prompt_tokens)
+        llm_tokens.labels(model, "completion").inc(completion_tokens)
+        logger.debug("LLM usage", extra={"model": model, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+
+    @contextmanager
+    def capture(self):
+        """Collect the usage of the LLM calls made in the block, including the gateway tasks it starts."""
+        usage, previous = UsageCapture(), _capture.get()
+        _capture.set(usage)
+        try:
+            yield usage
+        finally:
+            # set, not reset: a streamed turn may be closed from another context
+            _capture.set(previous)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.calls, 1) if self.calls else 0.0,
+            "avg_completion_tokens": round(self.completion_tokens / self.calls, 1) if self.calls else 0.0,
+        }
+
+
+token_usage = TokenUsage()
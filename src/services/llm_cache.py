@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from contextlib import closing
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH")  # Optional persistent tier
+LLM_CACHE_HISTORY_MESSAGES = int(os.getenv("LLM_CACHE_HISTORY_MESSAGES", "4"))
+
+# Customer names are swapped for this token so identical turns on different customers share an entry
+CUSTOMER_PLACEHOLDER = "⟨customer⟩"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def _normalize(text):
+    return _WHITESPACE_RE.sub(" ", (text or "").strip().lower())
+
+def mask_customer(text, customer_name):
+    """`text` with the customer's name replaced by CUSTOMER_PLACEHOLDER."""
+    if customer_name:
+        return text.replace(customer_name, CUSTOMER_PLACEHOLDER)
+    return text
+
+def _field(item, name):
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+def make_cache_key(items, status, messages, user_input, language, customer_name=None, history_size=LLM_CACHE_HISTORY_MESSAGES, model=None):
+    """Hash the parts of a turn that determine the LLM reply.
+
+    The order is reduced to its item list and status, the history to its last
+    `history_size` messages, and all text is whitespace/case normalized.
+    """
+    item_list = [
+        (_normalize(_field(item, "name")), _field(item, "quantity"), _field(item, "price"))
+        for item in items
+    ]
+    history = [
+        (msg.get("role"), _normalize(mask_customer(msg.get("content", ""), customer_name)))
+        for msg in (messages[-history_size:] if history_size else [])
+    ]
+    payload = json.dumps(
+        [item_list, status, history, _normalize(user_input), (language or "")[:2], model or ""],
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """TTL + LRU cache of raw LLM replies with an optional SQLite persistent tier."""
+
+    def __init__(self, ttl=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES, db_path=LLM_CACHE_DB_PATH, enabled=LLM_CACHE_ENABLED):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.enabled = enabled
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self.evictions = 0
+        if self.db_path:
+            self._init_db()
+
+    def _connect(self):
+        # Short-lived connections: the persistent tier is only touched on memory misses and writes
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        return closing(conn)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            conn.commit()
+
+    def _db_get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and row[1] < time.time():
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            return row
+
+    def _db_set(self, key, value, expires_at):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+            conn.commit()
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key, customer_name=None):
+        value = None
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] >= time.time():
+                self._entries.move_to_end(key)
+                value = entry[1]
+            else:
+                del self._entries[key]
+        if value is None and self.db_path:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row:
+                value = row[0]
+                self.persistent_hits += 1
+                self._remember(key, value, row[1])
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if customer_name:
+            value = value.replace(CUSTOMER_PLACEHOLDER, customer_name)
+        return value
+
+    async def set(self, key, value, customer_name=None):
+        value = mask_customer(value, customer_name)
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self.db_path:
+            await asyncio.to_thread(self._db_set, key, value, expires_at)
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent_hits": self.persistent_hits,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+_cache = None
+
+def get_llm_cache():
+    """Return the process-wide LLM response cache."""
+    global _cache
+    if _cache is None:
+        _cache = LLMResponseCache()
+    return _cache
@@ -0,0 +1,19 @@
+class LLMServiceError(Exception):
+    """Custom exception for LLM service errors."""
+    pass
+
+class LLMTransientError(LLMServiceError):
+    """A failure worth retrying (timeout, 5xx, provider overloaded)."""
+    pass
+
+class LLMQuotaError(LLMServiceError):
+    """The provider rejected the call for quota or rate reasons."""
+
+    def __init__(self, message="quota_exceeded"):
+        super().__init__(message)
+
+class LLMCircuitOpenError(LLMServiceError):
+    """The circuit breaker is open; the call was not attempted."""
+
+    def __init__(self, message="circuit_open"):
+        super().__init__(message)
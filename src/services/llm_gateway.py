@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import random
+import asyncio
+from src.services.llm_errors import LLMServiceError, LLMTransientError, LLMQuotaError, LLMCircuitOpenError
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+
+class TokenBucket:
+    """Requests-per-minute limiter. `acquire` waits until a token is available."""
+
+    def __init__(self, rate_per_minute=LLM_REQUESTS_PER_MINUTE, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6.0)  # Allow ~10s worth of burst
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures (or one quota error),
+    half-open after `reset_timeout`, closed again on the first success.
+
+    Only transient errors and timeouts count as failures: a configuration or
+    request error says nothing about the provider's health."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            # Let a single probe through; everyone else keeps failing fast
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """End a call that neither succeeded nor failed (cancelled, bad request): a half-open
+        breaker lets the next call probe instead."""
+        self._probe_in_flight = False
+
+
+class LLMGateway:
+    """Shared entry point for provider calls.
+
+    Applies, in order: the circuit breaker, the requests-per-minute bucket, the
+    max-in-flight semaphore, and retries with jittered exponential backoff on
+    transient errors. Quota errors open the breaker immediately.
+    """
+
+    def __init__(self, backend, max_in_flight=LLM_MAX_IN_FLIGHT, rate_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 max_retries=LLM_MAX_RETRIES, retry_base_delay=LLM_RETRY_BASE_DELAY, breaker=None, stream_backend=None):
+        self.backend = backend
+        self.stream_backend = stream_backend
+        self.max_in_flight = max_in_flight
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.bucket = TokenBucket(rate_per_minute) if rate_per_minute else None
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.retries = 0
+        self.rejected = 0
+        self.failures = 0
+        self.deduplicated = 0
+        self._inflight = {}  # single-flight key -> shared task
+
+    async def call(self, *args, **kwargs):
+        """Run one provider call. Concurrent calls with identical arguments share a single
+        provider request (single-flight) and all receive its result or exception."""
+        key = self._flight_key(args, kwargs)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+        else:
+            task = asyncio.ensure_future(self._call(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: a caller giving up must not cancel the request for the others
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _flight_key(args, kwargs):
+        # kwargs may hold unhashable values such as a response schema dict
+        return (args, json.dumps(kwargs, sort_keys=True, default=str))
+
+    async def _call(self, *args, **kwargs):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise LLMCircuitOpenError()
+        attempt = 0
+        while True:
+            try:
+                result = await self._attempt(*args, **kwargs)
+                self.breaker.record_success()
+                return result
+            except LLMQuotaError:
+                self.failures += 1
+                self.breaker.trip()
+                raise
+            except (LLMTransientError, asyncio.TimeoutError):
+                self.failures += 1
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self.retries += 1
+                await self._backoff(attempt)
+            except BaseException as e:
+                # Non-transient errors and cancellation do not trip the breaker but must free the probe
+                if isinstance(e, Exception):
+                    self.failures += 1
+                self.breaker.release_probe()
+                raise
+
+    async def _acquire(self):
+        self.waiting += 1
+        try:
+            if self.bucket:
+                await self.bucket.acquire()
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.calls += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    async def _attempt(self, *args, **kwargs):
+        await self._acquire()
+        try:
+            return await self.backend(*args, **kwargs)
+        finally:
+            self._release()
+
+    async def _backoff(self, attempt):
+        # Full jitter: sleep uniformly in [0, base * 2^attempt]
+        await asyncio.sleep(random.uniform(0, self.retry_base_delay * (2 ** attempt)))
+
+    async def stream(self, *args, **kwargs):
+        """Streaming counterpart of `call`. Retries only happen before the first chunk.
+
+        With a `timeout`, every chunk must arrive within it: a provider that stalls
+        mid-stream fails like a timed-out call instead of holding the stream open.
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise LLMCircuitOpenError()
+        timeout = kwargs.get("timeout")
+        attempt = 0
+        while True:
+            started = False
+            try:
+                await self._acquire()
+                chunks = self.stream_backend(*args, **kwargs)
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            raise LLMTransientError(f"LLM stream stalled for {timeout}s")
+                        started = True
+                        yield chunk
+                finally:
+                    await chunks.aclose()
+                    self._release()
+                self.breaker.record_success()
+                return
+            except GeneratorExit:
+                # The consumer stopped reading early; the provider was answering fine
+                self.breaker.record_success()
+                raise
+            except LLMQuotaError:
+                self.failures += 1
+                self.breaker.trip()
+                raise
+            except (LLMTransientError, asyncio.TimeoutError):
+                self.failures += 1
+                if started or attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self.retries += 1
+                await self._backoff(attempt)
+            except BaseException as e:
+                if isinstance(e, Exception):
+                    self.failures += 1
+                self.breaker.release_probe()
+                raise
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "deduplicated": self.deduplicated,
+            "breaker_state": self.breaker.state,
+        }
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+from src.services.llm_backend import LLMBackend
+
+LLM_HEDGE_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", "0"))  # Fixed hedge delay; 0 = use the latency percentile
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+LLM_HEDGE_DEFAULT_DELAY_MS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "1500"))  # Until enough samples exist
+LLM_HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+def is_valid_reply(text: str, response_schema: Optional[dict] = None) -> bool:
+    """Default acceptance check: non-empty text, and parseable JSON when a schema was requested."""
+    if not text or not text.strip():
+        return False
+    if response_schema:
+        try:
+            json.loads(text)
+        except ValueError:
+            return False
+    return True
+
+
+class HedgedRouter(LLMBackend):
+    """Sends the request to the primary backend and, if it has not answered after
+    the hedge delay, a second request to the hedge backend (another provider, or the
+    same one with `hedge_model`). The first valid reply wins and the other request
+    is cancelled.
+
+    The delay is either fixed or the given percentile of recent primary latencies,
+    so only the slow tail pays for a second request. A primary cancelled because
+    the hedge won counts with the time it had run, a lower bound of its latency:
+    leaving the slow tail out would shrink the delay and hedge ever more calls.
+    """
+
+    def __init__(self, primary: LLMBackend, hedge: LLMBackend, hedge_model: Optional[str] = None,
+                 delay_ms: float = LLM_HEDGE_DELAY_MS, percentile: float = LLM_HEDGE_PERCENTILE,
+                 default_delay_ms: float = LLM_HEDGE_DEFAULT_DELAY_MS, min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+                 validator: Callable[[str, Optional[dict]], bool] = is_valid_reply):
+        self.name = "hedged"
+        self.primary = primary
+        self.hedge = hedge
+        self.hedge_model = hedge_model
+        self.delay_ms = delay_ms
+        self.percentile = percentile
+        self.default_delay_ms = default_delay_ms
+        self.min_samples = min_samples
+        self.validator = validator
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # Primary latencies, in seconds
+        self.calls = 0
+        self.hedged = 0
+        self.cancelled = 0
+        self.wins = {"primary": 0, "hedge": 0}
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before sending the hedge request."""
+        if self.delay_ms:
+            return self.delay_ms / 1000.0
+        if len(self.latencies) < self.min_samples:
+            return self.default_delay_ms / 1000.0
+        ordered = sorted(self.latencies)
+        return ordered[int(self.percentile * (len(ordered) - 1))]
+
+    async def _timed_primary(self, prompt, model, max_tokens, timeout, response_schema):
+        start = time.perf_counter()
+        try:
+            result = await self.primary.generate(prompt, model=model, max_tokens=max_tokens, timeout=timeout,
+                                                 response_schema=response_schema)
+        except asyncio.CancelledError:
+            self.latencies.append(time.perf_counter() - start)
+            raise
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def generate(self, prompt: str, model: str = None, max_tokens: int = 512, timeout: float = None,
+                       response_schema: dict = None) -> str:
+        self.calls += 1
+        primary = asyncio.ensure_future(self._timed_primary(prompt, model, max_tokens, timeout, response_schema))
+        tasks = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+            if not done or not self._accept(primary, response_schema):
+                # Primary is slow (or already failed): race a second request against it
+                self.hedged += 1
+                hedge = asyncio.ensure_future(self.hedge.generate(
+                    prompt, model=self.hedge_model or model, max_tokens=max_tokens, timeout=timeout,
+                    response_schema=response_schema))
+                tasks[hedge] = "hedge"
+            pending = {t for t in tasks if not t.done()}
+            while True:
+                for task in [t for t in tasks if t.done()]:
+                    if self._accept(task, response_schema):
+                        self.wins[tasks[task]] += 1
+                        return task.result()
+                if not pending:
+                    break
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Every request failed or returned an invalid reply: surface the primary's outcome
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    self.cancelled += 1
+                elif not task.cancelled():
+                    task.exception()  # Mark retrieved so losing errors are not logged as unhandled
+
+    def _accept(self, task: asyncio.Future, response_schema: Optional[dict]) -> bool:
+        if not task.done() or task.cancelled() or task.exception() is not None:
+            return False
+        return self.validator(task.result(), response_schema)
+
+    async def stream(self, prompt: str, model: str = None, max_tokens: int = 512, timeout: float = None,
+                     response_schema: dict = None) -> AsyncIterator[str]:
+        # Streams are not hedged: the first tokens are already on the wire when the tail shows up
+        async for chunk in self.primary.stream(prompt, model=model, max_tokens=max_tokens, timeout=timeout,
+                                               response_schema=response_schema):
+            yield chunk
+
+    async def warmup(self, model: str = None) -> bool:
+        results = await asyncio.gather(self.primary.warmup(), self.hedge.warmup(), return_exceptions=True)
+        return all(r is True for r in results)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "primary": self.primary.name,
+            "hedge": self.hedge.name,
+            "hedge_model": self.hedge_model,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "cancelled": self.cancelled,
+            "wins": dict(self.wins),
+            "hedge_delay_ms": round(1000 * self.hedge_delay(), 1),
+        }
@@ -0,0 +1,187 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+from src.agent.name_index import AmbiguousNameError, NameIndex
+
+logger = logging.getLogger(__name__)
+
+WOOCOMMERCE_STORE_URL = os.getenv("WOOCOMMERCE_STORE_URL")
+CATALOG_ENABLED = os.getenv("WOOCOMMERCE_CATALOG_ENABLED", "true").lower() == "true"
+CATALOG_REFRESH_SECONDS = float(os.getenv("WOOCOMMERCE_CATALOG_REFRESH_SECONDS", "300"))
+CATALOG_FULL_RELOAD_SECONDS = float(os.getenv("WOOCOMMERCE_CATALOG_FULL_RELOAD_SECONDS", "86400"))
+CATALOG_PAGE_SIZE = 100  # WooCommerce REST API maximum
+# Incremental refreshes also fetch unpublished products so they can be dropped; "any" leaves out the trash
+INCREMENTAL_STATUSES = ("any", "trash")
+
+
+class ProductCatalog:
+    """Local copy of one store's product catalog.
+
+    Loaded with paged bulk fetches, then refreshed in the background with
+    `modified_after` so only changed products are downloaded. Lookups by name
+    (fuzzy, through NameIndex) and SKU are in-memory and never call the store.
+    """
+
+    def __init__(self, store_url: str, fetch_page: Callable, refresh_seconds: float = CATALOG_REFRESH_SECONDS,
+                 full_reload_seconds: float = CATALOG_FULL_RELOAD_SECONDS, page_size: int = CATALOG_PAGE_SIZE):
+        self.store_url = store_url
+        self.fetch_page = fetch_page  # (page, per_page, modified_after, status) -> (products, total_pages); blocking
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.page_size = page_size
+        self.products: Dict[int, Dict] = {}
+        self.by_sku: Dict[str, int] = {}
+        self.index = NameIndex()
+        self.watermark: Optional[str] = None  # Latest date_modified_gmt seen
+        self.refreshed_at = 0.0
+        self.loaded_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.fetches = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at > 0
+
+    async def refresh(self, full: bool = False) -> int:
+        """Fetch products changed since the last refresh (everything on the first or a full load).
+
+        A full load only asks for published products. Incremental refreshes ask for
+        every status, so products unpublished or trashed since are dropped.
+        Returns the number of products received."""
+        full = full or not self.loaded
+        modified_after = None if full else self.watermark
+        received = {}
+        for status in ("publish",) if full else INCREMENTAL_STATUSES:
+            page, total_pages = 1, 1
+            while page <= total_pages:
+                # The WooCommerce client is blocking: keep it off the event loop
+                products, total_pages = await asyncio.to_thread(self.fetch_page, page, self.page_size, modified_after, status)
+                self.fetches += 1
+                for product in products:
+                    received[product["id"]] = product
+                page += 1
+        if full:
+            self._rebuild(received.values())
+            self.loaded_at = time.monotonic()
+        else:
+            for product in received.values():
+                self._upsert(product)
+        self.refreshed_at = time.monotonic()
+        logger.info("Catalog %s", "loaded" if full else "refreshed",
+                    extra={"store": self.store_url, "received": len(received), "products": len(self.products)})
+        return len(received)
+
+    def _rebuild(self, products):
+        self.products, self.by_sku, self.index, self.watermark = {}, {}, NameIndex(), None
+        for product in products:
+            self._upsert(product)
+
+    def _upsert(self, product: Dict):
+        product_id = product["id"]
+        if product.get("status", "publish") != "publish":
+            self.products.pop(product_id, None)
+            return
+        previous = self.products.get(product_id)
+        record = {
+            "id": product_id,
+            "name": product.get("name") or "",
+            "sku": product.get("sku") or None,
+            "price": _to_price(product.get("price")),
+        }
+        self.products[product_id] = record
+        if previous and previous["sku"] and previous["sku"] != record["sku"]:
+            self.by_sku.pop(previous["sku"].lower(), None)
+        if record["sku"]:
+            self.by_sku[record["sku"].lower()] = product_id
+        if not previous or previous["name"] != record["name"]:
+            # Renamed products keep their old index entry; lookups re-check the current name
+            self.index.add(record["name"], value=product_id)
+        modified = product.get("date_modified_gmt")
+        if modified and (self.watermark is None or modified > self.watermark):
+            self.watermark = modified
+
+    def refresh_in_background(self):
+        """Start a refresh if the catalog is stale and none is running. Never blocks the caller."""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        now = time.monotonic()
+        if self.loaded and now - self.refreshed_at < self.refresh_seconds:
+            return
+        full = not self.loaded or now - self.loaded_at > self.full_reload_seconds
+        self._refresh_task = asyncio.ensure_future(self._safe_refresh(full))
+
+    async def _safe_refresh(self, full: bool):
+        try:
+            await self.refresh(full=full)
+        except Exception as e:
+            # Keep serving the current copy; the next lookup retries after refresh_seconds
+            self.refreshed_at = time.monotonic()
+            logger.warning("Catalog refresh failed: %s", e, extra={"store": self.store_url})
+
+    def lookup(self, name: Optional[str] = None, sku: Optional[str] = None) -> Optional[Dict]:
+        """Product record ({id, name, sku, price}) by SKU, else by fuzzy name.
+
+        Raises AmbiguousNameError when the name matches several products about equally well.
+        """
+        self.refresh_in_background()
+        product = None
+        if sku:
+            product = self.products.get(self.by_sku.get(sku.strip().lower()))
+        if product is None and name:
+            for match in self.index.search(name, limit=3):
+                candidate = self.products.get(match.value)
+                # Skip entries of deleted products and names a product no longer has
+                if candidate and candidate["name"] == match.name:
+                    if match.ambiguous:
+                        self.misses += 1
+                        raise AmbiguousNameError(name, (match.name,) + match.ambiguous)
+                    product = candidate
+                    break
+        if product is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return product
+
+    def stats(self):
+        return {
+            "store": self.store_url,
+            "products": len(self.products),
+            "loaded": self.loaded,
+            "age_seconds": round(time.monotonic() - self.refreshed_at, 1) if self.refreshed_at else None,
+            "fetches": self.fetches,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _to_price(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+_catalogs: Dict[str, ProductCatalog] = {}
+
+def get_product_catalog(store_url: Optional[str] = None) -> Optional[ProductCatalog]:
+    """Catalog of the configured WooCommerce store, or None when no store is configured
+    or the catalog is turned off.
+
+    Only WOOCOMMERCE_STORE_URL has credentials, so orders from other sites get
+    no catalog rather than another store's prices.
+    """
+    store_url = store_url or WOOCOMMERCE_STORE_URL
+    if not CATALOG_ENABLED or not store_url or store_url != WOOCOMMERCE_STORE_URL:
+        return None
+    catalog = _catalogs.get(store_url)
+    if catalog is None:
+        from src.services.woocommerce_service import WooCommerceService
+        service = WooCommerceService()
+        catalog = ProductCatalog(store_url, service.list_products)
+        _catalogs[store_url] = catalog
+    return catalog
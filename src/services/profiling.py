@@ -0,0 +1,246 @@
+import os
+import re
+import sys
+import hmac
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+import weakref
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")  # Secret sent in the X-Profile header; unset disables header-triggered profiles
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Share of requests profiled without the header
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))  # Time between stack samples
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))  # Profile files kept in PROFILE_DIR; the oldest are deleted
+
+PROFILE_HEADER = "x-profile"
+PROFILE_FILE_HEADER = "X-Profile-File"
+
+_active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("active_profile", default=None)
+_PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.folded$")
+
+
+class RequestProfile:
+    """Stack samples of one request, as folded stacks ("root;...;leaf count")."""
+
+    __slots__ = ("name", "loop", "thread_id", "stacks", "samples", "started", "duration", "active")
+
+    def __init__(self, name: str, loop: asyncio.AbstractEventLoop):
+        self.name = name
+        self.loop = loop
+        self.thread_id = threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.duration = None
+        self.active = True
+
+    def folded(self) -> str:
+        """Input of flamegraph.pl, speedscope or inferno."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Statistical profiler for single requests, sampling the event loop thread.
+
+    A sampler thread reads the loop thread's stack every `interval_ms` and
+    counts it for the request whose task is running at that moment. Tasks the
+    request creates (the app behind the middleware, background summaries,
+    single-flight LLM calls) are tagged by a task factory while the request's
+    context is current, so their samples go to the request too; the loop time
+    of other requests is left out. Work in `to_thread` workers and waits for
+    I/O are not sampled: the profile shows event-loop CPU time.
+
+    While a profile runs, the interpreter's switch interval is lowered so the
+    sampler gets the GIL from a busy loop thread close to `interval_ms`.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.keep = keep
+        self._profiles: List[RequestProfile] = []
+        self._owners: "weakref.WeakKeyDictionary[asyncio.Task, RequestProfile]" = weakref.WeakKeyDictionary()
+        self._labels: Dict[object, str] = {}  # code object -> frame label
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._switch_interval = None
+        self.profiles_saved = 0
+        self.samples = 0
+
+    def start(self, name: str) -> RequestProfile:
+        """Profile the running task and every task it creates until `finish`."""
+        loop = asyncio.get_running_loop()
+        self._install_task_factory(loop)
+        profile = RequestProfile(name, loop)
+        self._owners[asyncio.current_task()] = profile
+        _active_profile.set(profile)
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self._switch_interval, self.interval / 2))
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    async def finish(self, profile: RequestProfile) -> Optional[str]:
+        """Stop sampling `profile` and save it. Returns the file path."""
+        if not profile.active:
+            return None
+        profile.active = False
+        profile.duration = time.perf_counter() - profile.started
+        with self._lock:
+            self._profiles.remove(profile)
+        try:
+            path = await asyncio.to_thread(self._save, profile)
+        except OSError as e:
+            logger.warning("Could not save profile %s: %s", profile.name, e)
+            return None
+        logger.info("Request profiled", extra={"profile": profile.name, "samples": profile.samples,
+                                               "duration_ms": round(1000 * profile.duration, 1)})
+        return path
+
+    def attach(self, profile: RequestProfile, response):
+        """Name the profile file in the response and finish the profile once the body is sent.
+
+        Streamed replies keep working after the middleware returns, so the
+        profile covers the whole body, not just the call to the app.
+        """
+        response.headers[PROFILE_FILE_HEADER] = profile.name
+        body = response.body_iterator
+
+        async def profiled_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                await self.finish(profile)
+
+        response.body_iterator = profiled_body()
+        return response
+
+    def _install_task_factory(self, loop):
+        """Wrap the loop's task factory so tasks created in a profiled request's context join its profile."""
+        previous = loop.get_task_factory()
+        if getattr(previous, "request_profiler", None) is self:
+            return
+
+        def task_factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+            profile = _active_profile.get()
+            if profile is not None and profile.active:
+                self._owners[task] = profile
+            return task
+
+        task_factory.request_profiler = self
+        loop.set_task_factory(task_factory)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    sys.setswitchinterval(self._switch_interval)
+                    self._thread = None
+                    return
+                targets = {(p.loop, p.thread_id) for p in self._profiles}
+            frames = sys._current_frames()
+            for loop, thread_id in targets:
+                task = asyncio.current_task(loop)
+                profile = self._owners.get(task) if task is not None else None
+                frame = frames.get(thread_id)
+                if profile is None or not profile.active or frame is None:
+                    continue
+                profile.stacks[self._fold(frame)] += 1
+                profile.samples += 1
+                self.samples += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _fold(self, frame) -> str:
+        """The stack as "root;...;leaf", starting at the task's coroutine rather than the event loop."""
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name == "_run" and code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+                break  # Handle._run: what is below is the event loop itself
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            labels.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def _save(self, profile: RequestProfile) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, profile.name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profile.folded())
+        self.profiles_saved += 1
+        saved = sorted(name for name in os.listdir(self.directory) if _PROFILE_NAME_RE.match(name))
+        for name in saved[:max(0, len(saved) - self.keep)]:
+            os.remove(os.path.join(self.directory, name))
+        return path
+
+    def read(self, name: str) -> Optional[str]:
+        """A saved profile's folded stacks, None if there is none by that name."""
+        if not _PROFILE_NAME_RE.match(name):
+            return None
+        try:
+            with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def stats(self):
+        return {
+            "token_set": bool(PROFILE_TOKEN),
+            "sample_rate": PROFILE_SAMPLE_RATE,
+            "running": len(self._profiles),
+            "saved": self.profiles_saved,
+            "samples": self.samples,
+        }
+
+
+def _short_path(filename: str) -> str:
+    """File path relative to the project or to site-packages, to keep frame labels short."""
+    for marker in ("site-packages" + os.sep, os.getcwd() + os.sep):
+        index = filename.find(marker)
+        if index >= 0:
+            return filename[index + len(marker):]
+    return os.path.basename(filename)
+
+
+def profile_authorized(header: Optional[str]) -> bool:
+    """True when `header` carries PROFILE_TOKEN."""
+    return bool(PROFILE_TOKEN and header) and hmac.compare_digest(header.encode(), PROFILE_TOKEN.encode())
+
+
+def should_profile(header: Optional[str], path: str) -> bool:
+    """Profile this request: asked for with the admin token, or picked by PROFILE_SAMPLE_RATE.
+    Downloads of profiles are never profiled."""
+    if path.startswith("/profiles/"):
+        return False
+    return profile_authorized(header) or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+def profile_name(method: str, path: str) -> str:
+    """Sortable, unique file name of a request's profile."""
+    slug = re.sub(r"[^\w-]+", "_", path.strip("/"))[:60] or "root"
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{random.getrandbits(32):08x}-{method.lower()}-{slug}.folded"
+
+
+_profiler = None
+
+def get_profiler() -> RequestProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = RequestProfiler()
+    return _profiler
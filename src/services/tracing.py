@@ -0,0 +1,359 @@
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")  # none, file or otlp
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.ndjson")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "order-confirmation-agent")
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))  # Traces at least this long are always exported
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))  # Share of the other traces exported too
+TRACE_MAX_PENDING = int(os.getenv("TRACE_MAX_PENDING", "1000"))  # Unfinished traces buffered before the oldest is dropped
+
+
+class Span:
+    """One timed operation. Ids are hex strings as in W3C traceparent headers."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, exc: BaseException):
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def as_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is off, so call sites never need to check."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, exc):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(size: int) -> str:
+    return random.getrandbits(size * 8).to_bytes(size, "big").hex()
+
+
+def current_span():
+    """The active span of the running task, or a no-op span."""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span_id) from a W3C traceparent header, None if absent or malformed."""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32:
+        return None
+    return parts[1], parts[2]
+
+
+class FileExporter:
+    """Appends spans as JSON lines to a local file."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.as_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+class OTLPExporter:
+    """Posts spans to an OTLP/HTTP collector in the JSON encoding."""
+
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, service_name: str = TRACE_SERVICE_NAME, timeout: float = 5.0):
+        import httpx
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.client = httpx.Client(timeout=timeout)
+
+    def export(self, spans: List[Span]):
+        self.client.post(self.endpoint, json=otlp_payload(spans, self.service_name)).raise_for_status()
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span], service_name: str = TRACE_SERVICE_NAME) -> Dict:
+    """ExportTraceServiceRequest body for a batch of spans."""
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # Internal
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+    }]}
+
+
+class _PendingTrace:
+    __slots__ = ("open", "spans")
+
+    def __init__(self):
+        self.open = 0
+        self.spans: List[Span] = []
+
+
+class Tracer:
+    """Creates spans and exports the traces the tail sampler keeps.
+
+    The active span lives in a context variable, so tasks created during a
+    request (background summaries, single-flight and hedged LLM calls) are
+    parented to it. Finished spans are buffered per trace; when the last open
+    span of a trace ends, the trace is exported if it was slow, failed, or is
+    in the random sample, and dropped otherwise. Spans that end after that
+    decision (background work outliving the request) follow it. Export runs on
+    a background thread so the event loop never waits on the file or network.
+    """
+
+    def __init__(self, exporter=None, slow_ms: float = TRACE_SLOW_MS, sample_rate: float = TRACE_SAMPLE_RATE,
+                 max_pending: int = TRACE_MAX_PENDING):
+        self.exporter = exporter
+        self.enabled = exporter is not None
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, _PendingTrace]" = OrderedDict()
+        self._decided: "OrderedDict[str, bool]" = OrderedDict()
+        self._lock = threading.Lock()  # Spans also end on to_thread workers
+        self._queue: queue.Queue = queue.Queue(maxsize=1000)
+        self._worker: Optional[threading.Thread] = None
+        self.traces_exported = 0
+        self.traces_sampled_out = 0
+        self.traces_evicted = 0
+        self.export_dropped = 0
+        self.export_errors = 0
+
+    def start_span(self, name: str, parent=None, remote_parent: Optional[Tuple[str, str]] = None, **attributes) -> Span:
+        """A started span that is not made current; end it with `end_span`."""
+        parent = parent if parent is not None else _current_span.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        elif remote_parent is not None:
+            span = Span(name, remote_parent[0], remote_parent[1], attributes)
+        else:
+            span = Span(name, _new_id(16), None, attributes)
+        with self._lock:
+            if span.trace_id not in self._decided:
+                pending = self._pending.get(span.trace_id)
+                if pending is None:
+                    pending = self._pending[span.trace_id] = _PendingTrace()
+                    if len(self._pending) > self.max_pending:
+                        self._pending.popitem(last=False)
+                        self.traces_evicted += 1
+                pending.open += 1
+        return span
+
+    def end_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        with self._lock:
+            decided = self._decided.get(span.trace_id)
+            if decided is not None:
+                spans = [span] if decided else None
+            else:
+                pending = self._pending.get(span.trace_id)
+                if pending is None:
+                    return  # Evicted
+                pending.spans.append(span)
+                pending.open -= 1
+                if pending.open > 0:
+                    return
+                del self._pending[span.trace_id]
+                spans = pending.spans if self._keep(pending.spans) else None
+                self._decided[span.trace_id] = spans is not None
+                if len(self._decided) > self.max_pending:
+                    self._decided.popitem(last=False)
+                if spans is None:
+                    self.traces_sampled_out += 1
+                else:
+                    self.traces_exported += 1
+        if spans:
+            self._export(spans)
+
+    def _keep(self, spans: List[Span]) -> bool:
+        duration_ms = (max(s.end_ns for s in spans) - min(s.start_ns for s in spans)) / 1e6
+        return (duration_ms >= self.slow_ms or any(s.error for s in spans)
+                or (self.sample_rate > 0 and random.random() < self.sample_rate))
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Context manager running its block as the current span."""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    @contextmanager
+    def use_span(self, span: Span):
+        """Run the block with a span from `start_span` as the current span, without ending it."""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    def _export(self, spans: List[Span]):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run_exports, name="trace-exporter", daemon=True)
+            self._worker.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.export_dropped += 1
+
+    def _run_exports(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self.exporter.export(spans)
+            except Exception as e:
+                self.export_errors += 1
+                logger.warning("Trace export failed: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued trace has been exported."""
+        if self._worker is not None:
+            self._queue.join()
+
+    def stats(self):
+        return {
+            "exporter": type(self.exporter).__name__ if self.exporter else None,
+            "slow_ms": self.slow_ms,
+            "pending_traces": len(self._pending),
+            "exported": self.traces_exported,
+            "sampled_out": self.traces_sampled_out,
+            "evicted": self.traces_evicted,
+            "export_dropped": self.export_dropped,
+            "export_errors": self.export_errors,
+        }
+
+
+_tracer = None
+
+def get_tracer() -> Tracer:
+    """The shared tracer, configured from TRACE_EXPORTER."""
+    global _tracer
+    if _tracer is None:
+        if TRACE_EXPORTER == "file":
+            exporter = FileExporter()
+        elif TRACE_EXPORTER == "otlp":
+            exporter = OTLPExporter()
+        else:
+            exporter = None
+        _tracer = Tracer(exporter)
+        if exporter is not None:
+            atexit.register(_tracer.flush)
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """`with span("llm.call", model=model):` on the shared tracer."""
+    return get_tracer().span(name, **attributes)
+
+
+def traced(name: str):
+    """Decorator running a sync or async function in a span named `name`."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                tracer = get_tracer()
+                if not tracer.enabled:
+                    return await fn(*args, **kwargs)
+                with tracer.span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer()
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,5 +1,9 @@
 import os
+import logging
 from dotenv import load_dotenv
+from src.services.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 # Dynamically import the real Twilio client only if needed
 try:
@@ -21,8 +25,9 @@ if not USE_MOCK and TWILIO_SDK_AVAILABLE:
     if account_sid and auth_token:
         client = Client(account_sid, auth_token)
     else:
-        print("WARNING: Twilio credentials not found. Real SMS sending will fail.")
+        logger.warning("Twilio credentials not found. Real SMS sending will fail.")
 
+@traced("twilio.send_sms")
 def send_sms(to_number: str, message: str):
     """
     Sends an SMS using either the real Twilio client or a mock service.
@@ -35,7 +40,7 @@ def send_sms(to_number: str, message: str):
     # Proceed with the real Twilio service
     if not client or not TWILIO_SDK_AVAILABLE:
         error_msg = "Twilio SDK not installed or client not configured. Cannot send real SMS."
-        print(f"ERROR: {error_msg}")
+        logger.error(error_msg)
         raise RuntimeError(error_msg)
         
     messaging_service_sid = os.getenv('TWILIO_MESSAGING_SERVICE_SID')
@@ -62,9 +67,9 @@ def send_sms(to_number: str, message: str):
 
     try:
         twilio_message = client.messages.create(**create_args)
-        print(f"Successfully sent SMS via Twilio using {sender_info}. SID: {twilio_message.sid}")
+        logger.info("Sent SMS via Twilio using %s", sender_info, extra={"sid": twilio_message.sid})
         return {"sid": twilio_message.sid}
     except Exception as e:
-        print(f"ERROR: Failed to send SMS via Twilio: {e}")
+        logger.error("Failed to send SMS via Twilio: %s", e)
         # Propagate the error to be handled by the API route
         raise e
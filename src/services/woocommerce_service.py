@@ -1,5 +1,9 @@
 import os
+import logging
 from woocommerce import API
+from src.services.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 class WooCommerceService:
     def __init__(self):
@@ -11,18 +15,20 @@ class WooCommerceService:
             verify_ssl=False
         )
 
+    @traced("woocommerce.update_order_status")
     def update_order_status(self, order_id: int, status: str):
         data = {
             "status": status
         }
         try:
             response = self.wcapi.put(f"orders/{order_id}", data).json()
-            print(f"WooCommerce order {order_id} updated to status: {status}")
+            logger.info("WooCommerce order status updated", extra={"woocommerce_order_id": order_id, "status": status})
             return response
         except Exception as e:
-            print(f"Error updating WooCommerce order {order_id}: {e}")
+            logger.error("Error updating WooCommerce order status: %s", e, extra={"woocommerce_order_id": order_id})
             return None
 
+    @traced("woocommerce.update_order_details")
     def update_order_details(self, order_id: int, items: list, total_amount: float):
         # Construct line_items payload for WooCommerce API
         wc_line_items = []
@@ -42,8 +48,20 @@ class WooCommerceService:
         }
         try:
             response = self.wcapi.put(f"orders/{order_id}", data).json()
-            print(f"WooCommerce order {order_id} details updated.")
+            logger.info("WooCommerce order details updated", extra={"woocommerce_order_id": order_id})
             return response
         except Exception as e:
-            print(f"Error updating WooCommerce order {order_id} details: {e}")
+            logger.error("Error updating WooCommerce order details: %s", e, extra={"woocommerce_order_id": order_id})
             return None
+
+    @traced("woocommerce.list_products")
+    def list_products(self, page: int = 1, per_page: int = 100, modified_after: str = None, status: str = "publish"):
+        """One page of products with `status` ("publish", "any", "trash"...), oldest modification first.
+        Returns (products, total_pages)."""
+        params = {"page": page, "per_page": per_page, "status": status, "orderby": "modified", "order": "asc"}
+        if modified_after:
+            params["modified_after"] = modified_after
+            params["dates_are_gmt"] = "true"
+        response = self.wcapi.get("products", params=params)
+        response.raise_for_status()
+        return response.json(), int(response.headers.get("X-WP-TotalPages", 1))
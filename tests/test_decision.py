@@ -0,0 +1,44 @@
+import pytest
+from src.agent.agent import OrderConfirmationAgent
+from src.agent.decision import decode_decision, decoder_stats, FALLBACK_MESSAGE
+
+
+def normalize(raw):
+    decision = decode_decision(raw)
+    return OrderConfirmationAgent._normalize_modification(None, decision.modification_dict(), decision.action)
+
+
+def test_structured_reply_decodes_in_one_pass():
+    decoded = decoder_stats.decoded
+    decision = decode_decision('{"message": "Je retire la table.", "action": "remove", '
+                               '"modification": {"old_item": "Table", "quantity": 2}}')
+    assert decoder_stats.decoded == decoded + 1
+    assert decision.message == "Je retire la table." and decision.action == "remove"
+    assert decision.modification_dict() == {"old_item": "Table", "quantity": 2}
+
+def test_broken_reply_goes_through_the_repair_chain():
+    fallbacks = decoder_stats.fallbacks
+    decision = decode_decision("```json\n{'message': 'Très bien', 'action': 'add', 'modification': {'item': 'Chaise', 'quantity': 1},}\n```")
+    assert decoder_stats.fallbacks == fallbacks + 1
+    assert decision.action == "add" and decision.modification_dict() == {"item": "Chaise", "quantity": 1}
+    garbage = decode_decision('pas de JSON ici "action": "confirm"')
+    assert garbage.action == "confirm" and garbage.message == FALLBACK_MESSAGE and garbage.modification is None
+
+@pytest.mark.parametrize("modification, action, expected", [
+    ('{"old_item": "Table", "old_quantity": 2}', "remove", ("remove", "Table", 2, None)),
+    ('{"quantity": {"Table": 2}}', "modify", ("add", None, 1, "Table")),
+    ('{"quantity": {"Table": -1}}', "modify", ("remove", "Table", 1, None)),
+    ('{"oldItem": {"articleName": "Table", "quantity": 1}, "newItem": {"articleName": "Chaise", "quantity": 3}}', "replace",
+     ("replace", "Table", 1, "Chaise")),
+    ('{"old": {"article_name": "Table"}, "new": {"article_name": "Chaise"}}', "replace", ("replace", "Table", 1, "Chaise")),
+    ('{"product": "Table", "new_product": "Chaise", "quantity": 2}', "replace", ("replace", "Table", 2, "Chaise")),
+    ('{"item_id_to_remove": "Table"}', "remove", ("remove", "Table", 1, None)),
+])
+def test_legacy_modification_shapes_survive_decoding(modification, action, expected):
+    norm = normalize(f'{{"message": "ok", "action": "{action}", "modification": {modification}}}')
+    assert (norm["action"], norm["old_item"], norm["old_qty"], norm["new_item"]) == expected
+
+def test_legacy_shapes_survive_the_repair_chain():
+    norm = normalize("{'message': 'ok', 'action': 'replace', 'modification': "
+                     "{'oldItem': {'articleName': 'Table'}, 'newItem': {'articleName': 'Chaise', 'quantity': 2}},}")
+    assert (norm["action"], norm["old_item"], norm["new_item"], norm["new_qty"]) == ("replace", "Table", "Chaise", 2)
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import pytest
+from src.agent.prompt_builder import build_prompt
+from src.services.fake_llm import FakeLLMBackend, LatencyModel
+from src.services.llm_errors import LLMQuotaError, LLMTransientError
+
+ORDER_CONTEXT = "Articles:\n- Table x1 (120.0€ chacun)\n- Chaise x4 (45.0€ chacun)\nTotal: 300.0€"
+
+
+def decide(user_input, language="fr"):
+    return FakeLLMBackend(latency="fixed:0", seed=1).decide(build_prompt(language, ORDER_CONTEXT, [], user_input))
+
+
+# --- 1. Each scripted intent, read from a real agent prompt ---
+@pytest.mark.parametrize("user_input, action, modification", [
+    ("Remplacer la table par un bureau", "replace", {"old_item": "Table", "new_item": "Bureau"}),
+    ("retirer 2 chaises", "remove", {"item": "Chaise", "quantity": 2, "old_item": "Chaise"}),
+    ("retirer la table", "remove", {"item": "Table", "quantity": 1}),
+    ("ajouter 3 chaises", "add", {"item": "Chaise", "quantity": 3}),
+    ("ajouter une lampe", "add", {"item": "Lampe", "quantity": 1}),
+    ("changer les chaises à 2", "modify", {"item": "Chaise", "quantity": 2}),
+    ("annuler", "cancel", None),
+    ("oui c'est correct", "confirm", None),
+    ("merci", "none", None),
+    ("quelle est la date de livraison ?", "none", None),
+])
+def test_scripted_intents(user_input, action, modification):
+    decision = decide(user_input)
+    assert decision["action"] == action
+    if modification is None:
+        assert decision["modification"] is None
+    else:
+        assert modification.items() <= decision["modification"].items()
+
+def test_replies_follow_the_prompt_language():
+    assert decide("yes", language="en")["message"] == "Great, your order is confirmed!"
+    assert decide("oui")["message"] == "Parfait, votre commande est confirmée !"
+    reply = asyncio.run(FakeLLMBackend(latency="fixed:0").generate(build_prompt("en", ORDER_CONTEXT, [], "cancel")))
+    assert json.loads(reply)["action"] == "cancel"
+
+# --- 2. Latency specs ---
+def test_latency_spec_parsing():
+    assert LatencyModel("fixed:250").sample() == 0.25
+    assert 0.01 <= LatencyModel("uniform:10:20").sample() <= 0.02
+    assert LatencyModel("normal:-50:1").sample() == 0.0  # Negative draws are clamped
+    assert LatencyModel("lognormal:400:0").sample() == pytest.approx(0.4)
+    for spec in ("gamma:1:2", "uniform:10", "fixed:fast", "normal:1:2:3"):
+        with pytest.raises(ValueError):
+            LatencyModel(spec)
+
+# --- 3. Injected errors, configured from the environment ---
+def test_from_env_error_rates(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_LATENCY", "fixed:0")
+    monkeypatch.setenv("FAKE_LLM_ERROR_RATE", "1")
+    monkeypatch.setenv("FAKE_LLM_QUOTA_RATE", "0")
+    backend = FakeLLMBackend.from_env()
+    with pytest.raises(LLMTransientError):
+        asyncio.run(backend.generate("prompt"))
+
+    monkeypatch.setenv("FAKE_LLM_ERROR_RATE", "0")
+    monkeypatch.setenv("FAKE_LLM_QUOTA_RATE", "1")
+    with pytest.raises(LLMQuotaError):
+        asyncio.run(FakeLLMBackend.from_env().generate("prompt"))
+
+    monkeypatch.setenv("FAKE_LLM_QUOTA_RATE", "0")
+    monkeypatch.setenv("FAKE_LLM_SEED", "7")
+    assert json.loads(asyncio.run(FakeLLMBackend.from_env().generate("prompt")))["action"] == "none"
+
+    for error_rate, quota_rate in (("1.5", "0"), ("-0.1", "0"), ("0.6", "0.6")):
+        monkeypatch.setenv("FAKE_LLM_ERROR_RATE", error_rate)
+        monkeypatch.setenv("FAKE_LLM_QUOTA_RATE", quota_rate)
+        with pytest.raises(ValueError):
+            FakeLLMBackend.from_env()
+
+def test_error_rate_is_a_share_of_calls():
+    backend = FakeLLMBackend(latency="fixed:0", error_rate=0.3, seed=3)
+
+    async def run():
+        failures = 0
+        for _ in range(1000):
+            try:
+                await backend.generate("prompt")
+            except LLMTransientError:
+                failures += 1
+        return failures
+
+    assert 250 <= asyncio.run(run()) <= 350
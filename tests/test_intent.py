@@ -0,0 +1,115 @@
+import os
+import asyncio
+import pytest
+from datetime import datetime
+
+os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")  # The agent builds a WooCommerce client, never called here
+
+from src.agent.agent import OrderConfirmationAgent  # noqa: E402
+from src.agent.intent import FastPathStats, classify_intent, is_confirmation_question  # noqa: E402
+from src.agent.database.models import Base, OrderModel  # noqa: E402
+from src.agent.database.sqlite import SQLiteDatabase  # noqa: E402
+from src.agent.replay import ReplayLLMBackend, _OfflineWooCommerce  # noqa: E402
+from src.services.ai_service import use_llm_backend  # noqa: E402
+from src.services.llm_cache import get_llm_cache  # noqa: E402
+
+
+def make_agent(tmp_path, llm_error=None):
+    path = tmp_path / "intent.db"
+    db = SQLiteDatabase(db_url=f"sqlite+aiosqlite:///{path}", sync_db_url=f"sqlite:///{path}")
+    Base.metadata.create_all(db.sync_engine)
+    with db.get_session() as session:
+        session.add(OrderModel(id="o1", customer_name="Jean", customer_phone="+33612345678",
+                               items='[{"name": "Table", "quantity": 1, "price": 120.0}]',
+                               total_amount=120.0, status="pending", created_at=datetime(2025, 1, 1)))
+        session.commit()
+    backend = ReplayLLMBackend()
+    backend.load({"llm_error": llm_error})
+    use_llm_backend(backend, rate_per_minute=0, max_retries=0)
+    get_llm_cache().enabled = False
+    agent = OrderConfirmationAgent(db)
+    agent.woocommerce_service = _OfflineWooCommerce()
+    return agent, db, backend
+
+
+def ask_after(tmp_path, assistant_message, user_input, status="pending"):
+    """Send `user_input` after `assistant_message`, with the LLM down; returns the order status and LLM calls."""
+    agent, db, backend = make_agent(tmp_path, llm_error="unavailable")
+
+    async def run():
+        if status != "pending":
+            await db.update_order("o1", {"status": status})
+        await db.update_conversation("o1", {"order_id": "o1", "current_step": "confirming_items", "messages": [
+            {"role": "user", "content": "Bonjour"}, {"role": "assistant", "content": assistant_message}]})
+        await agent.process_message("o1", user_input)
+        return (await db.get_order("o1"))["status"]
+
+    return asyncio.run(run()), backend.calls
+
+
+# --- 1. Clear intents in French and English, with punctuation and case ---
+@pytest.mark.parametrize("text, intent", [
+    ("oui", "confirm"), ("Oui !", "confirm"), ("C'est bon.", "confirm"), ("oui, c’est correct", "confirm"),
+    ("Je confirme", "confirm"), ("OK", "confirm"), ("oui merci", "confirm"),
+    ("yes", "confirm"), ("Yes, that's correct.", "confirm"), ("Perfect!", "confirm"), ("all good", "confirm"),
+    ("Annuler ma commande", "cancel"), ("Je veux annuler.", "cancel"), ("annulez", "cancel"),
+    ("cancel", "cancel"), ("Please cancel my order", "cancel"), ("I want to cancel", "cancel"),
+    ("Merci !", "thanks"), ("merci beaucoup", "thanks"), ("Thank you", "thanks"), ("thanks a lot", "thanks"),
+])
+def test_clear_intents(text, intent):
+    assert classify_intent(text, awaiting_confirmation=True) == intent
+
+# --- 2. Negations, ambiguity and extra content are left to the LLM ---
+@pytest.mark.parametrize("text", [
+    "non", "no", "non merci, c'est bon", "oui mais…", "oui mais sans la table", "ce n'est pas correct",
+    "pas correct", "not correct", "yes but remove the chair", "don't cancel", "n'annulez pas",
+    "annuler la table", "cancel the chair", "ok pour 2 chaises", "merci mais j'ai une question", "", "  !? ",
+])
+def test_negations_and_ambiguous_messages_are_not_classified(text):
+    assert classify_intent(text, awaiting_confirmation=True) is None
+
+# --- 3. Confirm and cancel only count as answers to a confirmation question ---
+def test_confirm_and_cancel_need_a_confirmation_question():
+    assert classify_intent("oui", awaiting_confirmation=False) is None
+    assert classify_intent("cancel my order", awaiting_confirmation=False) is None
+    assert classify_intent("merci", awaiting_confirmation=False) == "thanks"
+    assert is_confirmation_question("Votre commande contient une table. Est-ce correct ?")
+    assert is_confirmation_question("Your order now contains: Table x1. Is your order now correct?")
+    assert not is_confirmation_question("Bonjour, que puis-je faire pour vous ?")
+    assert not is_confirmation_question(None)
+
+@pytest.mark.parametrize("user_input, status", [("oui", "confirmed"), ("yes", "confirmed"), ("annuler ma commande", "cancelled")])
+def test_fast_path_side_effects_after_a_confirmation_question(tmp_path, user_input, status):
+    assert ask_after(tmp_path, "Votre commande contient une table. Est-ce correct ?", user_input) == (status, 0)
+
+@pytest.mark.parametrize("user_input", ["oui", "annuler ma commande"])
+def test_no_side_effects_without_a_confirmation_question(tmp_path, user_input):
+    # Not a fast-path turn: the (failing) LLM is asked and the order is left as it was
+    assert ask_after(tmp_path, "Bonjour, que puis-je faire pour vous ?", user_input) == ("pending", 1)
+
+# --- 4. The overload fallback is saved, and a bare "yes" then confirms without the LLM ---
+def test_yes_after_the_overload_reply_confirms(tmp_path):
+    agent, db, backend = make_agent(tmp_path, llm_error="circuit_open")
+
+    async def run():
+        first = await agent.process_message("o1", "Je voudrais changer la couleur de la table")
+        second = await agent.process_message("o1", "oui")
+        return first, second, await db.get_order("o1"), await db.get_conversation("o1")
+
+    first, second, order, conversation = asyncio.run(run())
+    assert "surchargé" in first
+    assert backend.calls == 1  # "oui" took the fast path
+    assert order["status"] == "confirmed"
+    assert [m["role"] for m in conversation["messages"]] == ["user", "assistant", "user", "assistant"]
+
+# --- 5. Only turns the fast path answered count as bypassed ---
+def test_bypass_ratio_counts_answered_turns_only(tmp_path, monkeypatch):
+    stats = FastPathStats()
+    monkeypatch.setattr("src.agent.agent.fast_path_stats", stats)
+    assert ask_after(tmp_path, "Votre commande contient une table. Est-ce correct ?", "oui") == ("confirmed", 0)
+    assert (stats.turns, stats.bypassed, stats.by_intent) == (1, 1, {"confirm": 1})
+    # Classified as a confirmation, but the order is no longer pending: the LLM is asked
+    shipped = tmp_path / "shipped"
+    shipped.mkdir()
+    assert ask_after(shipped, "Votre commande contient une table. Est-ce correct ?", "oui", status="shipped") == ("shipped", 1)
+    assert (stats.turns, stats.bypassed) == (2, 1) and stats.bypass_ratio == 0.5
@@ -0,0 +1,18 @@
+from src.agent.keywords import match_keywords
+
+
+def test_keywords_match_whole_words_only():
+    assert "confirm" not in match_keywords("I want to book a table")
+    assert "confirm" not in match_keywords("C'est incorrect")
+    assert "deny" in match_keywords("C'est incorrect")
+    assert "positive" not in match_keywords("Je suis mécontent")
+
+def test_one_pass_reports_every_group():
+    hits = match_keywords("Oui d’accord, merci !")
+    assert hits.count("confirm") == 2
+    assert hits.count("lang_fr") == 3
+    assert "positive" in hits
+    assert hits.words == {"oui", "d'accord", "merci"}
+
+def test_elided_words_are_found():
+    assert "modify" in match_keywords("Pouvez-vous l'ajouter ?")
@@ -0,0 +1,30 @@
+from src.services.language_service import LanguageDetector
+
+
+def test_short_confirmations_use_the_fast_path():
+    detector = LanguageDetector()
+    assert detector.detect("oui") == "fr"
+    assert detector.detect("Yes please") == "en"
+    assert detector.detect("Merci beaucoup !") == "fr"
+    assert detector.stats()["fast_path"] == 3
+    assert detector.stats()["detector_calls"] == 0
+
+def test_undecidable_messages_keep_the_conversation_language():
+    detector = LanguageDetector()
+    assert detector.detect("2", fallback="en") == "en"
+    assert detector.detect("2", fallback="fr") == "fr"
+
+def test_words_shared_by_both_languages_cast_no_vote():
+    detector = LanguageDetector()
+    assert detector.detect("ok", fallback="fr") == "fr"
+    assert detector.detect("ok", fallback="en") == "en"
+    assert detector.detect("Okay, correct !", fallback="fr") == "fr"
+    assert detector.stats()["detector_calls"] == 0
+    assert detector.detect("ok thanks", fallback="fr") == "en"
+    assert detector.detect("ok merci", fallback="en") == "fr"
+
+def test_results_are_memoized():
+    detector = LanguageDetector()
+    detector.detect("Je voudrais remplacer la lasagne")
+    detector.detect("je voudrais  remplacer la lasagne")
+    assert detector.stats()["cache_hits"] == 1
@@ -0,0 +1,86 @@
+import os
+import asyncio
+from datetime import datetime
+
+os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")  # The agent builds a WooCommerce client, never called here
+
+from src.agent.agent import OrderConfirmationAgent  # noqa: E402
+from src.agent.database.models import Base, OrderModel  # noqa: E402
+from src.agent.database.sqlite import SQLiteDatabase  # noqa: E402
+from src.agent.replay import ReplayLLMBackend, _OfflineWooCommerce  # noqa: E402
+from src.services import llm_cache  # noqa: E402
+from src.services.ai_service import use_llm_backend  # noqa: E402
+from src.services.llm_cache import CUSTOMER_PLACEHOLDER, LLMResponseCache, make_cache_key  # noqa: E402
+
+ITEMS = [{"name": "Table", "quantity": 1, "price": 120.0}]
+VALID_REPLY = '{"message": "Merci Jean, je note.", "action": "none", "modification": null}'
+
+
+# --- 1. Entries expire after the TTL ---
+def test_entries_expire():
+    cache = LLMResponseCache(ttl=-1, db_path=None, enabled=True)
+    asyncio.run(cache.set("k", "v"))
+    assert asyncio.run(cache.get("k")) is None
+    assert cache.stats()["entries"] == 0 and cache.misses == 1
+
+# --- 2. The least recently used entry is evicted first ---
+def test_lru_eviction():
+    cache = LLMResponseCache(ttl=60, max_entries=2, db_path=None, enabled=True)
+
+    async def run():
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        await cache.get("a")  # "b" becomes the oldest
+        await cache.set("c", "3")
+        return [await cache.get(k) for k in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == ["1", None, "3"]
+    assert cache.evictions == 1
+
+# --- 3. The SQLite tier survives a restart, with the customer name masked on disk ---
+def test_sqlite_tier_round_trip(tmp_path):
+    path = str(tmp_path / "cache.db")
+    asyncio.run(LLMResponseCache(ttl=60, db_path=path, enabled=True).set("k", "Bonjour Jean", customer_name="Jean"))
+    restarted = LLMResponseCache(ttl=60, db_path=path, enabled=True)
+    assert asyncio.run(restarted.get("k", customer_name="Marie")) == "Bonjour Marie"
+    assert restarted.persistent_hits == 1
+    assert restarted._db_get("k")[0] == f"Bonjour {CUSTOMER_PLACEHOLDER}"
+
+# --- 4. Turns that only differ by the customer's name share a key ---
+def test_cache_key_masks_the_customer_name():
+    def key(name, history_name=None):
+        history = [{"role": "assistant", "content": f"Bonjour {history_name or name}, votre commande est-elle correcte ?"}]
+        return make_cache_key(ITEMS, "pending", history, "oui", "fr", customer_name=name)
+
+    assert key("Jean") == key("Marie")
+    assert key("Jean") != key("Jean", history_name="Paul")
+    assert make_cache_key(ITEMS, "pending", [], "oui", "fr") != make_cache_key(ITEMS, "pending", [], "oui", "en")
+
+# --- 5. Only replies that decode as they are get cached ---
+def test_repaired_replies_are_not_cached(tmp_path):
+    path = tmp_path / "orders.db"
+    db = SQLiteDatabase(db_url=f"sqlite+aiosqlite:///{path}", sync_db_url=f"sqlite:///{path}")
+    Base.metadata.create_all(db.sync_engine)
+    with db.get_session() as session:
+        session.add(OrderModel(id="o1", customer_name="Jean", customer_phone="", items='[{"name": "Table", "quantity": 1, "price": 120.0}]',
+                               total_amount=120.0, status="pending", created_at=datetime(2025, 1, 1)))
+        session.commit()
+    backend = ReplayLLMBackend()
+    use_llm_backend(backend, rate_per_minute=0, max_retries=0)
+    cache = llm_cache._cache = LLMResponseCache(ttl=60, db_path=None, enabled=True)
+    agent = OrderConfirmationAgent(db)
+    agent.woocommerce_service = _OfflineWooCommerce()
+
+    async def ask(llm):
+        backend.load({"llm": llm})
+        await db.delete_conversation("o1")
+        return await agent.process_message("o1", "La livraison est prévue quand ?")
+
+    try:
+        asyncio.run(ask("Désolé, voici: {'message': 'Jeudi', 'action': 'none',}"))
+        assert cache.stats()["entries"] == 0
+        asyncio.run(ask(VALID_REPLY))
+        asyncio.run(ask(VALID_REPLY))
+        assert backend.calls == 2  # The valid reply was served from the cache the second time
+    finally:
+        llm_cache._cache = None
@@ -0,0 +1,157 @@
+import time
+import asyncio
+from src.services.llm_gateway import LLMGateway, TokenBucket, CircuitBreaker
+from src.services.llm_errors import LLMServiceError, LLMTransientError
+
+
+class CountingBackend:
+    """Fake provider that counts calls and answers after a short delay."""
+
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self, prompt, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f'{{"message": "reply to {prompt}", "action": "none", "modification": null}}'
+
+
+def run_turns(gateway, prompts):
+    async def _run():
+        return await asyncio.gather(*(gateway.call(p, max_tokens=256) for p in prompts), return_exceptions=True)
+    return asyncio.run(_run())
+
+
+# --- 1. Identical concurrent turns share one provider call ---
+def test_identical_concurrent_calls_are_coalesced():
+    backend = CountingBackend()
+    gateway = LLMGateway(backend, rate_per_minute=None)
+    n = 20
+    results = run_turns(gateway, ["Le client a dit : \"Oui\""] * n)
+    assert backend.calls == 1
+    assert gateway.deduplicated == n - 1
+    assert len(set(results)) == 1
+    assert gateway.stats()["deduplicated"] == n - 1
+
+# --- 2. Different prompts are not coalesced ---
+def test_distinct_calls_are_not_coalesced():
+    backend = CountingBackend()
+    gateway = LLMGateway(backend, rate_per_minute=None)
+    results = run_turns(gateway, [f"prompt {i}" for i in range(5)])
+    assert backend.calls == 5
+    assert gateway.deduplicated == 0
+    assert len(set(results)) == 5
+
+# --- 3. Sequential identical calls each reach the provider ---
+def test_sequential_identical_calls_are_not_coalesced():
+    backend = CountingBackend(delay=0)
+    gateway = LLMGateway(backend, rate_per_minute=None)
+    run_turns(gateway, ["same"])
+    run_turns(gateway, ["same"])
+    assert backend.calls == 2
+
+# --- 4. A shared failure reaches every waiting caller ---
+def test_coalesced_calls_share_errors():
+    backend = CountingBackend(error=LLMServiceError("boom"))
+    gateway = LLMGateway(backend, rate_per_minute=None)
+    results = run_turns(gateway, ["same"] * 5)
+    assert backend.calls == 1
+    assert all(isinstance(r, LLMServiceError) for r in results)
+
+# --- 5. The token bucket allows a burst, then paces calls at the rate ---
+def test_token_bucket_refills_and_waits():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)  # 10 tokens per second
+
+    async def acquire(n):
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(acquire(2)) < 0.05  # The burst
+    assert 0.08 < asyncio.run(acquire(1)) < 0.3  # Waits for one token to refill
+    bucket.updated -= 10
+    bucket._refill()
+    assert bucket.tokens == 2  # Refill stops at capacity
+
+# --- 6. Closed -> open -> half-open -> closed ---
+def test_breaker_cycle():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # A single probe at a time
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN  # A failed probe reopens at once
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+# --- 7. Configuration errors do not trip the breaker ---
+def test_non_transient_errors_do_not_trip_the_breaker():
+    gateway = LLMGateway(CountingBackend(delay=0, error=LLMServiceError("GOOGLE_API_KEY not set")), rate_per_minute=None,
+                         breaker=CircuitBreaker(failure_threshold=1))
+    run_turns(gateway, ["a"])
+    run_turns(gateway, ["b"])
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+    gateway.backend = CountingBackend(delay=0, error=LLMTransientError("503"))
+    gateway.max_retries = 0
+    run_turns(gateway, ["c"])
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+# --- 8. A cancelled half-open probe lets the next call probe ---
+def test_cancelled_probe_frees_the_half_open_breaker():
+    async def slow_stream(prompt, **kwargs):
+        await asyncio.sleep(10)
+        yield "never"
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.trip()
+    gateway = LLMGateway(CountingBackend(delay=0), rate_per_minute=None, breaker=breaker, stream_backend=slow_stream)
+
+    async def consume():
+        async for _ in gateway.stream("probe"):
+            pass
+
+    async def run():
+        probe = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        return await gateway.call("next")
+
+    assert "reply to next" in asyncio.run(run())
+    assert breaker.state == CircuitBreaker.CLOSED
+
+# --- 9. A stream that stalls between chunks fails once its timeout passes ---
+def test_stalled_stream_times_out_per_chunk():
+    async def stalling_stream(prompt, **kwargs):
+        yield '{"message": "Je ret'
+        await asyncio.sleep(10)
+        yield 'ire"}'
+
+    gateway = LLMGateway(CountingBackend(delay=0), rate_per_minute=None, breaker=CircuitBreaker(failure_threshold=1),
+                         stream_backend=stalling_stream)
+
+    async def consume():
+        chunks = []
+        try:
+            async for chunk in gateway.stream("prompt", timeout=0.05):
+                chunks.append(chunk)
+        except LLMTransientError as e:
+            return chunks, e
+
+    start = time.perf_counter()
+    chunks, error = asyncio.run(consume())
+    assert chunks == ['{"message": "Je ret'] and "stalled" in str(error)
+    assert time.perf_counter() - start < 1
+    assert gateway.breaker.state == CircuitBreaker.OPEN and gateway.in_flight == 0
@@ -0,0 +1,63 @@
+import json
+import asyncio
+from src.services.fake_llm import FakeLLMBackend
+from src.services.llm_router import HedgedRouter
+
+PROMPT = 'Detected language for this message: en.\n\nThe client said: "yes"\n'
+
+
+def generate(router, prompt=PROMPT):
+    return asyncio.run(router.generate(prompt, max_tokens=256))
+
+
+# --- 1. A slow primary is hedged and the faster hedge reply wins ---
+def test_slow_primary_is_hedged():
+    primary = FakeLLMBackend(latency="fixed:500", seed=1)
+    hedge = FakeLLMBackend(latency="fixed:10", seed=2)
+    router = HedgedRouter(primary, hedge, delay_ms=50)
+    reply = generate(router)
+    assert json.loads(reply)["action"] == "confirm"
+    assert router.hedged == 1
+    assert router.wins == {"primary": 0, "hedge": 1}
+    assert router.cancelled == 1  # The slow primary request was cancelled
+
+# --- 2. A fast primary never triggers the hedge request ---
+def test_fast_primary_is_not_hedged():
+    primary = FakeLLMBackend(latency="fixed:5", seed=1)
+    hedge = FakeLLMBackend(latency="fixed:5", seed=2)
+    router = HedgedRouter(primary, hedge, delay_ms=200)
+    generate(router)
+    assert router.hedged == 0
+    assert hedge.calls == 0
+    assert router.wins["primary"] == 1
+
+# --- 3. A failing primary falls over to the hedge immediately ---
+def test_failed_primary_falls_over_to_hedge():
+    primary = FakeLLMBackend(latency="fixed:1", error_rate=1.0, seed=1)
+    hedge = FakeLLMBackend(latency="fixed:1", seed=2)
+    router = HedgedRouter(primary, hedge, delay_ms=1000)
+    reply = generate(router)
+    assert json.loads(reply)["action"] == "confirm"
+    assert router.wins["hedge"] == 1
+
+# --- 4. The adaptive delay follows the primary latency percentile ---
+def test_adaptive_delay_uses_latency_percentile():
+    router = HedgedRouter(FakeLLMBackend(), FakeLLMBackend(), delay_ms=0, percentile=0.9, min_samples=10)
+    assert router.hedge_delay() == router.default_delay_ms / 1000.0
+    router.latencies.extend(i / 100 for i in range(1, 101))
+    assert abs(router.hedge_delay() - 0.9) < 0.02
+
+# --- 5. Cancelled primaries keep the slow tail in the sample, so the delay does not drift down ---
+def test_adaptive_delay_stays_stable_under_hedging():
+    primary = FakeLLMBackend(latency="uniform:10:30", seed=1)
+    router = HedgedRouter(primary, FakeLLMBackend(latency="fixed:1", seed=2), delay_ms=0, percentile=0.5,
+                          default_delay_ms=20, min_samples=10)
+
+    async def run():
+        for _ in range(60):
+            await router.generate(PROMPT, max_tokens=256)
+
+    asyncio.run(run())
+    assert len(router.latencies) == 60  # Every primary, finished or cancelled
+    assert router.hedge_delay() >= 0.0185  # Median of 10-30 ms; dropping the cancelled ones drifts towards 10 ms
+    assert router.hedged <= 36  # About half the calls, as the median delay intends
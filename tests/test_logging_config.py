@@ -0,0 +1,70 @@
+import json
+import queue
+import logging
+import logging.handlers
+from src.services.logging_config import JsonFormatter, DebugSampler, NonBlockingQueueHandler, redact
+
+
+def make_record(msg, *args, level=logging.INFO, lineno=10, **extra):
+    record = logging.LogRecord("src.agent.agent", level, "agent.py", lineno, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_lines_carry_fields_and_redact_pii():
+    line = JsonFormatter().format(make_record("SMS to %s failed", "+33 6 12 34 56 78", order_id="o1",
+                                              customer_phone="+33612345678", items=3))
+    entry = json.loads(line)
+    assert entry["level"] == "INFO" and entry["logger"] == "src.agent.agent"
+    assert entry["msg"] == "SMS to [phone] failed"
+    assert entry["order_id"] == "o1" and entry["items"] == 3
+    assert entry["customer_phone"] == "[redacted]"
+
+def test_redaction_keeps_ip_addresses_and_dates():
+    assert redact("store 127.0.0.1:9 down since 2026-10-18") == "store 127.0.0.1:9 down since 2026-10-18"
+    assert redact("call 06.12.34.56.78 or 06-12-34-56-78") == "call [phone] or [phone]"
+    assert redact("Merci pour votre commande.+33612345678") == "Merci pour votre commande.[phone]"
+    assert redact("ids 10.0.0.1 and 192.168.100.23") == "ids 10.0.0.1 and 192.168.100.23"
+
+def test_debug_records_are_sampled_per_call_site():
+    sampler = DebugSampler(every=10)
+    kept = sum(sampler.filter(make_record("LLM reply", level=logging.DEBUG)) for _ in range(100))
+    assert kept == 10 and sampler.dropped == 90
+    assert sampler.filter(make_record("LLM reply", level=logging.DEBUG, lineno=11))  # Another call site
+    assert all(sampler.filter(make_record("Turn failed", level=logging.WARNING)) for _ in range(5))
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    for i in range(5):
+        handler.handle(make_record("event %d", i))
+    assert handler.queue.qsize() == 2 and handler.dropped == 3
+    assert handler.queue.get_nowait().getMessage() == "event 0"  # Formatted lazily, by the listener
+
+def test_messenger_webhook_logs_ids_and_counts_only(monkeypatch):
+    import os
+    os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")
+    from starlette.testclient import TestClient
+    from src.main import app
+    from src.services.facebook_service import FacebookService
+
+    sent = []
+
+    async def send_message(self, recipient_id, message_text):
+        sent.append(recipient_id)
+
+    monkeypatch.setenv("FACEBOOK_PAGE_ACCESS_TOKEN", "test-token")
+    monkeypatch.setattr(FacebookService, "send_message", send_message)
+    payload = {"object": "page", "entry": [{"id": "page-1", "messaging": [
+        {"sender": {"id": "42"}, "message": {"text": "Je suis Jean Dupont, 12 rue de la Paix"}}]}]}
+    handler = logging.handlers.BufferingHandler(capacity=100)
+    handler.setLevel(logging.INFO)
+    logging.getLogger("src").addHandler(handler)
+    try:
+        assert TestClient(app).post("/api/v1/facebook/webhook", json=payload).status_code == 200
+    finally:
+        logging.getLogger("src").removeHandler(handler)
+    assert sent == ["42"]
+    records = handler.buffer
+    assert records
+    assert not any("Jean" in r.getMessage() or "Jean" in str(vars(r)) for r in records)
+    assert any(getattr(r, "sender_id", None) == "42" and r.chars == 38 for r in records)
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from src.services.metrics import MetricsRegistry, observe_async
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("turn_seconds", "Turn latency.", ("outcome",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.labels("confirm").observe(value)
+    text = registry.render()
+    assert "# TYPE turn_seconds histogram" in text
+    assert 'turn_seconds_bucket{outcome="confirm",le="0.1"} 1' in text
+    assert 'turn_seconds_bucket{outcome="confirm",le="1"} 3' in text
+    assert 'turn_seconds_bucket{outcome="confirm",le="+Inf"} 4' in text
+    assert 'turn_seconds_count{outcome="confirm"} 4' in text
+    assert 'turn_seconds_sum{outcome="confirm"} 4.25' in text
+
+def test_labels_are_checked_and_escaped():
+    registry = MetricsRegistry()
+    tokens = registry.counter("tokens_total", "Tokens.", ("model", "kind"))
+    tokens.labels('gemini "flash"', "prompt").inc(120)
+    assert 'tokens_total{model="gemini \\"flash\\"",kind="prompt"} 120' in registry.render()
+    with pytest.raises(ValueError):
+        tokens.labels("gemini")
+
+def test_collectors_refresh_gauges_at_scrape_time():
+    registry = MetricsRegistry()
+    depth = registry.gauge("queue_depth", "Depth.", ("queue",))
+    pending = [1, 2, 3]
+    registry.add_collector(lambda: depth.labels("summaries").set(len(pending)))
+    registry.add_collector(lambda: 1 / 0)  # Ignored
+    assert 'queue_depth{queue="summaries"} 3' in registry.render()
+    pending.clear()
+    assert 'queue_depth{queue="summaries"} 0' in registry.render()
+
+def test_observe_async_times_failures_too():
+    registry = MetricsRegistry()
+    db_seconds = registry.histogram("db_seconds", "DB latency.", ("method",))
+
+    @observe_async(db_seconds, "get_order")
+    async def get_order(fail):
+        if fail:
+            raise RuntimeError("locked")
+        return {"id": "o1"}
+
+    assert asyncio.run(get_order(False)) == {"id": "o1"}
+    with pytest.raises(RuntimeError):
+        asyncio.run(get_order(True))
+    assert 'db_seconds_count{method="get_order"} 2' in registry.render()
+
+def test_cache_lookups_are_exported_as_counters():
+    from src.services.metrics import record_cache, registry as app_registry
+    record_cache("test_cache", 3, 1)
+    text = app_registry.render()
+    assert "# TYPE cache_requests_total counter" in text
+    assert 'cache_requests_total{cache="test_cache",result="hit"} 3' in text
+    assert 'cache_requests_total{cache="test_cache",result="miss"} 1' in text
+    assert 'cache_hit_ratio{cache="test_cache"} 0.75' in text
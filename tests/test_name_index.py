@@ -0,0 +1,46 @@
+import pytest
+from src.agent.name_index import AmbiguousNameError, NameIndex, normalize_name
+
+
+def test_normalize_folds_accents_articles_and_plurals():
+    assert normalize_name("Les Crêpes") == "crepe"
+    assert normalize_name("la table") == "table"
+    assert normalize_name("the Chairs") == "chair"
+
+# --- 1. Order items resolve from plurals, articles and missing accents ---
+def test_order_item_resolution():
+    index = NameIndex(["Table", "Chaise", "Crème brûlée", "Pizza Margherita"])
+    assert index.best("la table").name == "Table"
+    assert index.best("chaises").name == "Chaise"
+    assert index.best("creme brulee").name == "Crème brûlée"
+    assert index.best("pizzas margherita").name == "Pizza Margherita"
+
+# --- 2. Misspellings match with a score below 1, unrelated names do not match ---
+def test_fuzzy_match_and_rejection():
+    index = NameIndex(["Pizza Margherita", "Pizza Quatre Fromages", "Lasagne"])
+    match = index.best("pizza margarita")
+    assert match.name == "Pizza Margherita"
+    assert 0.6 <= match.score < 1.0
+    assert index.best("motorcycle") is None
+
+# --- 3. Catalog entries carry their payload ---
+def test_values_are_returned_with_matches():
+    index = NameIndex()
+    index.add("Gâteau au chocolat", value={"product_id": 42})
+    assert index.best("gateaux au chocolat").value == {"product_id": 42}
+
+# --- 4. Several names fitting about as well make the match ambiguous ---
+def test_ambiguous_matches_are_rejected():
+    index = NameIndex(["Pizza Reine", "Pizza Margherita", "Lasagne"])
+    assert index.search("pizza")[0].ambiguous == ("Pizza Margherita",)
+    with pytest.raises(AmbiguousNameError) as error:
+        index.best("pizza")
+    assert error.value.names == ["Pizza Reine", "Pizza Margherita"]
+    assert index.best("pizza reine").name == "Pizza Reine"
+    assert NameIndex(["Pizza Margherita", "Pizza Margherita XL"]).best("pizza margarita").name == "Pizza Margherita"
+    assert NameIndex(["Chaise", "Chaise pliante"]).best("chaises").name == "Chaise"
+
+def test_exact_lookup():
+    index = NameIndex(["Tablette", "Chaise"])
+    assert index.exact("les chaises").name == "Chaise"
+    assert index.exact("table") is None and index.best("table").name == "Tablette"
@@ -0,0 +1,34 @@
+import json
+from src.agent.models import OrderItem
+from src.agent.order_lines import OrderLines
+
+ITEMS = [
+    {"name": "Table", "quantity": 2, "price": 20.0, "product_id": 7},
+    {"name": "Chaise", "quantity": 4, "price": 10.0},
+]
+
+
+def test_total_is_updated_incrementally():
+    lines = OrderLines.from_items(json.dumps(ITEMS))
+    assert lines.total == 80.0
+    assert lines.remove("chaise", 3) == 3
+    lines.add("Lampe", 1, 15.5)
+    lines.set_quantity("Table", 1)
+    assert lines.total == 45.5
+    assert lines.total == sum(line.price * line.quantity for line in lines)
+    assert lines.remove("Chaise", 5) == 1
+    assert "Chaise" not in lines and lines.names() == ["Table", "Lampe"]
+
+def test_round_trip_keeps_item_fields():
+    lines = OrderLines.from_items([OrderItem(**item) for item in ITEMS])
+    assert json.loads(lines.to_json()) == [OrderItem(**item).dict() for item in ITEMS]
+    assert lines.to_items()[0].product_id == 7
+
+def test_add_merges_and_zero_quantity_removes():
+    lines = OrderLines.from_items(ITEMS)
+    lines.add("table", 1, 99.0)
+    assert len(lines) == 2 and lines.get("Table").quantity == 3
+    lines.set_quantity("Table", 0)
+    assert lines.get("Table") is None
+    lines.discard(lines.get("Chaise"))
+    assert len(lines) == 0 and lines.total == 0.0 and lines.last() is None
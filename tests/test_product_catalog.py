@@ -0,0 +1,148 @@
+import os
+import json
+import asyncio
+import pytest
+from datetime import datetime
+from src.agent.name_index import AmbiguousNameError
+from src.services.product_catalog import ProductCatalog
+
+os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")  # The agent builds a WooCommerce client, never called here
+
+from src.agent.agent import OrderConfirmationAgent  # noqa: E402
+from src.agent.database.models import Base, OrderModel  # noqa: E402
+from src.agent.database.sqlite import SQLiteDatabase  # noqa: E402
+from src.agent.turn_context import TurnContext  # noqa: E402
+
+
+class FakeStore:
+    """Serves products in pages like the WooCommerce products endpoint."""
+
+    def __init__(self, products):
+        self.products = products
+        self.requests = []
+        self.statuses = []
+
+    def fetch_page(self, page, per_page, modified_after, status):
+        self.requests.append((page, modified_after))
+        self.statuses.append(status)
+        # "any" is every status but the trash, as in WordPress
+        matching = [p for p in self.products if (not modified_after or p["date_modified_gmt"] > modified_after) and
+                    (p["status"] == status or (status == "any" and p["status"] != "trash"))]
+        total_pages = max(1, -(-len(matching) // per_page))
+        return matching[(page - 1) * per_page:page * per_page], total_pages
+
+
+def product(i, name, price, modified="2025-01-01T00:00:00", sku=None, status="publish"):
+    return {"id": i, "name": name, "sku": sku or f"SKU-{i}", "price": str(price), "status": status, "date_modified_gmt": modified}
+
+
+def order_agent(tmp_path, names):
+    """An agent over a database holding order o1 with one of each named item."""
+    path = tmp_path / "orders.db"
+    db = SQLiteDatabase(db_url=f"sqlite+aiosqlite:///{path}", sync_db_url=f"sqlite:///{path}")
+    Base.metadata.create_all(db.sync_engine)
+    items = [{"name": name, "quantity": 1, "price": 10.0 * (i + 1)} for i, name in enumerate(names)]
+    with db.get_session() as session:
+        session.add(OrderModel(id="o1", customer_name="Jean", customer_phone="", items=json.dumps(items),
+                               total_amount=sum(item["price"] for item in items), status="pending", created_at=datetime(2025, 1, 1)))
+        session.commit()
+    return db, OrderConfirmationAgent(db)
+
+
+# --- 1. The first load pages through the whole catalog ---
+def test_full_load_is_paged():
+    store = FakeStore([product(i, f"Produit {i}", i) for i in range(1, 251)])
+    catalog = ProductCatalog("https://shop.test", store.fetch_page, page_size=100)
+    assert asyncio.run(catalog.refresh()) == 250
+    assert [page for page, _ in store.requests] == [1, 2, 3]
+    assert catalog.lookup(sku="sku-42")["price"] == 42.0
+
+# --- 2. Lookups by fuzzy name return price and product id ---
+def test_lookup_by_name():
+    store = FakeStore([product(7, "Crème brûlée", 6.5), product(8, "Pizza Margherita", 11)])
+    catalog = ProductCatalog("https://shop.test", store.fetch_page)
+    asyncio.run(catalog.refresh())
+    found = catalog.lookup(name="creme brulees")
+    assert (found["id"], found["price"]) == (7, 6.5)
+    assert catalog.lookup(name="sushi") is None
+
+def test_ambiguous_names_are_not_resolved():
+    store = FakeStore([product(1, "Chaise en bois", 40), product(2, "Chaise pliante", 35), product(3, "Table", 100)])
+    catalog = ProductCatalog("https://shop.test", store.fetch_page)
+    asyncio.run(catalog.refresh())
+    with pytest.raises(AmbiguousNameError) as error:
+        catalog.lookup(name="chaise")
+    assert error.value.names == ["Chaise en bois", "Chaise pliante"]
+    assert catalog.lookup(name="chaises pliantes")["id"] == 2
+
+# --- 3. Incremental refresh only asks for products modified since the last one ---
+def test_incremental_refresh_uses_modified_after():
+    store = FakeStore([product(1, "Table", 100), product(2, "Chaise", 40)])
+    catalog = ProductCatalog("https://shop.test", store.fetch_page)
+    asyncio.run(catalog.refresh())
+    store.products = [product(2, "Chaise pliante", 35, modified="2025-02-01T00:00:00"), product(1, "Table", 100)]
+    assert asyncio.run(catalog.refresh()) == 1
+    assert store.requests[-1][1] == "2025-01-01T00:00:00"
+    assert catalog.lookup(name="chaise pliante")["price"] == 35.0
+    assert catalog.lookup(sku="SKU-2")["name"] == "Chaise pliante"
+
+def test_unpublished_and_trashed_products_are_dropped():
+    store = FakeStore([product(1, "Table", 100), product(2, "Chaise", 40), product(3, "Lampe", 25),
+                       product(4, "Tabouret", 30, status="draft")])
+    catalog = ProductCatalog("https://shop.test", store.fetch_page)
+    asyncio.run(catalog.refresh())
+    assert store.statuses == ["publish"] and 4 not in catalog.products
+    store.products[0] = product(1, "Table", 100, modified="2025-02-01T00:00:00", status="draft")
+    store.products[1] = product(2, "Chaise", 40, modified="2025-02-01T00:00:00", status="trash")
+    assert asyncio.run(catalog.refresh()) == 2
+    assert store.statuses[1:] == ["any", "trash"]
+    assert catalog.lookup(name="table") is None and catalog.lookup(sku="SKU-2") is None
+    assert sorted(catalog.products) == [3]
+
+# --- 4. Added items match the order's own lines before the catalog ---
+def test_added_items_match_the_order_first(tmp_path, monkeypatch):
+    store = FakeStore([product(1, "Table basse", 80), product(2, "Lampe", 25)])
+    catalog = ProductCatalog("https://shop.test", store.fetch_page)
+    asyncio.run(catalog.refresh())
+    lookups = []
+    monkeypatch.setattr("src.agent.agent.get_product_catalog", lambda: catalog)
+    monkeypatch.setattr(catalog, "lookup", lambda **kw: lookups.append(kw) or ProductCatalog.lookup(catalog, **kw))
+    db, agent = order_agent(tmp_path, ["Table"])
+
+    async def add(item):
+        turn = await TurnContext.load(db, "o1")
+        await agent._apply_llm_modification(turn, {"item": item, "quantity": 1}, "add")
+        return [(line.name, line.quantity, line.price) for line in turn.lines]
+
+    assert asyncio.run(add("tables")) == [("Table", 2, 10.0)]  # Not the catalog's "Table basse"
+    assert lookups == []
+    assert asyncio.run(add("lampe")) == [("Table", 1, 10.0), ("Lampe", 1, 25.0)]
+    assert lookups == [{"name": "lampe"}]
+
+# --- 5. Only an exactly named line takes an added item: close names are other products ---
+@pytest.mark.parametrize("item", ["table", "chaises pliantes", "Coca light"])
+def test_similar_names_are_not_merged(tmp_path, monkeypatch, item):
+    monkeypatch.setattr("src.agent.agent.get_product_catalog", lambda: None)
+    db, agent = order_agent(tmp_path, ["Tablette", "Chaise", "Coca"])
+
+    async def add():
+        turn = await TurnContext.load(db, "o1")
+        await agent._apply_llm_modification(turn, {"item": item, "quantity": 1}, "add")
+        return [(line.name, line.quantity) for line in turn.lines]
+
+    assert asyncio.run(add()) == [("Tablette", 1), ("Chaise", 1), ("Coca", 1), (item, 1)]
+
+# --- 6. A name that fits several items gets a question, and the order is left as it is ---
+def test_ambiguous_item_asks_which_one(tmp_path):
+    db, agent = order_agent(tmp_path, ["Pizza Reine", "Pizza Margherita"])
+    reply = json.dumps({"message": "C'est fait.", "action": "remove", "modification": {"old_item": "pizza", "quantity": 1}})
+
+    async def remove():
+        turn = await TurnContext.load(db, "o1")
+        turn.start_conversation()
+        message = await agent._handle_llm_reply(turn, reply, "retirez la pizza", "fr")
+        return message, turn
+
+    message, turn = asyncio.run(remove())
+    assert message == "Duquel parlez-vous : Pizza Reine ou Pizza Margherita ?"
+    assert [line.quantity for line in turn.lines] == [1, 1] and not turn.order_updates
@@ -0,0 +1,55 @@
+import time
+import asyncio
+from src.services import profiling
+from src.services.profiling import RequestProfiler, profile_authorized, profile_name
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def hot_serialization():
+    busy(0.05)
+
+
+async def unrelated_request():
+    await asyncio.sleep(0)
+    busy(0.05)
+
+
+def test_profile_covers_spawned_tasks_only(tmp_path):
+    profiler = RequestProfiler(interval_ms=1, directory=str(tmp_path))
+
+    async def request():
+        profile = profiler.start("20250101-000000-00000000-post-orders.folded")
+        await asyncio.ensure_future(hot_serialization())  # Started by the request: attributed to it
+        return profile, await profiler.finish(profile)
+
+    async def main():
+        other = asyncio.ensure_future(unrelated_request())
+        result = await asyncio.ensure_future(request())
+        await other
+        return result
+
+    profile, path = asyncio.run(main())
+    folded = open(path).read()
+    assert profile.samples > 5 and "hot_serialization" in folded and "unrelated_request" not in folded
+    stack, count = folded.splitlines()[0].rsplit(" ", 1)
+    # Stacks start at the task's coroutine, not the event loop
+    assert stack == (f"hot_serialization (tests/test_profiling.py:{hot_serialization.__code__.co_firstlineno});"
+                     f"busy (tests/test_profiling.py:{busy.__code__.co_firstlineno})")
+    assert profiler.read(profile.name) == folded and profiler.read("../secrets.folded") is None
+
+def test_profiles_need_the_admin_token():
+    token = profiling.PROFILE_TOKEN
+    try:
+        profiling.PROFILE_TOKEN = None
+        assert not profile_authorized("anything") and not profile_authorized(None)
+        profiling.PROFILE_TOKEN = "s3cret"
+        assert profile_authorized("s3cret") and not profile_authorized("s3cre") and not profile_authorized(None)
+    finally:
+        profiling.PROFILE_TOKEN = token
+    name = profile_name("POST", "/orders/abc 1/message")
+    assert name.endswith("-post-orders_abc_1_message.folded")
@@ -0,0 +1,39 @@
+from src.agent.prompt_builder import build_prompt, estimate_tokens, fit_history, static_prefix
+
+
+def history(count):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + "x" * 36} for i in range(count)]
+
+
+# --- 1. Every turn starts with the same static prefix ---
+def test_static_prefix_is_stable_across_turns():
+    first = build_prompt("fr", "Commande o1", history(2), "oui")
+    second = build_prompt("fr-FR", "Commande o2, autre client", history(6), "je veux retirer la table")
+    prefix = static_prefix("fr")
+    assert first.startswith(prefix) and second.startswith(prefix)
+    assert "Commande o1" not in prefix and "{" + "language}" not in prefix
+    assert build_prompt("en", "Order o1", [], "yes").startswith(static_prefix("en"))
+    assert static_prefix("en") != prefix
+
+# --- 2. The history is trimmed to the token budget, newest messages kept ---
+def test_history_is_trimmed_to_the_budget():
+    messages = history(8)
+    line_cost = estimate_tokens(f"Client: {messages[0]['content']}") + 1
+    text = fit_history(messages, token_budget=3 * line_cost)
+    lines = text.splitlines()
+    assert lines[0] == "[Résumé: Conversation commencée il y a 8 messages]"
+    assert [line.split()[2] for line in lines[1:]] == ["5", "6", "7"]
+    assert fit_history(messages, token_budget=1).endswith("message 7 " + "x" * 36)  # The newest message is always kept
+    assert fit_history(messages, token_budget=10000, max_messages=2).count("\n") == 2
+    assert fit_history(messages[:2], token_budget=10000, summary="Client a ajouté une table").startswith("[Résumé: Client a ajouté une table]\n")
+
+# --- 3. Switching language drops the history in the old language ---
+def test_language_switch_resets_the_history():
+    messages = [
+        {"role": "user", "content": "Bonjour"},
+        {"role": "assistant", "content": "Votre commande contient une table. Est-ce correct ?"},
+        {"role": "user", "content": "Can I add a chair?"},
+    ]
+    assert fit_history(messages, language="en") == "Client: Can I add a chair?"
+    assert fit_history(messages, language="fr").count("\n") == 2
+    assert fit_history(messages).count("\n") == 2
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import asyncio
+import pytest
+from src.agent.stream_parser import AgentReplyStreamParser
+
+REPLY = json.dumps({"message": "C'est noté 👍 : \"Table\"\n— merci ! \\o/", "action": "confirm", "modification": None})
+
+
+def feed_in_chunks(raw, size):
+    parser = AgentReplyStreamParser()
+    deltas = [parser.feed(raw[i:i + size]) for i in range(0, len(raw), size)]
+    return parser, deltas
+
+
+# --- 1. Any chunking, including cuts inside escapes, surrogate pairs and keys, decodes the same message ---
+@pytest.mark.parametrize("size", range(1, 15))
+def test_chunk_boundaries_do_not_change_the_message(size):
+    parser, deltas = feed_in_chunks(REPLY, size)
+    assert "".join(deltas) == parser.message == json.loads(REPLY)["message"]
+    assert parser.action == "confirm" and parser.complete
+    assert all("\ud83d" not in delta and "\udc4d" not in delta for delta in deltas)  # Never half an emoji
+
+def test_message_is_streamed_before_the_reply_is_complete():
+    parser = AgentReplyStreamParser()
+    assert parser.feed('{"mess') == ""
+    assert parser.feed('age": "Bonj') == "Bonj"
+    assert parser.feed('our\\') == "our"  # The escape waits for its next character
+    assert parser.feed('u00e9", "act') == "é"
+    assert parser.action is None and not parser.complete
+    parser.feed('ion": "none", "modification": {"item": "}"}}')
+    assert parser.action == "none" and parser.complete
+
+def test_lone_surrogates_are_passed_through():
+    parser = AgentReplyStreamParser()
+    assert parser.feed('{"message": "a\\ud83d') == "a"
+    assert parser.feed('b"}') == "\ud83db"
+
+# --- 2. A backend stalling mid-reply ends the streamed turn with the fallback reply ---
+def test_stalled_stream_sends_the_fallback(tmp_path, monkeypatch):
+    os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")
+    from datetime import datetime
+    from src.agent.agent import OVERLOAD_REPLY_FR, OrderConfirmationAgent
+    from src.agent.database.models import Base, OrderModel
+    from src.agent.database.sqlite import SQLiteDatabase
+    from src.services.ai_service import use_llm_backend
+    from src.services.llm_backend import LLMBackend
+    from src.services.llm_cache import get_llm_cache
+
+    class StallingBackend(LLMBackend):
+        name = "stalling"
+
+        async def stream(self, prompt, model=None, max_tokens=512, timeout=None, response_schema=None):
+            yield '{"message": "Je ret'
+            await asyncio.sleep(10)
+
+    path = tmp_path / "stream.db"
+    db = SQLiteDatabase(db_url=f"sqlite+aiosqlite:///{path}", sync_db_url=f"sqlite:///{path}")
+    Base.metadata.create_all(db.sync_engine)
+    with db.get_session() as session:
+        session.add(OrderModel(id="o1", customer_name="Jean", customer_phone="", items='[{"name": "Table", "quantity": 1, "price": 120.0}]',
+                               total_amount=120.0, status="pending", created_at=datetime(2025, 1, 1)))
+        session.commit()
+    monkeypatch.setattr("src.services.ai_service.DEFAULT_TIMEOUT", 0.1)
+    use_llm_backend(StallingBackend(), rate_per_minute=0, max_retries=0)
+    get_llm_cache().enabled = False
+    agent = OrderConfirmationAgent(db)
+
+    async def run():
+        return [event async for event in agent.stream_process_message("o1", "Je voudrais retirer la table")]
+
+    start = time.perf_counter()
+    events = asyncio.run(run())
+    assert events[0] == ("token", "Je ret") and events[-1] == ("done", OVERLOAD_REPLY_FR)
+    assert time.perf_counter() - start < 2
+
+# --- 3. Request latency and the request span cover the whole streamed body ---
+def test_request_latency_includes_the_streamed_body():
+    os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")
+    from fastapi.responses import StreamingResponse
+    from starlette.testclient import TestClient
+    from src.main import app
+    from src.services.metrics import http_request_seconds
+
+    @app.get("/test/slow-stream")
+    async def slow_stream():
+        async def body():
+            yield "data: a\n\n"
+            await asyncio.sleep(0.2)
+            yield "data: b\n\n"
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    try:
+        assert TestClient(app).get("/test/slow-stream").text == "data: a\n\ndata: b\n\n"
+    finally:
+        app.router.routes.pop()
+    latency = http_request_seconds.labels("GET", "/test/slow-stream", 200)
+    assert latency.count == 1 and latency.sum >= 0.2
@@ -0,0 +1,102 @@
+import asyncio
+from src.agent.models import ConversationState
+from src.agent.summarizer import RollingSummarizer, summarize_messages
+from src.services.ai_service import use_llm_backend
+from src.services.llm_backend import LLMBackend
+from src.services.llm_errors import LLMTransientError
+
+
+class SummaryBackend(LLMBackend):
+    name = "summary"
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.prompts = []
+
+    async def generate(self, prompt, model=None, max_tokens=512, timeout=None, response_schema=None):
+        self.prompts.append(prompt)
+        if self.fail:
+            raise LLMTransientError("unavailable")
+        return "Le client a retiré une chaise."
+
+
+def conversation(turns, order_id="o1"):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"demande {i}"})
+        messages.append({"role": "assistant", "content": f"Réponse {i}. Autre chose ?"})
+    return ConversationState(order_id=order_id, messages=messages)
+
+
+# --- 1. One short fact per message, the oldest dropped past the size limit ---
+def test_summarize_messages():
+    summary = summarize_messages(None, [
+        {"role": "user", "content": "Je voudrais   retirer une chaise " + "x" * 100},
+        {"role": "assistant", "content": "C'est fait. Est-ce correct ?"},
+    ])
+    facts = summary.split(" | ")
+    assert facts[0].startswith("Client: Je voudrais retirer une chaise") and facts[0].endswith("…") and len(facts[0]) == len("Client: ") + 80
+    assert facts[1] == "Agent: C'est fait."
+    longer = summarize_messages(summary, [{"role": "user", "content": "Et ajoutez une lampe"}], max_chars=60)
+    assert longer == "Agent: C'est fait. | Client: Et ajoutez une lampe"  # The long client fact went first
+
+# --- 2. Rule-based rollup folds old messages every K turns ---
+def test_rules_rollup_keeps_the_recent_window():
+    summarizer = RollingSummarizer(every_turns=2, recent_messages=2, mode="rules")
+    state = conversation(2)
+    assert not summarizer.update(state)  # 4 messages, 2 kept: not a full batch yet
+    state = conversation(3)
+    assert summarizer.update(state)
+    assert state.summarized_count == 4 and summarizer.recent(state) == state.messages[4:]
+    assert state.summary.startswith("Client: demande 0 | Agent: Réponse 0.")
+    state.messages = state.messages[:2]  # History reset elsewhere
+    summarizer.update(state)
+    assert state.summary is None and state.summarized_count == 0
+
+# --- 3. LLM rollup runs in the background and is picked up on a later turn ---
+def test_llm_rollup_in_the_background():
+    backend = SummaryBackend()
+    use_llm_backend(backend, rate_per_minute=0, max_retries=0)
+    summarizer = RollingSummarizer(every_turns=2, recent_messages=2, mode="llm")
+    state = conversation(3)
+
+    async def run():
+        assert not summarizer.update(state)
+        await asyncio.gather(*summarizer._tasks.values())
+        return summarizer.update(state)
+
+    assert asyncio.run(run())
+    assert state.summary == "Le client a retiré une chaise." and state.summarized_count == 4
+    assert "Client: demande 1" in backend.prompts[0] and "demande 2" not in backend.prompts[0]
+    assert not summarizer._pending and not summarizer._tasks
+
+def test_failed_llm_rollup_falls_back_to_rules():
+    use_llm_backend(SummaryBackend(fail=True), rate_per_minute=0, max_retries=0)
+    summarizer = RollingSummarizer(every_turns=2, recent_messages=2, mode="llm")
+    state = conversation(3)
+
+    async def run():
+        summarizer.update(state)
+        await asyncio.gather(*summarizer._tasks.values())
+        summarizer.update(state)
+
+    asyncio.run(run())
+    assert state.summary.startswith("Client: demande 0")
+
+# --- 4. Summaries of abandoned or closed conversations do not pile up ---
+def test_pending_summaries_are_bounded_and_forgotten():
+    use_llm_backend(SummaryBackend(), rate_per_minute=0, max_retries=0)
+    summarizer = RollingSummarizer(every_turns=2, recent_messages=2, mode="llm", max_pending=2)
+
+    async def run():
+        for order_id in ("o1", "o2", "o3"):
+            summarizer.update(conversation(3, order_id))
+        await asyncio.gather(*summarizer._tasks.values())
+        summarizer.update(conversation(3, "o4"))
+        summarizer.forget("o4")  # Confirmed while its summary was running
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert list(summarizer._pending) == ["o2", "o3"] and summarizer.dropped == 1
+    summarizer.forget("o3")
+    assert list(summarizer._pending) == ["o2"] and not summarizer._tasks
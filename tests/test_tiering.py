@@ -0,0 +1,60 @@
+import os
+import asyncio
+import pytest
+
+os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")  # The agent builds a WooCommerce client, never called here
+
+from src.agent import tiering  # noqa: E402
+from src.agent.agent import OrderConfirmationAgent  # noqa: E402
+from src.agent.tiering import COMPLEX_TIER, SIMPLE_TIER, TierStats, classify_complexity, model_for_tier  # noqa: E402
+from src.services.ai_service import token_usage, use_llm_backend  # noqa: E402
+from src.services.llm_backend import LLMBackend  # noqa: E402
+
+ITEMS = ["Table", "Chaises", "Lampe"]
+
+
+class ReportingBackend(LLMBackend):
+    """Reports fixed usage, the way a provider's usage_metadata would."""
+
+    name = "reporting"
+
+    async def generate(self, prompt, model=None, max_tokens=512, timeout=None, response_schema=None):
+        token_usage.record(model, 1234, 56)
+        return '{"message": "ok", "action": "none", "modification": null}'
+
+
+# --- 1. Turns escalate to the complex tier on replacements, several items or quantities, and long messages ---
+@pytest.mark.parametrize("text, tier", [
+    ("merci", SIMPLE_TIER),
+    ("Quand arrive ma commande ?", SIMPLE_TIER),
+    ("retirez une chaise", SIMPLE_TIER),
+    ("ajoutez 2 lampes", SIMPLE_TIER),
+    ("Remplacez la table par un bureau", COMPLEX_TIER),
+    ("swap the lamp for a desk", COMPLEX_TIER),
+    ("la table au lieu du bureau", COMPLEX_TIER),
+    ("retirez la table et la lampe", COMPLEX_TIER),
+    ("2 chaises, 3 lampes", COMPLEX_TIER),
+    ("ajoutez une lampe et aussi autre chose", COMPLEX_TIER),
+    (" ".join(["je voudrais"] * 11), COMPLEX_TIER),
+])
+def test_choose_tier(text, tier):
+    assert classify_complexity(text, ITEMS) == tier
+
+def test_business_tiers_override_the_defaults(monkeypatch):
+    monkeypatch.setattr(tiering, "get_business_settings", lambda business_id: {"model_tiers": {SIMPLE_TIER: "models/cheap"}} if business_id == "acme" else {})
+    assert model_for_tier("acme", SIMPLE_TIER) == "models/cheap"
+    assert model_for_tier("acme", COMPLEX_TIER) == tiering.DEFAULT_MODEL_TIERS[COMPLEX_TIER]
+    assert model_for_tier(None, SIMPLE_TIER) == tiering.DEFAULT_MODEL_TIERS[SIMPLE_TIER]
+
+# --- 2. Tier token counts are the provider's, estimated only when it reports none ---
+def test_tier_tokens_come_from_the_provider(monkeypatch):
+    stats = TierStats()
+    monkeypatch.setattr("src.agent.agent.tier_stats", stats)
+    use_llm_backend(ReportingBackend(), rate_per_minute=0, max_retries=0)
+    agent = OrderConfirmationAgent(None)
+    asyncio.run(agent._call_llm_tiered("x" * 400, SIMPLE_TIER, "models/test"))
+    assert stats.stats()[SIMPLE_TIER]["avg_prompt_tokens"] == 1234
+    assert stats.stats()[SIMPLE_TIER]["avg_completion_tokens"] == 56
+
+    stats.record(COMPLEX_TIER, "models/test", 0.1, "x" * 400, "y" * 40)
+    assert stats.stats()[COMPLEX_TIER]["avg_prompt_tokens"] == 100
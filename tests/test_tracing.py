@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from src.services.tracing import Tracer, parse_traceparent, otlp_payload
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+def test_only_slow_or_failed_traces_are_exported():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, slow_ms=20)
+
+    async def turn(delay, fail=False):
+        with tracer.span("agent.turn"):
+            with tracer.span("db.load_turn"):
+                pass
+            with tracer.span("llm.call", model="flash"):
+                await asyncio.sleep(delay)
+                if fail:
+                    raise RuntimeError("quota")
+
+    asyncio.run(turn(0))
+    asyncio.run(turn(0.03))
+    with pytest.raises(RuntimeError):
+        asyncio.run(turn(0, fail=True))
+    tracer.flush()
+    assert tracer.traces_sampled_out == 1 and tracer.traces_exported == 2
+    by_name = {}
+    for span in exporter.spans:
+        by_name.setdefault(span.name, []).append(span)
+    root, db, llm = by_name["agent.turn"][0], by_name["db.load_turn"][0], by_name["llm.call"][0]
+    assert root.parent_id is None and db.parent_id == root.span_id and llm.parent_id == root.span_id
+    assert {span.trace_id for span in (root, db, llm)} == {root.trace_id}
+    assert llm.attributes == {"model": "flash"}
+    assert by_name["llm.call"][1].error == "RuntimeError: quota"
+
+def test_background_tasks_join_the_request_trace():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, slow_ms=0)
+
+    async def summarize():
+        await asyncio.sleep(0.01)
+        with tracer.span("llm.summary"):
+            pass
+
+    async def request():
+        with tracer.span("http.request", remote_parent=parse_traceparent(
+                "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")):
+            task = asyncio.ensure_future(summarize())
+        await task  # Ends after the request span, i.e. after the export decision
+
+    asyncio.run(request())
+    tracer.flush()
+    request_span, summary = sorted(exporter.spans, key=lambda span: span.name)
+    assert request_span.trace_id == summary.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert request_span.parent_id == "00f067aa0ba902b7" and summary.parent_id == request_span.span_id
+
+def test_traceparent_parsing_and_otlp_payload():
+    assert parse_traceparent("00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01") == (
+        "0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331")
+    assert parse_traceparent("garbage") is None and parse_traceparent(None) is None
+    tracer = Tracer(ListExporter())
+    span = tracer.start_span("woocommerce.update_order_status", retries=2, status="completed")
+    tracer.end_span(span)
+    otlp_span = otlp_payload([span])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert otlp_span["name"] == "woocommerce.update_order_status" and "parentSpanId" not in otlp_span
+    assert {"key": "retries", "value": {"intValue": "2"}} in otlp_span["attributes"]
+    assert otlp_span["status"] == {"code": 1}
+
+def test_disabled_tracer_yields_noop_spans():
+    tracer = Tracer(None)
+    with tracer.span("db.get_order") as span:
+        span.set_attribute("order_id", "o1")
+    assert tracer.stats()["pending_traces"] == 0
@@ -0,0 +1,95 @@
+import os
+import json
+import asyncio
+from datetime import datetime
+
+os.environ.setdefault("WOOCOMMERCE_STORE_URL", "http://127.0.0.1:9")  # The agent builds a WooCommerce client, never called here
+
+from src.agent import transcript  # noqa: E402
+from src.agent.agent import OrderConfirmationAgent  # noqa: E402
+from src.agent.database.models import Base, OrderModel  # noqa: E402
+from src.agent.database.sqlite import SQLiteDatabase  # noqa: E402
+from src.agent.replay import ReplayLLMBackend, TranscriptReplayer, _OfflineWooCommerce  # noqa: E402
+from src.agent.transcript import TranscriptRecorder, read_transcripts  # noqa: E402
+from src.services.ai_service import use_llm_backend  # noqa: E402
+from src.services.llm_cache import CUSTOMER_PLACEHOLDER, get_llm_cache  # noqa: E402
+
+REMOVE_REPLY = '{"message": "Je retire une chaise.", "action": "remove", "modification": {"old_item": "Chaise", "quantity": 1}}'
+QUESTION_REPLY = '{"message": "La livraison est prévue jeudi. Est-ce correct ?", "action": "none", "modification": null}'
+
+
+def make_db(tmp_path):
+    path = tmp_path / "live.db"
+    db = SQLiteDatabase(db_url=f"sqlite+aiosqlite:///{path}", sync_db_url=f"sqlite:///{path}")
+    Base.metadata.create_all(db.sync_engine)
+    with db.get_session() as session:
+        session.add(OrderModel(id="o1", customer_name="Jean", customer_phone="+33612345678",
+                               items='[{"name": "Table", "quantity": 1, "price": 120.0}, {"name": "Chaise", "quantity": 4, "price": 45.0}]',
+                               total_amount=300.0, status="pending", created_at=datetime(2025, 1, 1)))
+        session.commit()
+    return db
+
+
+def record(tmp_path, turns):
+    """Run (message, recorded LLM reply or error) turns on a live database and return the transcript."""
+    path = str(tmp_path / "turns.ndjson")
+    recorder = transcript._recorder = TranscriptRecorder(path)
+    backend = ReplayLLMBackend()
+    use_llm_backend(backend, rate_per_minute=0, max_retries=0)
+    get_llm_cache().enabled = False  # Each turn must get its scripted reply
+    agent = OrderConfirmationAgent(make_db(tmp_path))
+    agent.woocommerce_service = _OfflineWooCommerce()
+
+    async def run():
+        for text, llm in turns:
+            backend.load(llm)
+            await agent.process_message("o1", text)
+
+    try:
+        asyncio.run(run())
+        recorder.flush()
+    finally:
+        transcript._recorder = None
+    return list(read_transcripts(path))
+
+
+def test_recorded_turns_replay_offline(tmp_path):
+    entries = record(tmp_path, [
+        ("Je voudrais retirer une chaise", {"llm": REMOVE_REPLY}),
+        ("La livraison est prévue quand ?", {"llm": QUESTION_REPLY}),
+        ("oui", {}),
+    ])
+    assert [e["action"] for e in entries] == ["remove", "none", None]
+    assert entries[0]["conversation"] is None and "conversation" not in entries[1]
+    assert entries[0]["order"]["items"][1]["quantity"] == 4 and entries[1]["order"]["items"][1]["quantity"] == 3
+    assert entries[2]["outcome"] == "confirm" and entries[2]["llm"] is None
+
+    replayer = TranscriptReplayer()
+    results = asyncio.run(replayer.replay(entries))
+    assert all(r["match"] for r in results), results
+    assert [r["llm_calls"] for r in results] == [1, 1, 0]
+    assert sum(r["unexpected_llm_calls"] for r in results) == 0
+    assert replayer.agent.woocommerce_service.calls == []  # The order has no WooCommerce id
+
+def test_recorded_llm_errors_are_replayed(tmp_path):
+    entries = record(tmp_path, [
+        ("Je voudrais retirer une chaise", {"llm_error": "quota_exceeded"}),
+        ("Je voudrais retirer une chaise", {"llm": REMOVE_REPLY}),
+    ])
+    assert entries[0]["outcome"] == "fallback" and entries[0]["llm_error"] == "quota_exceeded"
+
+    replayer = TranscriptReplayer()
+    results = asyncio.run(replayer.replay(entries))
+    assert [r["match"] for r in results] == [True, True]  # The quota error did not leave the breaker open
+
+    entries[1]["reply"] = "Une autre réponse"
+    assert not asyncio.run(replayer.replay_turn(entries[1]))["match"]
+
+def test_customer_name_is_masked(tmp_path):
+    greeting = '{"message": "Bonjour Jean, la livraison est prévue jeudi. Est-ce correct ?", "action": "none", "modification": null}'
+    entries = record(tmp_path, [("Bonjour, c'est Jean. Quand arrive ma commande ?", {"llm": greeting})])
+    assert "Jean" not in json.dumps(entries, ensure_ascii=False)
+    assert entries[0]["reply"].startswith(f"Bonjour {CUSTOMER_PLACEHOLDER},")
+
+    results = asyncio.run(TranscriptReplayer().replay(entries))
+    assert results[0]["match"], results  # The replayed order carries the placeholder as its customer name
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+from src.agent.database.base import DatabaseInterface
+from src.agent.database.models import Base, OrderModel
+from src.agent.database.sqlite import SQLiteDatabase
+from src.agent.turn_context import TurnContext
+
+
+def make_db(tmp_path):
+    path = tmp_path / "turns.db"
+    db = SQLiteDatabase(db_url=f"sqlite+aiosqlite:///{path}", sync_db_url=f"sqlite:///{path}")
+    Base.metadata.create_all(db.sync_engine)
+    with db.get_session() as session:
+        session.add(OrderModel(id="o1", customer_name="Jean", customer_phone="+33123456789",
+                               items='[{"name": "Table", "quantity": 2, "price": 20.0}]', total_amount=40.0,
+                               status="pending", created_at=datetime(2025, 1, 1), woocommerce_order_id="12"))
+        session.commit()
+    return db
+
+
+# --- 1. One query loads the order, with or without a conversation ---
+def test_load_order_without_conversation(tmp_path):
+    db = make_db(tmp_path)
+    turn = asyncio.run(TurnContext.load(db, "o1"))
+    assert turn.order.items[0].name == "Table"
+    assert turn.order.woocommerce_order_id == "12"
+    assert turn.conversation is None
+    missing = asyncio.run(TurnContext.load(db, "nope"))
+    assert missing.order is None and missing.conversation is None
+
+# --- 2. Queued writes are saved together at commit ---
+def test_commit_writes_order_and_conversation(tmp_path):
+    db = make_db(tmp_path)
+
+    async def run_turn():
+        turn = await TurnContext.load(db, "o1")
+        conversation = turn.start_conversation()
+        conversation.messages.append({"role": "user", "content": "oui"})
+        conversation.language = "fr"
+        turn.save_conversation()
+        turn.update_order({"status": "confirmed"})
+        turn.update_order({"confirmed_at": "2025-01-02T10:00:00"})
+        assert (await db.get_order("o1"))["status"] == "pending"  # Nothing written before commit
+        await turn.commit()
+        return await TurnContext.load(db, "o1")
+
+    reloaded = asyncio.run(run_turn())
+    assert reloaded.order.status == "confirmed"
+    assert reloaded.order.confirmed_at == "2025-01-02T10:00:00"
+    assert reloaded.conversation.messages == [{"role": "user", "content": "oui"}]
+    assert reloaded.conversation.language == "fr"
+
+# --- 3. A turn that changed nothing does not touch the database ---
+def test_clean_turn_skips_commit(tmp_path):
+    db = make_db(tmp_path)
+    turn = asyncio.run(TurnContext.load(db, "o1"))
+    turn.start_conversation()
+    assert not turn.dirty
+    asyncio.run(turn.commit())
+    assert asyncio.run(db.get_conversation("o1")) is None
+
+# --- 4. Databases with only the basic methods get load_turn and save_turn from the interface ---
+class DictDatabase(DatabaseInterface):
+    def __init__(self, orders):
+        self.orders, self.conversations = orders, {}
+
+    async def get_order(self, order_id):
+        return self.orders.get(order_id)
+
+    async def update_order(self, order_id, updates):
+        self.orders[order_id].update(updates)
+        return True
+
+    async def get_conversation(self, order_id):
+        return self.conversations.get(order_id)
+
+    async def update_conversation(self, order_id, conversation):
+        self.conversations[order_id] = conversation
+        return True
+
+
+def test_interface_defaults_load_and_save_a_turn():
+    db = DictDatabase({"o1": {"id": "o1", "customer_name": "Jean", "customer_phone": "", "total_amount": 40.0,
+                              "items": [{"name": "Table", "quantity": 2, "price": 20.0}], "status": "pending",
+                              "created_at": "2025-01-01T00:00:00"}})
+
+    async def run_turn():
+        turn = await TurnContext.load(db, "o1")
+        turn.start_conversation().messages.append({"role": "user", "content": "oui"})
+        turn.save_conversation()
+        turn.update_order({"status": "confirmed"})
+        await turn.commit()
+        return await TurnContext.load(db, "o1")
+
+    reloaded = asyncio.run(run_turn())
+    assert reloaded.order.status == "confirmed"
+    assert reloaded.conversation.messages == [{"role": "user", "content": "oui"}]
+    assert asyncio.run(db.load_turn("nope")) == (None, None)